@@ -0,0 +1,135 @@
+import io
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Optional, Tuple
+from urllib.parse import urlparse
+
+from pydub import AudioSegment
+from pydub.silence import detect_leading_silence
+
+from blobstore import BlobStore
+from cache import LocalTTLCache
+from config import get_setting
+from waveform import DEFAULT_RESOLUTIONS, compute_waveforms, extract_packed_waveforms, pack_waveforms, segment_to_samples
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = {"mp3": "audio/mpeg", "wav": "audio/wav", "ogg": "audio/ogg"}
+# pydub/ffmpeg names for the container formats we advertise
+EXPORT_OPTIONS = {"mp3": {"format": "mp3"}, "wav": {"format": "wav"}, "ogg": {"format": "ogg", "codec": "libvorbis"}}
+
+def render_variant(data: bytes, target_format: str, sample_rate: int, target_dbfs: float, silence_threshold: float, keep_silence_ms: int) -> Tuple[bytes, bytes]:
+    """Trim silence, normalize loudness and transcode. Runs in a worker process.
+
+    Returns the encoded audio and its packed waveforms, computed from the
+    same decoded samples so the audio is only decoded once.
+    """
+    segment = AudioSegment.from_file(io.BytesIO(data))
+    lead = detect_leading_silence(segment, silence_threshold=silence_threshold)
+    trail = detect_leading_silence(segment.reverse(), silence_threshold=silence_threshold)
+    start = max(0, lead - keep_silence_ms)
+    end = min(len(segment), len(segment) - trail + keep_silence_ms)
+    if end > start:
+        segment = segment[start:end]
+    if segment.dBFS != float("-inf"):
+        segment = segment.apply_gain(target_dbfs - segment.dBFS)
+    segment = segment.set_frame_rate(sample_rate)
+    output = io.BytesIO()
+    segment.export(output, **EXPORT_OPTIONS[target_format])
+    waveforms = compute_waveforms(segment_to_samples(segment), get_setting("audio.waveform_resolutions", DEFAULT_RESOLUTIONS))
+    return output.getvalue(), pack_waveforms(waveforms)
+
+class AudioPostProcessor:
+    """Post-process synthesized audio in a process pool.
+
+    ffmpeg/pydub work never runs on the event loop. Provider audio, each
+    (source, format, sample rate) variant and its waveforms are kept in the
+    content-addressed blob store, so a variant is encoded once and repeat
+    plays never go back to the TTS provider.
+    """
+
+    def __init__(self, store: Optional[BlobStore] = None, max_workers: Optional[int] = None):
+        self.store = store or BlobStore()
+        self.max_workers = max_workers or get_setting("audio.process_workers", 2)
+        self.target_dbfs = get_setting("audio.target_dbfs", -16.0)
+        self.silence_threshold = get_setting("audio.silence_threshold_dbfs", -50.0)
+        self.keep_silence_ms = get_setting("audio.keep_silence_ms", 100)
+        self.skip_hosts = set(get_setting("audio.skip_source_hosts", []))
+        # Variants that failed recently are served unprocessed instead of re-fetched and re-rendered
+        self.failures = LocalTTLCache(get_setting("audio.failure_cache_size", 10000), get_setting("audio.failure_ttl", 300))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.stats = {"hits": 0, "renders": 0, "errors": 0, "source_fetches": 0, "skipped": 0}
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that runs an event loop and threads is unsafe
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def variant_name(self, source_url: str, target_format: str, sample_rate: int) -> str:
+        return f"{hashlib.md5(source_url.encode()).hexdigest()}_{sample_rate}.{target_format}"
+
+    def should_process(self, source_url: str, name: str) -> bool:
+        """False for sources we cannot fetch (placeholder hosts, non-HTTP URLs) and for recently failed variants"""
+        parsed = urlparse(source_url)
+        if parsed.scheme not in ("http", "https") or parsed.hostname in self.skip_hosts or self.failures.get(name) is not None:
+            self.stats["skipped"] += 1
+            return False
+        return True
+
+    def record_failure(self, name: str):
+        self.stats["errors"] += 1
+        self.failures.set(name, "1")
+
+    def lookup(self, name: str) -> Optional[str]:
+        """Digest of a rendered variant, if it is still in the store"""
+        digest = self.store.resolve(f"variant:{name}")
+        if digest is not None:
+            self.stats["hits"] += 1
+        return digest
+
+    async def get_source(self, source_url: str, fetch: Callable[[str], Awaitable[bytes]]) -> bytes:
+        """Provider audio for a URL, fetched from the provider at most once"""
+        digest = await asyncio.to_thread(self.store.resolve, f"source:{source_url}")
+        if digest is not None:
+            return await asyncio.to_thread(self.store.read, digest)
+        data = await fetch(source_url)
+        self.stats["source_fetches"] += 1
+        digest = await asyncio.to_thread(self.store.put, data)
+        await asyncio.to_thread(self.store.set_ref, f"source:{source_url}", digest)
+        return data
+
+    async def render(self, data: bytes, name: str, target_format: str, sample_rate: int) -> str:
+        """Encode a variant into the store, returning the digest of the encoded audio"""
+        loop = asyncio.get_running_loop()
+        encoded, waveforms = await loop.run_in_executor(self.executor, render_variant, data, target_format, sample_rate, self.target_dbfs, self.silence_threshold, self.keep_silence_ms)
+        digest = await asyncio.to_thread(self._store_variant, name, encoded, waveforms)
+        self.stats["renders"] += 1
+        return digest
+
+    def _store_variant(self, name: str, encoded: bytes, waveforms: bytes) -> str:
+        digest = self.store.put(encoded)
+        self.store.set_ref(f"waveform:{digest}", self.store.put(waveforms))
+        # Variant ref last: once it resolves, audio and waveform are both in place
+        self.store.set_ref(f"variant:{name}", digest)
+        return digest
+
+    async def get_waveforms(self, digest: str) -> bytes:
+        """Packed waveforms for stored audio, extracted on demand if missing"""
+        waveform_digest = await asyncio.to_thread(self.store.resolve, f"waveform:{digest}")
+        if waveform_digest is not None:
+            return await asyncio.to_thread(self.store.read, waveform_digest)
+        data = await asyncio.to_thread(self.store.read, digest)
+        packed = await asyncio.get_running_loop().run_in_executor(self.executor, extract_packed_waveforms, data)
+        waveform_digest = await asyncio.to_thread(self.store.put, packed)
+        await asyncio.to_thread(self.store.set_ref, f"waveform:{digest}", waveform_digest)
+        return packed
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,77 @@
+import time
+import hashlib
+import logging
+from typing import Any, Dict, NamedTuple, Optional
+
+from sqlalchemy import event
+
+from cache import LocalTTLCache
+from config import get_setting
+
+logger = logging.getLogger(__name__)
+
+class AuthPrincipal(NamedTuple):
+    """What request handlers need to know about the caller"""
+    id: int
+    email: Optional[str]
+    name: Optional[str]
+
+    @classmethod
+    def from_user(cls, user: Any) -> "AuthPrincipal":
+        return cls(id=user.id, email=getattr(user, "email", None), name=getattr(user, "name", None))
+
+class AuthCache:
+    """Two small LRU+TTL caches in front of JWT verification and the user lookup.
+
+    Verified tokens map to their user id until the token expires or token_ttl
+    passes, so a repeat token skips the HS256 check. Principals are cached per
+    user id and dropped when the User row is updated or deleted in this
+    process; principal_ttl bounds staleness for changes made elsewhere.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, token_ttl: Optional[int] = None, principal_ttl: Optional[int] = None):
+        max_size = max_size or get_setting("auth.cache_size", 10000)
+        self.tokens = LocalTTLCache(max_size, token_ttl or get_setting("auth.token_ttl", 300))
+        self.principals = LocalTTLCache(max_size, principal_ttl or get_setting("auth.principal_ttl", 60))
+        self.stats = {"token_hits": 0, "token_misses": 0, "principal_hits": 0, "principal_misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def token_key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get_user_id(self, token: str) -> Optional[int]:
+        user_id = self.tokens.get(self.token_key(token))
+        self.stats["token_hits" if user_id is not None else "token_misses"] += 1
+        return user_id
+
+    def set_user_id(self, token: str, user_id: int, expires_at: Optional[float] = None):
+        ttl = self.tokens.ttl
+        if expires_at is not None:
+            # Never trust a token past its own exp claim
+            ttl = min(ttl, expires_at - time.time())
+            if ttl <= 0:
+                return
+        self.tokens.set(self.token_key(token), user_id, ttl)
+
+    def get_principal(self, user_id: int) -> Optional[AuthPrincipal]:
+        principal = self.principals.get(str(user_id))
+        self.stats["principal_hits" if principal is not None else "principal_misses"] += 1
+        return principal
+
+    def set_principal(self, principal: AuthPrincipal):
+        self.principals.set(str(principal.id), principal)
+
+    def invalidate_user(self, user_id: int):
+        self.principals.delete(str(user_id))
+        self.stats["invalidations"] += 1
+
+    def watch(self, user_model: Any):
+        """Drop cached principals when the ORM updates or deletes a user"""
+        def on_change(mapper, connection, target):
+            self.invalidate_user(target.id)
+
+        event.listen(user_model, "after_update", on_change)
+        event.listen(user_model, "after_delete", on_change)
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "tokens": len(self.tokens), "principals": len(self.principals)}
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Event-loop lag under 200 concurrent cache lookups: sync redis.Redis vs the pooled async client
+Runs against a local RESP stand-in with configurable latency, so no Redis server is needed.
+Run from backend/: python benchmarks/bench_redis_event_loop.py [--concurrency 200] [--latency-ms 2]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+
+import redis
+import redis.asyncio as aioredis
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+class RespStandIn:
+    """Tiny in-memory Redis speaking enough RESP2 for GET/SET/SETEX/MGET/DEL/EXISTS/PUBLISH"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.data = {}
+        self.port = None
+        self._ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True).start()
+        self._ready.wait()
+
+    async def _serve(self):
+        server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(length + 2))[:-2].decode())
+                await asyncio.sleep(self.latency)
+                writer.write(self._execute(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _execute(self, args) -> bytes:
+        command = args[0].upper()
+        if command == "GET":
+            return self._bulk(self.data.get(args[1]))
+        if command == "MGET":
+            return f"*{len(args) - 1}\r\n".encode() + b"".join(self._bulk(self.data.get(key)) for key in args[1:])
+        if command == "SETEX":
+            self.data[args[1]] = args[3]
+            return b"+OK\r\n"
+        if command == "SET":
+            if "NX" in (arg.upper() for arg in args[3:]) and args[1] in self.data:
+                return b"$-1\r\n"
+            self.data[args[1]] = args[2]
+            return b"+OK\r\n"
+        if command in ("DEL", "EXISTS"):
+            count = sum(key in self.data for key in args[1:])
+            if command == "DEL":
+                for key in args[1:]:
+                    self.data.pop(key, None)
+            return f":{count}\r\n".encode()
+        if command == "PUBLISH":
+            return b":0\r\n"
+        return b"+OK\r\n"  # PING, CLIENT SETINFO, SELECT, ...
+
+    @staticmethod
+    def _bulk(value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        encoded = value.encode()
+        return b"$%d\r\n%s\r\n" % (len(encoded), encoded)
+
+async def measure(handler, concurrency: int, tick: float = 0.005):
+    """Run handlers concurrently while sampling how late a periodic timer fires"""
+    lags = []
+    done = asyncio.Event()
+
+    async def monitor():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(tick)
+            lags.append(time.perf_counter() - start - tick)
+
+    monitor_task = asyncio.create_task(monitor())
+    await asyncio.sleep(tick * 2)
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await monitor_task
+    lags.sort()
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "lag_p50_ms": round(statistics.median(lags) * 1000, 2),
+        "lag_p99_ms": round(lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000, 2),
+        "lag_max_ms": round(lags[-1] * 1000, 2),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    stand_in = RespStandIn(args.latency_ms / 1000)
+    stand_in.start()
+
+    sync_client = redis.Redis(port=stand_in.port, protocol=2, decode_responses=True)
+
+    async def sync_handler(i: int):
+        # What generate_tts used to do: blocking GET then SETEX inside a coroutine
+        if sync_client.get(f"tts:{i}") is None:
+            sync_client.set(f"tts:{i}", "x" * 512, ex=60)
+
+    pool = aioredis.BlockingConnectionPool(port=stand_in.port, protocol=2, max_connections=50, decode_responses=True)
+    async_client = aioredis.Redis(connection_pool=pool)
+
+    async def async_handler(i: int):
+        if await async_client.get(f"tts2:{i}") is None:
+            pipe = async_client.pipeline(transaction=False)
+            pipe.set(f"tts2:{i}", "x" * 512, ex=60)
+            pipe.publish("cache:invalidate", f"bench tts2:{i}")
+            await pipe.execute()
+
+    results = {
+        "concurrency": args.concurrency,
+        "latency_ms": args.latency_ms,
+        "sync_redis": await measure(sync_handler, args.concurrency),
+        "async_pooled_redis": await measure(async_handler, args.concurrency),
+    }
+    await async_client.aclose()
+    sync_client.close()
+    for name in ("sync_redis", "async_pooled_redis"):
+        print(f"{name:>20}: {results[name]}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: single-pass BlocklistMatcher vs the legacy four-regex scan
+Run from backend/: python benchmarks/bench_safety_matcher.py
+"""
+
+import os
+import re
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from safety import BlocklistMatcher, DEFAULT_BLOCKLIST
+
+LEGACY_PATTERNS = [r'\b(sex|porn|nude|naked|explicit|adult|erotic)\b', r'\b(violence|kill|murder|death|blood|gore)\b', r'\b(drug|cocaine|heroin|marijuana|weed)\b', r'\b(hate|racist|nazi|terrorist)\b']
+WORDS = "the quick brown fox jumps over a lazy dog while our podcast host shares morning motivation and wellness tips".split()
+
+def legacy_scan(text: str):
+    text_lower = text.lower()
+    for pattern in LEGACY_PATTERNS:
+        matches = re.findall(pattern, text_lower, re.IGNORECASE)
+        if matches:
+            return matches
+    return None
+
+def make_script(length: int, seed: int = 42) -> str:
+    rng = random.Random(seed)
+    words = []
+    total = 0
+    while total < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        total += len(word) + 1
+    return " ".join(words)[:length]
+
+def main():
+    matcher = BlocklistMatcher(DEFAULT_BLOCKLIST)
+    print(f"{'chars':>6} {'case':>6} {'legacy us':>10} {'matcher us':>11} {'speedup':>8}")
+    for length in (100, 2000, 10000):
+        clean = make_script(length)
+        # A hit in the last category near the end is the legacy scan's worst case
+        flagged = clean[: length - 10] + " nazi"
+        for case, text in (("clean", clean), ("hit", flagged)):
+            assert bool(legacy_scan(text)) == bool(matcher.scan(text))
+            number = max(10, 200000 // length)
+            legacy = min(timeit.repeat(lambda: legacy_scan(text), number=number, repeat=5)) / number * 1e6
+            single = min(timeit.repeat(lambda: matcher.scan(text), number=number, repeat=5)) / number * 1e6
+            print(f"{length:>6} {case:>6} {legacy:>10.1f} {single:>11.1f} {legacy / single:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Search latency over a synthetic SnapCast corpus: inverted index vs a regex scan of title/content
+Run from backend/: python benchmarks/bench_search.py [--docs 1000000]
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson import ObjectId
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from search import SearchIndex
+
+CATEGORIES = ["Motivation", "News", "Lifestyle", "Wellness", "Comedy", "Education", "Tech", "Creative"]
+TAGS = ["daily", "ai", "zen", "story", "tips", "focus", "fun", "deep"]
+
+def make_vocabulary(rng: random.Random, size: int = 50000):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = {"".join(rng.choices(letters, k=rng.randint(3, 9))) for _ in range(size)}
+    words = sorted(words)
+    # Zipf-like frequencies, as in real text
+    weights = 1 / np.arange(1, len(words) + 1) ** 1.1
+    return words, (weights / weights.sum()).tolist()
+
+def make_docs(count: int, words, weights, rng: random.Random):
+    start = datetime(2026, 1, 1)
+    np_rng = np.random.default_rng(7)
+    indices = np_rng.choice(len(words), size=(count, 32), p=weights)
+    for i in range(count):
+        row = [words[j] for j in indices[i]]
+        yield {"_id": ObjectId(), "title": " ".join(row[:6]), "content": " ".join(row[6:]), "tags": rng.sample(TAGS, 2), "category": rng.choice(CATEGORIES), "is_public": True, "updated_at": start + timedelta(seconds=i)}
+
+def percentile(samples, q):
+    return float(np.percentile(np.array(samples) * 1000, q))
+
+async def build(index: SearchIndex, docs):
+    for count, doc in enumerate(docs, 1):
+        index.upsert(doc)
+        if count % 10000 == 0:
+            await index.maintain()
+    await index.maintain(force=True)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+    rng = random.Random(42)
+    words, weights = make_vocabulary(rng)
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        index = SearchIndex(index_dir)
+        index.flush_docs = 100000
+        index.open()
+        start = time.perf_counter()
+        asyncio.run(build(index, make_docs(args.docs, words, weights, rng)))
+        print(f"indexed {args.docs:,} docs in {time.perf_counter() - start:.1f}s, {index.get_stats()['segments']} segments")
+        asyncio.run(index.close())
+
+        start = time.perf_counter()
+        index = SearchIndex(index_dir)
+        index.open()
+        print(f"reopened (mmap) in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        # Mixed workload: 1-3 full terms drawn by frequency, half with a type-ahead prefix
+        queries = []
+        for _ in range(args.queries):
+            terms = rng.choices(words, weights=weights, k=rng.randint(1, 3))
+            text = " ".join(terms) if rng.random() < 0.5 else " ".join(terms[:-1] + [terms[-1][:3]])
+            queries.append((text, rng.choice([None, rng.choice(CATEGORIES)])))
+        latencies = []
+        for text, category in queries:
+            start = time.perf_counter()
+            index.search(text, category=category, limit=20)
+            latencies.append(time.perf_counter() - start)
+        print(f"index search: p50 {percentile(latencies, 50):.2f} ms, p99 {percentile(latencies, 99):.2f} ms")
+
+    # Baseline: what a regex scan has to touch per query (measured on a 50k-doc sample, scaled)
+    sample = [(doc["title"], doc["content"]) for doc in make_docs(min(args.docs, 50000), words, weights, rng)]
+    scan = []
+    for text, _ in queries[:50]:
+        pattern = re.compile(re.escape(text.split()[0]), re.IGNORECASE)
+        start = time.perf_counter()
+        [title for title, content in sample if pattern.search(title) or pattern.search(content)]
+        scan.append((time.perf_counter() - start) * args.docs / len(sample))
+    print(f"regex scan (scaled to {args.docs:,} docs): p50 {percentile(scan, 50):.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Waveform extraction on a 5-minute 44.1 kHz clip: per-sample Python loop vs the vectorized pass
+Run from backend/: python benchmarks/bench_waveform.py
+"""
+
+import os
+import sys
+import math
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from waveform import compute_waveforms, pack_waveforms
+
+SAMPLE_RATE = 44100
+DURATION_SECONDS = 300
+RESOLUTIONS = (64, 256, 1024)
+
+def make_clip() -> np.ndarray:
+    rng = np.random.default_rng(42)
+    t = np.arange(SAMPLE_RATE * DURATION_SECONDS, dtype=np.float32) / SAMPLE_RATE
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 0.2 * t)
+    return (envelope * np.sin(2 * np.pi * 220 * t) * 0.8 + rng.normal(0, 0.02, t.size)).astype(np.float32)
+
+def python_loop(samples, bars: int):
+    """What a naive implementation would do, one resolution at a time"""
+    per_bar = math.ceil(len(samples) / bars)
+    peaks, rms = [], []
+    for bar in range(bars):
+        peak = 0.0
+        total = 0.0
+        for value in samples[bar * per_bar:(bar + 1) * per_bar]:
+            magnitude = abs(value)
+            peak = max(peak, magnitude)
+            total += value * value
+        peaks.append(round(peak * 255))
+        rms.append(round(math.sqrt(total / per_bar) * 255))
+    return peaks, rms
+
+def main():
+    samples = make_clip()
+    print(f"clip: {DURATION_SECONDS}s @ {SAMPLE_RATE} Hz = {samples.size:,} samples")
+
+    start = time.perf_counter()
+    waveforms = compute_waveforms(samples, RESOLUTIONS)
+    vectorized = time.perf_counter() - start
+    packed = pack_waveforms(waveforms)
+    print(f"vectorized, {len(RESOLUTIONS)} resolutions: {vectorized * 1000:.1f} ms, packed size {len(packed)} bytes")
+
+    as_list = samples.tolist()
+    start = time.perf_counter()
+    peaks, _ = python_loop(as_list, RESOLUTIONS[0])
+    loop_one = time.perf_counter() - start
+    print(f"python loop, 1 resolution:   {loop_one * 1000:.1f} ms ({loop_one / vectorized:.0f}x slower)")
+
+    assert np.abs(np.array(peaks) - waveforms[RESOLUTIONS[0]][0].astype(int)).max() <= 1
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+Load test of the TTS app against deterministic local stand-ins for Gemini, Murf and Redis
+Drives the ASGI app in-process at fixed concurrency, cold and warm cache, and prints JSON to diff between releases.
+TTS rows go to a scratch SQLite database unless DATABASE_URL is set.
+Run from backend/: python benchmarks/loadtest.py [--requests 400] [--concurrency 32] [--output results.json]
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import math
+import time
+import wave
+import random
+import asyncio
+import hashlib
+import argparse
+import itertools
+import platform
+import subprocess
+import tempfile
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from google.api_core import exceptions as google_exceptions
+from redis.exceptions import ResponseError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import cache
+import gemini
+from singleflight import RELEASE_LEASE_SCRIPT, RENEW_LEASE_SCRIPT
+
+class FakeRedis:
+    """In-process stand-in for the redis.asyncio calls the app makes on these paths.
+
+    Keys expire like Redis, pub/sub reaches every subscriber, and EVAL runs
+    a Python version of each script it knows. An optional per-command delay
+    stands in for the network round trip.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.data: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self.lists: Dict[str, deque] = defaultdict(deque)
+        self.subscribers: Dict[str, List[asyncio.Queue]] = defaultdict(list)
+        self.scripts = {RELEASE_LEASE_SCRIPT: self._release_lease, RENEW_LEASE_SCRIPT: self._renew_lease}
+        self.commands = 0
+
+    async def _round_trip(self, count: int = 1):
+        self.commands += count
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _get(self, key: str) -> Any:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry[0]
+
+    def _set(self, key: str, value: Any, ex: Optional[float] = None, px: Optional[float] = None, nx: bool = False) -> Optional[bool]:
+        if nx and self._get(key) is not None:
+            return None
+        ttl = ex if ex is not None else (px / 1000 if px is not None else None)
+        self.data[key] = (str(value), time.monotonic() + ttl if ttl is not None else None)
+        return True
+
+    def _delete(self, *keys: str) -> int:
+        return sum(self.data.pop(key, None) is not None or bool(self.lists.pop(key, None)) for key in keys)
+
+    def _exists(self, *keys: str) -> int:
+        return sum(self._get(key) is not None or bool(self.lists.get(key)) for key in keys)
+
+    def _lpush(self, key: str, *values: Any) -> int:
+        self.lists[key].extendleft(str(value) for value in values)
+        return len(self.lists[key])
+
+    def _rpush(self, key: str, *values: Any) -> int:
+        self.lists[key].extend(str(value) for value in values)
+        return len(self.lists[key])
+
+    def _llen(self, key: str) -> int:
+        return len(self.lists.get(key, ()))
+
+    def _lrange(self, key: str, start: int, end: int) -> List[str]:
+        items = list(self.lists.get(key, ()))
+        return items[start:None if end == -1 else end + 1]
+
+    def _lrem(self, key: str, count: int, value: Any) -> int:
+        items = self.lists.get(key)
+        if not items or str(value) not in items:
+            return 0
+        items.remove(str(value))
+        return 1
+
+    def _lmove(self, source: str, destination: str, where_from: str, where_to: str) -> Optional[str]:
+        items = self.lists.get(source)
+        if not items:
+            return None
+        value = items.pop() if where_from == "RIGHT" else items.popleft()
+        self.lists[destination].append(value) if where_to == "RIGHT" else self.lists[destination].appendleft(value)
+        return value
+
+    def _publish(self, channel: str, message: str) -> int:
+        for queue in self.subscribers[channel]:
+            queue.put_nowait({"type": "message", "channel": channel, "data": message})
+        return len(self.subscribers[channel])
+
+    def _release_lease(self, keys: List[str], args: List[str]) -> int:
+        return self._delete(keys[0]) if self._get(keys[0]) == args[0] else 0
+
+    def _renew_lease(self, keys: List[str], args: List[str]) -> int:
+        if self._get(keys[0]) != args[0]:
+            return 0
+        self._set(keys[0], args[0], px=float(args[1]))
+        return 1
+
+    def _eval(self, script: str, numkeys: int, *keys_and_args: Any) -> Any:
+        handler = self.scripts.get(script)
+        if handler is None:
+            raise ResponseError("NOSCRIPT script not implemented by the stand-in")
+        return handler([str(key) for key in keys_and_args[:numkeys]], [str(arg) for arg in keys_and_args[numkeys:]])
+
+    async def get(self, key: str) -> Any:
+        await self._round_trip()
+        return self._get(key)
+
+    async def mget(self, keys, *args) -> List[Any]:
+        await self._round_trip()
+        return [self._get(key) for key in ([keys] if isinstance(keys, str) else list(keys)) + list(args)]
+
+    async def set(self, key: str, value: Any, ex: Optional[float] = None, px: Optional[float] = None, nx: bool = False) -> Optional[bool]:
+        await self._round_trip()
+        return self._set(key, value, ex, px, nx)
+
+    async def delete(self, *keys: str) -> int:
+        await self._round_trip()
+        return self._delete(*keys)
+
+    async def exists(self, *keys: str) -> int:
+        await self._round_trip()
+        return self._exists(*keys)
+
+    async def publish(self, channel: str, message: str) -> int:
+        await self._round_trip()
+        return self._publish(channel, message)
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args: Any) -> Any:
+        await self._round_trip()
+        return self._eval(script, numkeys, *keys_and_args)
+
+    async def lpush(self, key: str, *values: Any) -> int:
+        await self._round_trip()
+        return self._lpush(key, *values)
+
+    async def rpush(self, key: str, *values: Any) -> int:
+        await self._round_trip()
+        return self._rpush(key, *values)
+
+    async def llen(self, key: str) -> int:
+        await self._round_trip()
+        return self._llen(key)
+
+    async def lrange(self, key: str, start: int, end: int) -> List[str]:
+        await self._round_trip()
+        return self._lrange(key, start, end)
+
+    async def lrem(self, key: str, count: int, value: Any) -> int:
+        await self._round_trip()
+        return self._lrem(key, count, value)
+
+    async def blmove(self, source: str, destination: str, timeout: float, src: str = "LEFT", dest: str = "RIGHT") -> Optional[str]:
+        deadline = time.monotonic() + timeout
+        while True:
+            await self._round_trip()
+            value = self._lmove(source, destination, src, dest)
+            if value is not None or time.monotonic() >= deadline:
+                return value
+            await asyncio.sleep(0.01)
+
+    async def brpoplpush(self, source: str, destination: str, timeout: float = 0) -> Optional[str]:
+        return await self.blmove(source, destination, timeout, "RIGHT", "LEFT")
+
+    async def ping(self) -> bool:
+        await self._round_trip()
+        return True
+
+    async def aclose(self):
+        pass
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> "FakePubSub":
+        return FakePubSub(self)
+
+class FakePipeline:
+    """Buffers commands and runs them in one round trip"""
+
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands: List[Tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str) -> Callable[..., "FakePipeline"]:
+        operation = getattr(self.redis, f"_{name}")
+
+        def queue(*args, **kwargs) -> "FakePipeline":
+            self.commands.append((operation, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self) -> List[Any]:
+        commands, self.commands = self.commands, []
+        await self.redis._round_trip(len(commands))
+        return [operation(*args, **kwargs) for operation, args, kwargs in commands]
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.commands = []
+
+class FakePubSub:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.channels: List[str] = []
+
+    async def subscribe(self, *channels: str):
+        for channel in channels:
+            self.redis.subscribers[channel].append(self.queue)
+            self.channels.append(channel)
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+    async def get_message(self, ignore_subscribe_messages: bool = False, timeout: float = 0.0) -> Optional[Dict]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        for channel in self.channels:
+            self.redis.subscribers[channel].remove(self.queue)
+        self.channels = []
+
+class FakeGeminiModel:
+    """Answers the app's three prompt shapes after a seeded, jittered delay, failing at error_rate.
+
+    Randomness is drawn per prompt and attempt, so a run is reproducible
+    whatever order concurrent requests reach the model in.
+    """
+
+    def __init__(self, seed: int, latency: float, jitter: float, error_rate: float):
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.attempts: Dict[str, int] = defaultdict(int)
+        self.calls = 0
+        self.errors = 0
+
+    async def generate_content_async(self, prompt: str) -> SimpleNamespace:
+        digest = hashlib.sha256(prompt.encode()).hexdigest()
+        self.attempts[digest] += 1
+        self.calls += 1
+        rng = random.Random(f"{self.seed}:{digest}:{self.attempts[digest]}")
+        await asyncio.sleep(max(0.0, self.latency * (1 + self.jitter * (2 * rng.random() - 1))))
+        if rng.random() < self.error_rate:
+            self.errors += 1
+            raise google_exceptions.ServiceUnavailable("stand-in error")
+        return SimpleNamespace(text=self.respond(prompt))
+
+    @staticmethod
+    def respond(prompt: str) -> str:
+        batch = re.match(r"Analyze each of the following (\d+) texts", prompt)
+        if batch:
+            return json.dumps([{"id": index, "score": 0.05} for index in range(1, int(batch.group(1)) + 1)])
+        original = re.search(r'Original: "(.*)"\nContext:', prompt, re.DOTALL)
+        if original:
+            return original.group(1) + " Truly."
+        return "Every morning is a fresh start. Take one small step, then another, and notice how far you have come by evening."
+
+class FakeMurf:
+    """MurfAIClient stand-in: fixed synthesis delay and a one-second tone as the audio"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as output:
+            output.setnchannels(1)
+            output.setsampwidth(2)
+            output.setframerate(22050)
+            output.writeframes(b"".join(int(8000 * math.sin(2 * math.pi * 440 * i / 22050)).to_bytes(2, "little", signed=True) for i in range(22050)))
+        self.audio = buffer.getvalue()
+
+    async def generate_speech(self, script: str, voice_model: Any, emotion_tone: Any) -> Tuple[str, float]:
+        self.calls += 1
+        start_time = time.time()
+        await asyncio.sleep(self.latency)
+        return f"https://murf.local/audio/{hashlib.md5(script.encode()).hexdigest()}.wav", time.time() - start_time
+
+    async def fetch_audio(self, audio_url: str) -> bytes:
+        return self.audio
+
+class LoopLagMonitor:
+    """Samples how late a periodic timer fires while the load runs"""
+
+    def __init__(self, tick: float = 0.01):
+        self.tick = tick
+        self.lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.tick)
+            self.lags.append(time.perf_counter() - start - self.tick)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> List[float]:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return self.lags
+
+def percentiles_ms(samples: List[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "max": None, "mean": None}
+    ordered = sorted(samples)
+    rank = lambda q: ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+    return {"p50": round(rank(0.5) * 1000, 2), "p95": round(rank(0.95) * 1000, 2), "p99": round(rank(0.99) * 1000, 2), "max": round(ordered[-1] * 1000, 2), "mean": round(sum(ordered) / len(ordered) * 1000, 2)}
+
+async def run_scenario(client: httpx.AsyncClient, send: Callable[[httpx.AsyncClient, int], Any], total: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    counter = itertools.count()
+
+    async def worker():
+        while (index := next(counter)) < total:
+            start = time.perf_counter()
+            try:
+                response = await send(client, index)
+                status = str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    lags = await monitor.stop()
+    errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "statuses": dict(sorted(statuses.items())),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1) if elapsed else None,
+        "latency_ms": percentiles_ms(latencies),
+        "loop_lag_ms": percentiles_ms(lags),
+    }
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def seed_status_checks(mongo_url: str, count: int):
+    """Import server.py against a scratch database holding count status checks"""
+    os.environ["MONGO_URL"] = mongo_url
+    os.environ.setdefault("DB_NAME", "eona_loadtest")
+    import server
+    await server.db.status_checks.delete_many({})
+    base = datetime.utcnow()
+    await server.db.status_checks.insert_many([{"id": f"check-{i}", "client_name": f"client-{i % 10}", "timestamp": base - timedelta(seconds=i)} for i in range(count)])
+    return server
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warm-scripts", type=int, default=20, help="distinct scripts cycled by the warm-cache scenario")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--gemini-latency-ms", type=float, default=300)
+    parser.add_argument("--gemini-jitter", type=float, default=0.3, help="latency varies by up to this fraction either way")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.02)
+    parser.add_argument("--llm-rps", type=float, default=None, help="override llm.requests_per_second (and burst) for the run")
+    parser.add_argument("--murf-latency-ms", type=float, default=800)
+    parser.add_argument("--redis-latency-ms", type=float, default=0.2)
+    parser.add_argument("--no-post-process", action="store_true", help="skip ffmpeg post-processing of the synthesized audio")
+    parser.add_argument("--mongo-url", default=None, help="also load the streamed /api/status list from server.py against this MongoDB")
+    parser.add_argument("--scenarios", default="tts_cold,tts_warm,generate_script,tts_jobs,job_status,list_voices,stats,list_status")
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    # Stand-ins go in before main is imported, which builds its clients (and SQL engine) at import time
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='eona-loadtest-')}/eona.db")
+    fake_redis = FakeRedis(args.redis_latency_ms / 1000)
+    cache.create_redis_client = lambda: fake_redis
+    fake_model = FakeGeminiModel(args.seed, args.gemini_latency_ms / 1000, args.gemini_jitter, args.gemini_error_rate)
+    gemini.GeminiGateway.get_model = lambda self, name=None: fake_model
+
+    import logging
+    import main
+    logging.getLogger().setLevel(logging.WARNING)
+    fake_murf = FakeMurf(args.murf_latency_ms / 1000)
+    main.murf_client = fake_murf
+    if args.no_post_process:
+        main.AUDIO_POST_PROCESS = False
+    if args.llm_rps:
+        gemini.get_gateway()._bucket = gemini.TokenBucket(args.llm_rps, max(1, int(args.llm_rps)))
+    # Requests carry a fixed principal; token verification is cached per token and not what this measures
+    main.app.dependency_overrides[main.get_current_user] = lambda: main.AuthPrincipal(id=1, email="loadtest@example.com", name="loadtest")
+
+    voice, tone, purpose = list(main.VoiceModel)[0].value, list(main.EmotionTone)[0].value, list(main.Purpose)[0].value
+    # Cold scripts are unique to this run so audio blobs from earlier runs are not reused
+    run_tag = f"{args.seed}-{time.time_ns()}"
+    tts_body = lambda text: {"script": text, "voice_model": voice, "emotion_tone": tone, "purpose": purpose}
+    warm_scripts = [f"Warm benchmark script number {i}. Keep going, the next step is the one that counts." for i in range(args.warm_scripts)]
+    # Jobs are only submitted; no worker runs, so they stay queued in the stand-in Redis
+    job_ids: List[int] = []
+
+    async def submit_job(client: httpx.AsyncClient, i: int) -> httpx.Response:
+        response = await client.post("/api/v1/tts/jobs", json=tts_body(f"Job benchmark script {run_tag} number {i}. Keep going, the next step is the one that counts."))
+        if response.status_code == 202:
+            job_ids.append(response.json()["job_id"])
+        return response
+
+    scenarios: Dict[str, Callable[[httpx.AsyncClient, int], Any]] = {
+        "tts_cold": lambda client, i: client.post("/api/v1/tts/generate", json=tts_body(f"Cold benchmark script {run_tag} number {i}. Keep going, the next step is the one that counts.")),
+        "tts_warm": lambda client, i: client.post("/api/v1/tts/generate", json=tts_body(warm_scripts[i % len(warm_scripts)])),
+        "generate_script": lambda client, i: client.post("/api/v1/generate-script", json={"idea": f"A morning routine idea number {i % 50}", "tone": tone, "purpose": purpose}),
+        "tts_jobs": submit_job,
+        "job_status": lambda client, i: client.get(f"/api/v1/tts/jobs/{job_ids[i % len(job_ids)]}"),
+        "list_voices": lambda client, i: client.get("/api/v1/voices"),
+        "stats": lambda client, i: client.get("/api/v1/stats"),
+    }
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    report: Dict[str, Any] = {
+        "meta": {"revision": git_revision(), "python": platform.python_version(), "platform": platform.platform(), "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "args": vars(args)},
+        "scenarios": {},
+        "skipped": {},
+    }
+
+    # Runs the app's startup and shutdown handlers around the load
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://loadtest", timeout=120) as client:
+            for name in selected:
+                if name == "list_status":
+                    if not args.mongo_url:
+                        report["skipped"][name] = "needs --mongo-url"
+                        continue
+                    server = await seed_status_checks(args.mongo_url, 5000)
+                    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://loadtest", timeout=120) as server_client:
+                        report["scenarios"][name] = await run_scenario(server_client, lambda c, i: c.get("/api/status", params={"limit": 1000}), args.requests, args.concurrency)
+                    await server.db.status_checks.delete_many({})
+                    continue
+                if name not in scenarios:
+                    report["skipped"][name] = "unknown scenario"
+                    continue
+                if name == "job_status" and not job_ids:
+                    for i in range(args.warm_scripts):
+                        await submit_job(client, -1 - i)
+                if name == "tts_warm":
+                    # Prime the cache outside the timed run
+                    for script in warm_scripts:
+                        await client.post("/api/v1/tts/generate", json=tts_body(script))
+                report["scenarios"][name] = await run_scenario(client, scenarios[name], args.requests, args.concurrency)
+
+    report["stand_ins"] = {"gemini_calls": fake_model.calls, "gemini_errors": fake_model.errors, "murf_calls": fake_murf.calls, "redis_commands": fake_redis.commands}
+    report["app"] = {"cache": main.cache_stats, "coalescing": main.tts_coalescer.stats, "gemini": gemini.get_gateway().get_stats(), "persistence": main.tts_writer.get_stats()}
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    asyncio.run(main())
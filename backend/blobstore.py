@@ -0,0 +1,203 @@
+import os
+import re
+import time
+import mmap
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from config import get_setting
+
+logger = logging.getLogger(__name__)
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+class BlobStore:
+    """Content-addressed blob store on local disk.
+
+    Blobs live at ``root/ab/cd/<sha256>``; identical content is stored once.
+    Writes go to a temp file and are renamed into place, so readers never
+    see a partial blob. Small named refs map logical names (a rendered
+    variant, a provider URL) to digests. When the store grows past
+    ``max_bytes`` the least recently accessed blobs are evicted; access
+    time is bumped explicitly because most mounts use relatime/noatime.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = Path(root or get_setting("audio.blob_dir", "data/audio/blobs"))
+        self.max_bytes = max_bytes or int(get_setting("audio.blob_max_mb", 2048)) * 1024 * 1024
+        self.touch_interval = get_setting("audio.blob_touch_interval", 60)
+        self._size: Optional[int] = None
+        self._evict_lock = threading.Lock()
+        self.stats = {"puts": 0, "dedup_hits": 0, "evictions": 0}
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def ref_path(self, name: str) -> Path:
+        return self.root / "refs" / hashlib.sha256(name.encode()).hexdigest()
+
+    def exists(self, digest: str) -> bool:
+        return self.path(digest).exists()
+
+    def put(self, data: bytes) -> str:
+        """Store data and return its sha256 digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if path.exists():
+            self.stats["dedup_hits"] += 1
+            self.touch(digest, force=True)
+            return digest
+        self._write_atomic(path, data)
+        self.stats["puts"] += 1
+        if self._size is not None:
+            self._size += len(data)
+        if self._current_size() > self.max_bytes:
+            self.evict()
+        return digest
+
+    def open(self, digest: str) -> Tuple[BinaryIO, int]:
+        """Open a blob for reading and return it with its size; raises FileNotFoundError"""
+        blob = open(self.path(digest), "rb")
+        return blob, os.fstat(blob.fileno()).st_size
+
+    def read(self, digest: str) -> bytes:
+        self.touch(digest)
+        return self.path(digest).read_bytes()
+
+    def set_ref(self, name: str, digest: str):
+        self._write_atomic(self.ref_path(name), digest.encode())
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Digest a ref points to, or None if the ref or its blob is gone"""
+        try:
+            digest = self.ref_path(name).read_text()
+        except FileNotFoundError:
+            return None
+        return digest if self.exists(digest) else None
+
+    def touch(self, digest: str, force: bool = False):
+        path = self.path(digest)
+        try:
+            stat = path.stat()
+            now = time.time()
+            if force or now - stat.st_atime > self.touch_interval:
+                os.utime(path, (now, stat.st_mtime))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Delete least recently accessed blobs until usage is 90% of max_bytes"""
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            blobs = sorted(self._scan(), key=lambda entry: entry[1])
+            total = sum(size for _, _, size in blobs)
+            target = int(self.max_bytes * 0.9)
+            for path, _, size in blobs:
+                if total <= target:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self.stats["evictions"] += 1
+            self._size = total
+        finally:
+            self._evict_lock.release()
+
+    def _current_size(self) -> int:
+        if self._size is None:
+            self._size = sum(size for _, _, size in self._scan())
+        return self._size
+
+    def _scan(self) -> Iterator[Tuple[Path, float, int]]:
+        if not self.root.exists():
+            return
+        for shard in self.root.iterdir():
+            if shard.name == "refs" or not shard.is_dir():
+                continue
+            for sub in shard.iterdir():
+                for entry in os.scandir(sub):
+                    if DIGEST_PATTERN.match(entry.name):
+                        stat = entry.stat()
+                        yield Path(entry.path), stat.st_atime, stat.st_size
+
+    def _write_atomic(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "bytes": self._size, "max_bytes": self.max_bytes}
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range Range header into inclusive (start, end).
+
+    Returns None for no/ignored Range, raises ValueError if unsatisfiable.
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None  # multi-range or malformed: serve the whole blob
+    if size == 0:
+        raise ValueError("No byte of an empty blob can satisfy a range")
+    first, last = match.groups()
+    if first == "":
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+class BlobResponse(Response):
+    """Serve a byte range of an open blob without reading it into memory.
+
+    The file is opened by the caller before headers are computed, so an
+    eviction that unlinks the blob meanwhile cannot fail the response; the
+    response closes it once sent. Uses the ASGI zero-copy send extension
+    (sendfile) when the server offers it; otherwise streams chunks sliced
+    from a read-only memory map.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, file: BinaryIO, start: int, end: int, size: int, status_code: int = 200, headers: Optional[Dict[str, str]] = None, media_type: Optional[str] = None):
+        super().__init__(content=None, status_code=status_code, headers=headers, media_type=media_type)
+        self.file = file
+        self.start = start
+        self.end = end
+        self.raw_headers = [(name, value) for name, value in self.raw_headers if name != b"content-length"]
+        self.raw_headers.append((b"content-length", str(end - start + 1 if size else 0).encode()))
+        self.size = size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        with self.file as f:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope["method"] == "HEAD" or self.size == 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            count = self.end - self.start + 1
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopysend", "file": f.fileno(), "offset": self.start, "count": count, "more_body": False})
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                offset = self.start
+                while offset <= self.end:
+                    chunk_end = min(offset + self.chunk_size, self.end + 1)
+                    await send({"type": "http.response.body", "body": mapped[offset:chunk_end], "more_body": chunk_end <= self.end})
+                    offset = chunk_end
@@ -0,0 +1,77 @@
+import time
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    """Raised when a call is short-circuited because the breaker is open"""
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Closed: calls pass through. After ``failure_threshold`` consecutive
+    failures the breaker opens and callers fail fast. Once ``reset_timeout``
+    seconds have passed, a single half-open probe is let through; success
+    closes the breaker, failure re-opens it for another timeout.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.stats = {"trips": 0, "short_circuited": 0}
+
+    def allow_request(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            logger.info(f"Circuit {self.name} half-open, probing backend")
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.stats["short_circuited"] += 1
+        return False
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may proceed"""
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit {self.name} is open")
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit {self.name} closed, backend recovered")
+        self.state = self.CLOSED
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self, error: Exception = None):
+        self._failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.stats["trips"] += 1
+                logger.error(f"Circuit {self.name} opened after {self._failures} consecutive failures: {error}")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def release(self, error: BaseException = None):
+        """End a call that neither succeeded nor failed on the backend, e.g. it was cancelled.
+
+        An abandoned half-open probe counts as a failure so the slot is never
+        left taken; in the closed state nothing is recorded.
+        """
+        if self._probe_in_flight:
+            self.record_failure(error)
+
+    def get_status(self) -> Dict:
+        return {"state": self.state, "consecutive_failures": self._failures, **self.stats}
@@ -0,0 +1,229 @@
+import os
+import sys
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+from redis.asyncio.retry import Retry
+from redis.backoff import NoBackoff
+from redis.exceptions import RedisError
+
+from breaker import CircuitBreaker
+from config import get_setting
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+UNAVAILABLE = object()
+
+def create_redis_breaker() -> CircuitBreaker:
+    return CircuitBreaker("redis", failure_threshold=get_setting("redis.breaker_failure_threshold", 5), reset_timeout=get_setting("redis.breaker_reset_timeout", 10))
+
+async def call_redis(breaker: CircuitBreaker, operation: Callable[[], Awaitable[Any]]) -> Any:
+    """Run a Redis operation through the breaker, returning UNAVAILABLE instead of raising"""
+    if not breaker.allow_request():
+        return UNAVAILABLE
+    try:
+        result = await operation()
+    except (RedisError, OSError) as e:
+        breaker.record_failure(e)
+        logger.warning(f"Redis unavailable, continuing without it: {e}")
+        return UNAVAILABLE
+    except Exception as e:
+        # A malformed reply still means the backend misbehaved
+        breaker.record_failure(e)
+        raise
+    except BaseException as e:
+        # Cancelled (client gone, wait_for timeout): free a half-open probe slot
+        breaker.release(e)
+        raise
+    breaker.record_success()
+    return result
+
+def create_redis_client() -> aioredis.Redis:
+    """Async Redis client backed by an explicit, bounded connection pool"""
+    pool = aioredis.BlockingConnectionPool(
+        host=os.getenv("REDIS_HOST", get_setting("redis.host", "localhost")),
+        port=int(os.getenv("REDIS_PORT", get_setting("redis.port", 6379))),
+        db=get_setting("redis.db", 0),
+        max_connections=get_setting("redis.max_connections", 50),
+        timeout=get_setting("redis.pool_timeout", 2),
+        socket_connect_timeout=get_setting("redis.socket_connect_timeout", 1),
+        socket_timeout=get_setting("redis.socket_timeout", 1),
+        health_check_interval=get_setting("redis.health_check_interval", 30),
+        # Fail fast and let the circuit breaker decide when to try again
+        retry=Retry(NoBackoff(), get_setting("redis.retries", 0)),
+        decode_responses=True,
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+class LocalTTLCache:
+    """Bounded in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None):
+        expires_at = time.monotonic() + min(ttl or self.ttl, self.ttl)
+        self._remove(key)
+        self._entries[key] = (value, expires_at)
+        self._bytes += sys.getsizeof(value)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def delete(self, key: str):
+        self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= sys.getsizeof(entry[0])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._bytes
+
+class TieredCache:
+    """In-process LRU tier in front of Redis.
+
+    Reads try the local tier first and fall back to Redis, populating the
+    local tier on the way back. Writes and deletes go to both tiers and are
+    broadcast on a pub/sub channel so other workers drop their local copy.
+    Redis is reached through a circuit breaker: while it is down the cache
+    degrades to the local tier instead of failing the request.
+    """
+
+    def __init__(self, redis_client: aioredis.Redis, max_size: Optional[int] = None, ttl: Optional[int] = None, local_ttl: Optional[int] = None, breaker: Optional[CircuitBreaker] = None):
+        self.redis = redis_client
+        self.breaker = breaker or create_redis_breaker()
+        self.ttl = ttl if ttl is not None else get_setting("cache.ttl", 86400)
+        self.local = LocalTTLCache(max_size if max_size is not None else get_setting("cache.max_size", 1000), local_ttl if local_ttl is not None else get_setting("cache.local_ttl", 300))
+        self.worker_id = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self.stats = {"local": {"hits": 0, "misses": 0}, "redis": {"hits": 0, "misses": 0, "unavailable": 0}, "invalidations": 0}
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.local.get(key)
+        if value is not None:
+            self.stats["local"]["hits"] += 1
+            return value
+        self.stats["local"]["misses"] += 1
+        value = await call_redis(self.breaker, lambda: self.redis.get(key))
+        if value is UNAVAILABLE:
+            self.stats["redis"]["unavailable"] += 1
+            return None
+        self.stats["redis"]["hits" if value is not None else "misses"] += 1
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Resolve many keys with at most one Redis round trip"""
+        keys = list(keys)
+        results: Dict[str, Optional[str]] = {}
+        missing: List[str] = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is not None:
+                results[key] = value
+            else:
+                missing.append(key)
+        self.stats["local"]["hits"] += len(keys) - len(missing)
+        self.stats["local"]["misses"] += len(missing)
+        if missing:
+            values = await call_redis(self.breaker, lambda: self.redis.mget(missing))
+            if values is UNAVAILABLE:
+                self.stats["redis"]["unavailable"] += len(missing)
+                return {key: results.get(key) for key in keys}
+            for key, value in zip(missing, values):
+                results[key] = value
+                self.stats["redis"]["hits" if value is not None else "misses"] += 1
+                if value is not None:
+                    self.local.set(key, value)
+        return results
+
+    async def set(self, key: str, value: str, ttl: Optional[int] = None):
+        await self.set_many({key: value}, ttl)
+
+    async def set_many(self, items: Dict[str, str], ttl: Optional[int] = None):
+        """Write many keys to both tiers in one pipelined Redis round trip"""
+        ttl = ttl or self.ttl
+        for key, value in items.items():
+            self.local.set(key, value, ttl)
+        pipe = self.redis.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.set(key, value, ex=ttl)
+            pipe.publish(INVALIDATION_CHANNEL, f"{self.worker_id} {key}")
+        if await call_redis(self.breaker, pipe.execute) is UNAVAILABLE:
+            self.stats["redis"]["unavailable"] += len(items)
+
+    async def delete(self, key: str):
+        self.local.delete(key)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(key)
+        pipe.publish(INVALIDATION_CHANNEL, f"{self.worker_id} {key}")
+        await call_redis(self.breaker, pipe.execute)
+
+    async def start_invalidation_listener(self):
+        """Subscribe to invalidations published by other workers"""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop_invalidation_listener(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+
+    async def _listen(self):
+        while True:
+            try:
+                self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                await self._pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in self._pubsub.listen():
+                    self._on_invalidation(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Entries may be stale while disconnected; local_ttl bounds how stale
+                logger.warning(f"Cache invalidation listener error: {e}")
+                await asyncio.sleep(5)
+
+    def _on_invalidation(self, message: Dict):
+        origin, _, key = message["data"].partition(" ")
+        if origin != self.worker_id:
+            self.local.delete(key)
+            self.stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict:
+        def ratio(tier: Dict) -> Optional[float]:
+            total = tier["hits"] + tier["misses"]
+            return round(tier["hits"] / total, 4) if total else None
+        return {
+            "local": {**self.stats["local"], "hit_ratio": ratio(self.stats["local"]), "entries": len(self.local), "memory_bytes": self.local.memory_bytes},
+            "redis": {**self.stats["redis"], "hit_ratio": ratio(self.stats["redis"]), "breaker": self.breaker.get_status()},
+            "invalidations": self.stats["invalidations"],
+        }
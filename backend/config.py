@@ -0,0 +1,30 @@
+import os
+import logging
+from pathlib import Path
+from typing import Any, Dict
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = Path(os.getenv("EONA_CONFIG", Path(__file__).parent / "config.yaml"))
+
+def load_config(path: Path = CONFIG_PATH) -> Dict[str, Any]:
+    """Load config.yaml, falling back to an empty config if it is missing"""
+    try:
+        with open(path) as f:
+            return yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        logger.warning(f"Config file not found at {path}, using defaults")
+        return {}
+
+settings = load_config()
+
+def get_setting(path: str, default: Any = None) -> Any:
+    """Look up a dotted key such as 'cache.ttl'"""
+    node: Any = settings
+    for part in path.split("."):
+        if not isinstance(node, dict) or part not in node:
+            return default
+        node = node[part]
+    return node
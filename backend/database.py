@@ -1,8 +1,19 @@
 import os
+from datetime import datetime
+from enum import Enum
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+from sqlalchemy import Column, DateTime, Float, Integer, String, Text, create_engine, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+from typing import Any, Dict, List, Optional
 import logging
 
+from config import get_setting
+from models import INDEXES
+from slowlog import SlowQueryListener
+
 logger = logging.getLogger(__name__)
 
 class Database:
@@ -11,10 +22,34 @@ class Database:
 
 # Database instance
 db_instance = Database()
+slow_queries = SlowQueryListener()
+
+def mongo_client_options() -> Dict[str, Any]:
+    """Pool and timeout settings for every AsyncIOMotorClient, plus the slow-query listener"""
+    return {
+        "maxPoolSize": get_setting("mongo.max_pool_size", 100),
+        "minPoolSize": get_setting("mongo.min_pool_size", 0),
+        "maxIdleTimeMS": get_setting("mongo.max_idle_time_ms", 60000),
+        "waitQueueTimeoutMS": get_setting("mongo.wait_queue_timeout_ms", 2000),
+        "serverSelectionTimeoutMS": get_setting("mongo.server_selection_timeout_ms", 5000),
+        "connectTimeoutMS": get_setting("mongo.connect_timeout_ms", 5000),
+        "socketTimeoutMS": get_setting("mongo.socket_timeout_ms", 30000),
+        "event_listeners": [slow_queries],
+    }
+
+async def ensure_indexes(database, indexes: Optional[Dict[str, List[IndexModel]]] = None):
+    """Create the indexes declared in models; existing identical indexes are left alone"""
+    for collection, models in (indexes or INDEXES).items():
+        try:
+            names = await database[collection].create_indexes(models)
+            logger.info(f"Indexes on {collection}: {', '.join(names)}")
+        except OperationFailure as e:
+            # Usually an index with the same name but different options, or duplicates under a new unique index
+            logger.error(f"Could not create indexes on {collection}: {e}")
 
 async def connect_to_mongo():
     """Create database connection"""
-    db_instance.client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db_instance.client = AsyncIOMotorClient(os.environ["MONGO_URL"], **mongo_client_options())
     db_instance.database = db_instance.client[os.environ.get("DB_NAME", "snapcast")]
     
     # Test connection
@@ -24,9 +59,12 @@ async def connect_to_mongo():
     except Exception as e:
         logger.error(f"Failed to connect to MongoDB: {e}")
         raise
+    await ensure_indexes(db_instance.database)
+    slow_queries.start(db_instance.client)
 
 async def close_mongo_connection():
     """Close database connection"""
+    await slow_queries.stop()
     if db_instance.client:
         db_instance.client.close()
         logger.info("MongoDB connection closed")
@@ -49,4 +87,68 @@ def get_follows_collection():
     return get_database().follows
 
 def get_comments_collection():
-    return get_database().comments
\ No newline at end of file
+    return get_database().comments
+
+# --- TTS engine tables (SQLAlchemy), used by main.py and worker.py ---
+SQL_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/eona.db")
+engine = create_engine(SQL_DATABASE_URL, connect_args={"check_same_thread": False} if SQL_DATABASE_URL.startswith("sqlite") else {})
+SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+Base = declarative_base()
+
+class VoiceModel(str, Enum):
+    SARAH = "sarah"
+    EMMA = "emma"
+    LISA = "lisa"
+    ALEX = "alex"
+
+class EmotionTone(str, Enum):
+    ENERGETIC = "energetic"
+    CALM = "calm"
+    CARING = "caring"
+
+class Purpose(str, Enum):
+    PRESENTATION = "presentation"
+    MEDITATION = "meditation"
+    TEACHING = "teaching"
+
+class User(Base):
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key=True, index=True)
+    google_id = Column(String, unique=True, index=True, nullable=False)
+    email = Column(String, unique=True, index=True, nullable=False)
+    name = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class TTSRequest(Base):
+    __tablename__ = "tts_requests"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String, index=True)
+    # Not unique: a script is regenerated after its cache entry expires and can be queued as a job more than once
+    script_hash = Column(String, index=True)
+    original_script = Column(Text)
+    enhanced_script = Column(Text)
+    voice_model = Column(String)
+    emotion_tone = Column(String)
+    purpose = Column(String)
+    audio_url = Column(String)
+    processing_time = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    status = Column(String)
+
+def create_sql_schema(bind: Engine = engine):
+    """Create missing tables and bring indexes of existing databases in line with the models.
+
+    create_all never alters an existing index, so databases created while
+    script_hash was unique keep that UNIQUE index until it is rebuilt here.
+    """
+    Base.metadata.create_all(bind=bind)
+    script_hash_index = next(index for index in TTSRequest.__table__.indexes if index.name == "ix_tts_requests_script_hash")
+    existing = {index["name"]: index for index in inspect(bind).get_indexes(TTSRequest.__tablename__)}
+    if existing.get(script_hash_index.name, {}).get("unique"):
+        with bind.begin() as connection:
+            # IF EXISTS/checkfirst: several workers may run this on the same database at startup
+            connection.execute(text(f"DROP INDEX IF EXISTS {script_hash_index.name}"))
+            script_hash_index.create(connection, checkfirst=True)
+        logger.info(f"Rebuilt {script_hash_index.name} as a non-unique index")
@@ -0,0 +1,258 @@
+import time
+import uuid
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from breaker import CircuitBreaker
+from cache import UNAVAILABLE, call_redis, create_redis_breaker
+from config import get_setting
+from feed import COUNTER_KINDS, FeedEngine
+from singleflight import RELEASE_LEASE_SCRIPT
+from timeline import TimelineService
+
+logger = logging.getLogger(__name__)
+
+# Counter fields per collection; anything else is rejected
+COUNTER_FIELDS = {
+    "snapcasts": ("likes", "remixes", "shares", "comments"),
+    "users": ("followers", "following"),
+}
+
+# Move the pending hash aside (unless a previous flush left one) and return what is to be applied
+TAKE_PENDING_SCRIPT = """
+if redis.call('exists', KEYS[2]) == 0 and redis.call('exists', KEYS[1]) == 1 then
+    redis.call('rename', KEYS[1], KEYS[2])
+end
+return redis.call('hgetall', KEYS[2])
+"""
+
+class EngagementCounters:
+    """Buffered like/follow/share/remix/comment counters.
+
+    Increments go to a Redis hash per collection (or an in-process buffer
+    while Redis is down) and are applied to Mongo periodically as one
+    unordered bulk_write of $inc updates, so a viral SnapCast costs one
+    write per flush instead of one per tap. One worker flushes at a time
+    under a Redis lock. Reads add the deltas that are not in Mongo yet.
+    Likes and follows only count when their Like/Follow document is
+    created or deleted, which the unique indexes in models make idempotent.
+    """
+
+    def __init__(self, redis_client: aioredis.Redis, db: Any, feed: Optional[FeedEngine] = None, timelines: Optional[TimelineService] = None, breaker: Optional[CircuitBreaker] = None):
+        self.redis = redis_client
+        self.db = db
+        self.feed = feed
+        self.timelines = timelines
+        self.breaker = breaker or create_redis_breaker()
+        self.prefix = get_setting("engagement.key_prefix", "engagement")
+        self.flush_interval = get_setting("engagement.flush_interval", 2)
+        self.lock_seconds = get_setting("engagement.lock_seconds", 30)
+        self._local: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"increments": 0, "flushes": 0, "documents_written": 0, "local_increments": 0, "duplicates": 0, "rescore_errors": 0}
+
+    def pending_key(self, collection: str) -> str:
+        return f"{self.prefix}:pending:{collection}"
+
+    def flushing_key(self, collection: str) -> str:
+        return f"{self.prefix}:flushing:{collection}"
+
+    async def increment(self, collection: str, doc_id: Any, field: str, delta: int = 1):
+        if field not in COUNTER_FIELDS[collection]:
+            raise ValueError(f"{field} is not a {collection} counter")
+        self.stats["increments"] += 1
+        result = await call_redis(self.breaker, lambda: self.redis.hincrby(self.pending_key(collection), f"{doc_id}:{field}", delta))
+        if result is UNAVAILABLE:
+            self._local[(collection, str(doc_id), field)] += delta
+            self.stats["local_increments"] += 1
+
+    async def like(self, user_id: Any, snapcast_id: Any, category: Optional[str] = None) -> bool:
+        """Like a SnapCast; False if the user already liked it.
+
+        With the SnapCast's category, the like is added to its trending score
+        right away, and the Like document keeps the time it was weighted at
+        so unlike() can subtract exactly the same weight.
+        """
+        like = {"user_id": ObjectId(user_id), "snapcast_id": ObjectId(snapcast_id), "created_at": datetime.utcnow()}
+        scored = category is not None and self.feed is not None
+        if scored:
+            like.update(category=category, trending_at=time.time())
+        try:
+            result = await self.db.likes.insert_one(like)
+        except DuplicateKeyError:
+            self.stats["duplicates"] += 1
+            return False
+        await self.increment("snapcasts", snapcast_id, "likes")
+        if scored and not await self.feed.record(str(snapcast_id), category, "like", at=like["trending_at"]):
+            # Never added to the score, so there is nothing for unlike() to take back
+            await self.db.likes.update_one({"_id": result.inserted_id}, {"$unset": {"trending_at": ""}})
+        return True
+
+    async def unlike(self, user_id: Any, snapcast_id: Any) -> bool:
+        like = await self.db.likes.find_one_and_delete({"user_id": ObjectId(user_id), "snapcast_id": ObjectId(snapcast_id)}, {"category": 1, "trending_at": 1})
+        if like is None:
+            return False
+        await self.increment("snapcasts", snapcast_id, "likes", -1)
+        if self.feed is not None and like.get("trending_at") is not None:
+            await self.feed.record(str(snapcast_id), like["category"], "like", -1, at=like["trending_at"])
+        return True
+
+    async def follow(self, follower_id: Any, following_id: Any) -> bool:
+        """Follow a user; False if already following"""
+        if str(follower_id) == str(following_id):
+            raise ValueError("Users cannot follow themselves")
+        try:
+            await self.db.follows.insert_one({"follower_id": ObjectId(follower_id), "following_id": ObjectId(following_id), "created_at": datetime.utcnow()})
+        except DuplicateKeyError:
+            self.stats["duplicates"] += 1
+            return False
+        await self.increment("users", follower_id, "following")
+        await self.increment("users", following_id, "followers")
+        if self.timelines is not None:
+            await self.timelines.on_follow(follower_id, following_id)
+        return True
+
+    async def unfollow(self, follower_id: Any, following_id: Any) -> bool:
+        result = await self.db.follows.delete_one({"follower_id": ObjectId(follower_id), "following_id": ObjectId(following_id)})
+        if not result.deleted_count:
+            return False
+        await self.increment("users", follower_id, "following", -1)
+        await self.increment("users", following_id, "followers", -1)
+        if self.timelines is not None:
+            await self.timelines.on_unfollow(follower_id, following_id)
+        return True
+
+    async def pending(self, collection: str, doc_ids: List[str]) -> Dict[str, Dict[str, int]]:
+        """Deltas not yet in Mongo for the given documents"""
+        fields = [f"{doc_id}:{field}" for doc_id in doc_ids for field in COUNTER_FIELDS[collection]]
+        deltas: Dict[str, Dict[str, int]] = defaultdict(dict)
+        if not fields:
+            return deltas
+
+        async def read():
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hmget(self.pending_key(collection), fields)
+                pipe.hmget(self.flushing_key(collection), fields)
+                return await pipe.execute()
+
+        result = await call_redis(self.breaker, read)
+        for values in ([] if result is UNAVAILABLE else result):
+            for name, value in zip(fields, values):
+                if value:
+                    doc_id, field = name.rsplit(":", 1)
+                    deltas[doc_id][field] = deltas[doc_id].get(field, 0) + int(value)
+        for (local_collection, doc_id, field), value in self._local.items():
+            if local_collection == collection and doc_id in doc_ids:
+                deltas[doc_id][field] = deltas[doc_id].get(field, 0) + value
+        return deltas
+
+    async def apply_pending(self, collection: str, items: List[Dict]) -> List[Dict]:
+        """Add pending deltas to serialized documents (with an "id" key) in place"""
+        deltas = await self.pending(collection, [item["id"] for item in items])
+        for item in items:
+            for field, delta in deltas.get(item["id"], {}).items():
+                item[field] = item.get(field, 0) + delta
+        return items
+
+    async def flush(self):
+        """Apply buffered deltas to Mongo; Redis deltas only by the worker holding the flush lock"""
+        local, self._local = self._local, defaultdict(int)
+        if local:
+            by_collection: Dict[str, Dict[str, int]] = defaultdict(dict)
+            for (collection, doc_id, field), delta in local.items():
+                by_collection[collection][f"{doc_id}:{field}"] = delta
+            for collection, deltas in by_collection.items():
+                try:
+                    written = await self._write(collection, deltas)
+                except PyMongoError as e:
+                    logger.error(f"Failed to flush local {collection} counters, keeping them: {e}")
+                    for name, delta in deltas.items():
+                        doc_id, field = name.rsplit(":", 1)
+                        self._local[(collection, doc_id, field)] += delta
+                    continue
+                await self._rescore(collection, written)
+
+        lock_key = f"{self.prefix}:flush-lock"
+        token = uuid.uuid4().hex
+        if await call_redis(self.breaker, lambda: self.redis.set(lock_key, token, nx=True, ex=self.lock_seconds)) in (None, UNAVAILABLE):
+            return
+        try:
+            for collection in COUNTER_FIELDS:
+                keys = [self.pending_key(collection), self.flushing_key(collection)]
+                raw = await call_redis(self.breaker, lambda: self.redis.eval(TAKE_PENDING_SCRIPT, 2, *keys))
+                if raw is UNAVAILABLE or not raw:
+                    continue
+                deltas = dict(zip(raw[::2], map(int, raw[1::2]))) if isinstance(raw, list) else {name: int(value) for name, value in raw.items()}
+                try:
+                    written = await self._write(collection, deltas)
+                except PyMongoError as e:
+                    # The flushing hash stays put and is retried by the next flush
+                    logger.error(f"Failed to flush {collection} counters: {e}")
+                    continue
+                # Drop the batch as soon as Mongo has it, so neither a retry nor pending() counts it again
+                if await call_redis(self.breaker, lambda: self.redis.delete(keys[1])) is UNAVAILABLE:
+                    logger.error(f"Applied {collection} counters but could not clear {keys[1]}; they will be applied again")
+                await self._rescore(collection, written)
+        finally:
+            await call_redis(self.breaker, lambda: self.redis.eval(RELEASE_LEASE_SCRIPT, 1, lock_key, token))
+
+    async def _write(self, collection: str, deltas: Dict[str, int]) -> Dict[str, Dict[str, int]]:
+        """One unordered bulk $inc for a batch of deltas; returns them grouped per document"""
+        per_doc: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for name, delta in deltas.items():
+            if delta:
+                doc_id, field = name.rsplit(":", 1)
+                per_doc[doc_id][field] = delta
+        if not per_doc:
+            return per_doc
+        await self.db[collection].bulk_write([UpdateOne({"_id": ObjectId(doc_id)}, {"$inc": fields}) for doc_id, fields in per_doc.items()], ordered=False)
+        self.stats["flushes"] += 1
+        self.stats["documents_written"] += len(per_doc)
+        return per_doc
+
+    async def _rescore(self, collection: str, per_doc: Dict[str, Dict[str, int]]):
+        """Move trending scores with an applied batch; best effort, never retried with the counters"""
+        # Likes are scored per event by like()/unlike(), so an unlike can undo its own weight
+        per_doc = {doc_id: {field: delta for field, delta in fields.items() if field != "likes"} for doc_id, fields in per_doc.items()}
+        per_doc = {doc_id: fields for doc_id, fields in per_doc.items() if fields}
+        if collection != "snapcasts" or self.feed is None or not per_doc:
+            return
+        try:
+            async for doc in self.db.snapcasts.find({"_id": {"$in": [ObjectId(doc_id) for doc_id in per_doc]}}, {"category": 1}):
+                for field, delta in per_doc[str(doc["_id"])].items():
+                    await self.feed.record(str(doc["_id"]), doc["category"], COUNTER_KINDS[field], delta)
+        except Exception as e:
+            self.stats["rescore_errors"] += 1
+            logger.warning(f"Counters applied but trending scores not updated: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Engagement counter flush failed: {e}")
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "local_pending": len(self._local)}
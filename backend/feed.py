@@ -0,0 +1,249 @@
+import re
+import json
+import math
+import time
+import base64
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+from bson import ObjectId
+
+from breaker import CircuitBreaker
+from cache import UNAVAILABLE, call_redis, create_redis_breaker
+from config import get_setting
+from models import FeedQuery
+from search import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+# Forward decay in log space: a score is ln(sum of weight * 2^((t - epoch) / half_life))
+# over all engagement. Newer events weigh exponentially more, which is the same ranking
+# as decaying every older event, so existing scores never have to be rewritten.
+RECORD_ENGAGEMENT_SCRIPT = """
+local member = ARGV[1]
+local inc = tonumber(ARGV[2])
+local sign = tonumber(ARGV[3])
+local max_size = tonumber(ARGV[4])
+for _, key in ipairs(KEYS) do
+    local old = redis.call('ZSCORE', key, member)
+    local new = nil
+    if old then
+        old = tonumber(old)
+        if sign > 0 then
+            local high = math.max(old, inc)
+            new = high + math.log(math.exp(old - high) + math.exp(inc - high))
+        elseif old > inc then
+            new = old + math.log(1 - math.exp(inc - old))
+        end
+    elseif sign > 0 then
+        new = inc
+    end
+    if new then
+        redis.call('ZADD', key, new, member)
+        if redis.call('ZCARD', key) > max_size then
+            redis.call('ZREMRANGEBYRANK', key, 0, -max_size - 1)
+        end
+    end
+end
+return 1
+"""
+
+DEFAULT_WEIGHTS = {"post": 2.0, "like": 1.0, "comment": 2.0, "remix": 3.0, "share": 4.0}
+# Counter fields on a SnapCast document and the engagement kind each one counts
+COUNTER_KINDS = {"likes": "like", "comments": "comment", "remixes": "remix", "shares": "share"}
+MONGO_SORTS = {"recent": "created_at", "popular": "likes"}
+
+def encode_cursor(sort: str, value: Any, snapcast_id: str) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([sort, value, snapcast_id]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, Any, str]:
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce"""
+    try:
+        sort, value, snapcast_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if sort == "recent":
+            value = datetime.fromisoformat(value)
+        elif sort in ("trending", "search", "home"):
+            value = float(value)
+        elif sort != "popular":
+            raise ValueError(f"Unknown sort {sort!r}")
+        ObjectId(snapcast_id)
+    except Exception as e:
+        raise ValueError(f"Malformed cursor: {e}")
+    return sort, value, snapcast_id
+
+def serialize_snapcast(doc: Dict) -> Dict:
+    item = {key: value for key, value in doc.items() if key != "_id"}
+    item["id"] = str(doc["_id"])
+    if "user_id" in item:
+        item["user_id"] = str(item["user_id"])
+    return item
+
+class FeedEngine:
+    """Trending index in Redis sorted sets plus keyset pagination for every feed order.
+
+    Each category (and "all") has a sorted set of SnapCast ids scored by
+    time-decayed engagement. Engagement events update the score in place,
+    so reads never compute scores. Pages resume from a cursor carrying the
+    last item's sort key, so page N costs the same as page 1.
+    """
+
+    def __init__(self, redis_client: aioredis.Redis, snapcasts: Any, breaker: Optional[CircuitBreaker] = None, search: Optional[SearchIndex] = None):
+        self.redis = redis_client
+        self.snapcasts = snapcasts
+        self.search = search
+        self.breaker = breaker or create_redis_breaker()
+        self.prefix = get_setting("feed.key_prefix", "feed:trending")
+        self.epoch = get_setting("feed.epoch", 1700000000)
+        self.decay_rate = math.log(2) / (get_setting("feed.half_life_hours", 24) * 3600)
+        self.max_size = get_setting("feed.max_index_size", 10000)
+        self.weights = {**DEFAULT_WEIGHTS, **(get_setting("feed.weights", {}) or {})}
+        self.stats = {"events": 0, "trending_pages": 0, "search_pages": 0, "mongo_pages": 0, "fallbacks": 0}
+
+    def key(self, category: Optional[str] = None) -> str:
+        return f"{self.prefix}:{category or 'all'}"
+
+    def log_weight(self, weight: float, at: Optional[float] = None) -> float:
+        return math.log(weight) + ((at if at is not None else time.time()) - self.epoch) * self.decay_rate
+
+    async def record(self, snapcast_id: str, category: str, kind: str, count: int = 1, at: Optional[float] = None) -> bool:
+        """Apply count engagement events of one kind; False if Redis is down.
+
+        A negative count undoes events and must pass the at they were recorded
+        with: weights grow with time, so undoing at a later time would take
+        away more than the events added.
+        """
+        if count == 0:
+            return True
+        inc = self.log_weight(self.weights[kind] * abs(count), at)
+        keys = [self.key(), self.key(category)]
+        result = await call_redis(self.breaker, lambda: self.redis.eval(RECORD_ENGAGEMENT_SCRIPT, len(keys), *keys, str(snapcast_id), repr(inc), 1 if count > 0 else -1, self.max_size))
+        if result is UNAVAILABLE:
+            return False
+        self.stats["events"] += abs(count)
+        return True
+
+    async def index_snapcast(self, doc: Dict) -> bool:
+        """Seed a newly published SnapCast so it can enter the trending feed"""
+        if not doc.get("is_public", True):
+            return True
+        created_at = doc.get("created_at")
+        at = created_at.timestamp() if isinstance(created_at, datetime) else None
+        return await self.record(str(doc["_id"]), doc["category"], "post", at=at)
+
+    async def remove(self, snapcast_id: str, category: str):
+        await call_redis(self.breaker, lambda: self.redis.zrem(self.key(category), str(snapcast_id)))
+        await call_redis(self.breaker, lambda: self.redis.zrem(self.key(), str(snapcast_id)))
+
+    async def rebuild(self) -> int:
+        """Backfill the index from the newest public SnapCasts, crediting their counters at creation time"""
+        scores: Dict[str, Dict[str, float]] = {}
+        projection = {"category": 1, "created_at": 1, **{field: 1 for field in COUNTER_KINDS}}
+        async for doc in self.snapcasts.find({"is_public": True}, projection).sort("created_at", -1).limit(self.max_size):
+            weight = self.weights["post"] + sum(self.weights[kind] * doc.get(field, 0) for field, kind in COUNTER_KINDS.items())
+            score = self.log_weight(weight, doc["created_at"].timestamp())
+            snapcast_id = str(doc["_id"])
+            scores.setdefault(self.key(), {})[snapcast_id] = score
+            scores.setdefault(self.key(doc["category"]), {})[snapcast_id] = score
+
+        async def write():
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, members in scores.items():
+                    pipe.delete(key)
+                    pipe.zadd(key, members)
+                await pipe.execute()
+
+        if await call_redis(self.breaker, write) is UNAVAILABLE:
+            return 0
+        count = len(scores.get(self.key(), {}))
+        logger.info(f"Rebuilt trending index with {count} SnapCasts")
+        return count
+
+    async def ensure_index(self):
+        if await call_redis(self.breaker, lambda: self.redis.exists(self.key())) == 0:
+            await self.rebuild()
+
+    def _filter(self, query: FeedQuery, with_category: bool = True) -> Dict:
+        conditions: Dict[str, Any] = {"is_public": True}
+        if with_category and query.category:
+            conditions["category"] = query.category.value
+        if query.tags:
+            conditions["tags"] = {"$all": query.tags}
+        if query.search and self.search is None:
+            conditions["title"] = {"$regex": re.escape(query.search), "$options": "i"}
+        return conditions
+
+    async def page(self, query: FeedQuery) -> Tuple[List[Dict], Optional[str]]:
+        """One page of the feed and the cursor for the next one (None at the end)"""
+        cursor = decode_cursor(query.cursor) if query.cursor else None
+        # An existing cursor fixes the order, so a fallback page continues in the order it started in
+        sort = cursor[0] if cursor else query.sort_by
+        if query.search and self.search is not None:
+            return await self._search_page(query, cursor if sort == "search" else None)
+        if sort == "trending":
+            result = await self._trending_page(query, cursor)
+            if result is not UNAVAILABLE:
+                return result
+            self.stats["fallbacks"] += 1
+            sort, cursor = "popular", None
+        if sort not in MONGO_SORTS:
+            raise ValueError(f"sort_by must be one of {['trending', *MONGO_SORTS]}")
+        return await self._mongo_page(query, sort, cursor)
+
+    async def _trending_page(self, query: FeedQuery, cursor: Optional[Tuple[str, Any, str]]):
+        key = self.key(query.category.value if query.category else None)
+        conditions = self._filter(query, with_category=False)
+        max_score = repr(cursor[1]) if cursor else "+inf"
+        batch_size = max(query.limit * 2, 50)
+        items: List[Dict] = []
+        last: Optional[Tuple[float, str]] = None
+        offset = 0
+        while len(items) < query.limit:
+            # Inclusive of the cursor's score; ties are ordered by member, descending
+            rows = await call_redis(self.breaker, lambda: self.redis.zrange(key, max_score, "-inf", desc=True, byscore=True, offset=offset, num=batch_size, withscores=True))
+            if rows is UNAVAILABLE:
+                return UNAVAILABLE
+            candidates = [(member, score) for member, score in rows if not (cursor and score == cursor[1] and member >= cursor[2])]
+            if candidates:
+                docs = await self.snapcasts.find({**conditions, "_id": {"$in": [ObjectId(member) for member, _ in candidates]}}).to_list(None)
+                by_id = {str(doc["_id"]): doc for doc in docs}
+                for member, score in candidates:
+                    if member in by_id:
+                        items.append(serialize_snapcast(by_id[member]))
+                        last = (score, member)
+                        if len(items) == query.limit:
+                            break
+            if len(rows) < batch_size:
+                break
+            offset += batch_size
+        self.stats["trending_pages"] += 1
+        next_cursor = encode_cursor("trending", last[0], last[1]) if last and len(items) == query.limit else None
+        return items, next_cursor
+
+    async def _search_page(self, query: FeedQuery, cursor: Optional[Tuple[str, Any, str]]) -> Tuple[List[Dict], Optional[str]]:
+        """Relevance-ranked page from the search index; the cursor carries (score, id)"""
+        hits = self.search.search(query.search, category=query.category.value if query.category else None, tags=query.tags, limit=query.limit, after=(cursor[1], cursor[2]) if cursor else None)
+        self.stats["search_pages"] += 1
+        if not hits:
+            return [], None
+        docs = await self.snapcasts.find({"_id": {"$in": [ObjectId(snapcast_id) for snapcast_id, _ in hits]}, "is_public": True}).to_list(None)
+        by_id = {str(doc["_id"]): doc for doc in docs}
+        items = [serialize_snapcast(by_id[snapcast_id]) for snapcast_id, _ in hits if snapcast_id in by_id]
+        next_cursor = encode_cursor("search", hits[-1][1], hits[-1][0]) if len(hits) == query.limit else None
+        return items, next_cursor
+
+    async def _mongo_page(self, query: FeedQuery, sort: str, cursor: Optional[Tuple[str, Any, str]]) -> Tuple[List[Dict], Optional[str]]:
+        field = MONGO_SORTS[sort]
+        conditions = self._filter(query)
+        if cursor:
+            after_id = ObjectId(cursor[2])
+            conditions = {"$and": [conditions, {"$or": [{field: {"$lt": cursor[1]}}, {field: cursor[1], "_id": {"$lt": after_id}}]}]}
+        docs = await self.snapcasts.find(conditions).sort([(field, -1), ("_id", -1)]).limit(query.limit + 1).to_list(None)
+        self.stats["mongo_pages"] += 1
+        has_more = len(docs) > query.limit
+        docs = docs[:query.limit]
+        next_cursor = encode_cursor(sort, docs[-1].get(field), str(docs[-1]["_id"])) if has_more else None
+        return [serialize_snapcast(doc) for doc in docs], next_cursor
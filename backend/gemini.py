@@ -0,0 +1,137 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, List, Optional
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from config import get_setting
+from metrics import LLM_ERRORS, LLM_IN_FLIGHT, LLM_REQUESTS, LLM_RETRIES
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted, google_exceptions.ServerError, google_exceptions.DeadlineExceeded)
+
+class TokenBucket:
+    """Async token bucket used to pace outgoing requests"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class GeminiGateway:
+    """Single entry point for all Gemini calls in a worker.
+
+    Keeps long-lived model handles, bounds in-flight requests with a
+    semaphore, paces requests with a token bucket and retries 429/5xx with
+    jittered exponential backoff. If the configured model has been retired,
+    the next entry of ``llm.fallback_models`` is used from then on.
+    """
+
+    def __init__(self):
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        self.model_names: List[str] = [get_setting("llm.model", "gemini-1.5-flash-latest")] + list(get_setting("llm.fallback_models", []))
+        self.max_retries = get_setting("content_safety.max_retries", 3)
+        self.backoff_base = get_setting("llm.backoff_base_seconds", 0.5)
+        self.backoff_max = get_setting("llm.backoff_max_seconds", 8.0)
+        self._semaphore = asyncio.Semaphore(get_setting("llm.max_concurrency", 8))
+        self._bucket = TokenBucket(get_setting("llm.requests_per_second", 5), get_setting("llm.burst", 10))
+        self._models: Dict[str, genai.GenerativeModel] = {}
+        self._retire_lock = asyncio.Lock()
+        self._latencies: deque = deque(maxlen=1000)
+        self.stats = {"requests": 0, "in_flight": 0, "queued": 0, "retries": 0, "errors": 0}
+        LLM_IN_FLIGHT.set_function(lambda: self.stats["in_flight"], state="running")
+        LLM_IN_FLIGHT.set_function(lambda: self.stats["queued"], state="queued")
+
+    def get_model(self, name: Optional[str] = None) -> genai.GenerativeModel:
+        name = name or self.model_names[0]
+        if name not in self._models:
+            self._models[name] = genai.GenerativeModel(name)
+        return self._models[name]
+
+    async def generate(self, prompt: str) -> str:
+        """Generate text for a prompt, returning the stripped response text"""
+        self.stats["requests"] += 1
+        LLM_REQUESTS.inc()
+        self.stats["queued"] += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.stats["queued"] -= 1
+        self.stats["in_flight"] += 1
+        try:
+            return await self._generate_with_retries(prompt)
+        except Exception as e:
+            self.stats["errors"] += 1
+            LLM_ERRORS.inc(error=type(e).__name__)
+            raise
+        finally:
+            self.stats["in_flight"] -= 1
+            self._semaphore.release()
+
+    async def _generate_with_retries(self, prompt: str) -> str:
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            start_time = time.monotonic()
+            name = self.model_names[0]
+            try:
+                response = await self.get_model(name).generate_content_async(prompt)
+                self._latencies.append(time.monotonic() - start_time)
+                return response.text.strip()
+            except google_exceptions.NotFound as e:
+                if not await self._retire(name, e):
+                    raise
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                attempt += 1
+                self.stats["retries"] += 1
+                LLM_RETRIES.inc()
+                logger.warning(f"Gemini call failed ({e}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def _retire(self, name: str, error: Exception) -> bool:
+        """Stop using a model that was not found; False if there is nothing left to fall back to"""
+        async with self._retire_lock:
+            if self.model_names[0] != name:
+                # A concurrent call already switched away from it
+                return True
+            if len(self.model_names) < 2:
+                return False
+            self.model_names.pop(0)
+            logger.error(f"Gemini model {name} unavailable ({error}), switching to {self.model_names[0]}")
+            return True
+
+    def get_stats(self) -> Dict:
+        latencies = sorted(self._latencies)
+        percentile = lambda p: round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 4) if latencies else None
+        return {**self.stats, "model": self.model_names[0], "latency_p50": percentile(0.5), "latency_p95": percentile(0.95), "latency_p99": percentile(0.99)}
+
+_gateway: Optional[GeminiGateway] = None
+
+def get_gateway() -> GeminiGateway:
+    """Return the per-worker gateway, creating it on first use"""
+    global _gateway
+    if _gateway is None:
+        _gateway = GeminiGateway()
+    return _gateway
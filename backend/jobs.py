@@ -0,0 +1,117 @@
+import json
+import time
+import logging
+from typing import Dict, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from config import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Values written to TTSRequest.status over a job's lifetime
+QUEUED = "queued"
+PROCESSING = "processing"
+COMPLETED = "completed"
+FAILED = "failed"
+BLOCKED = "blocked"
+TERMINAL_STATUSES = (COMPLETED, FAILED, BLOCKED)
+
+# KEYS: processing list, pending list, unleased hash (entry -> first seen without a lease)
+# ARGV: lease key prefix, grace seconds
+# A worker writes its lease right after BLMOVE, so an entry only counts as
+# orphaned once it has been seen without a lease for the whole grace period.
+REQUEUE_ORPHANS_SCRIPT = """
+local now = tonumber(redis.call('TIME')[1])
+local grace = tonumber(ARGV[2])
+local entries = redis.call('LRANGE', KEYS[1], 0, -1)
+local present = {}
+local requeued = {}
+for _, raw in ipairs(entries) do
+    present[raw] = true
+    local job_id = cjson.decode(raw)['job_id']
+    if redis.call('EXISTS', ARGV[1] .. job_id) == 1 then
+        redis.call('HDEL', KEYS[3], raw)
+    else
+        local seen = tonumber(redis.call('HGET', KEYS[3], raw))
+        if not seen then
+            redis.call('HSET', KEYS[3], raw, now)
+        elseif now - seen >= grace then
+            redis.call('HDEL', KEYS[3], raw)
+            if redis.call('LREM', KEYS[1], 1, raw) == 1 then
+                redis.call('RPUSH', KEYS[2], raw)
+                table.insert(requeued, job_id)
+            end
+        end
+    end
+end
+for _, raw in ipairs(redis.call('HKEYS', KEYS[3])) do
+    if not present[raw] then
+        redis.call('HDEL', KEYS[3], raw)
+    end
+end
+return requeued
+"""
+
+class JobQueue:
+    """Reliable TTS job queue on Redis lists.
+
+    Workers move a job from the pending list to a processing list
+    atomically and hold a lease while working on it. Jobs that have been
+    without a lease for claim_grace seconds (the worker died) are pushed
+    back onto the pending list.
+    Status changes are published so API workers can push them over SSE.
+    """
+
+    def __init__(self, redis_client: aioredis.Redis, prefix: Optional[str] = None, lease_seconds: Optional[int] = None, claim_grace: Optional[int] = None):
+        self.redis = redis_client
+        self.prefix = prefix or get_setting("jobs.key_prefix", "tts:jobs")
+        self.lease_seconds = lease_seconds or get_setting("jobs.lease_seconds", 120)
+        self.claim_grace = claim_grace if claim_grace is not None else get_setting("jobs.claim_grace_seconds", 10)
+        self.pending_key = f"{self.prefix}:pending"
+        self.processing_key = f"{self.prefix}:processing"
+        self.unleased_key = f"{self.prefix}:unleased"
+
+    def channel(self, job_id: int) -> str:
+        return f"{self.prefix}:events:{job_id}"
+
+    async def enqueue(self, job_id: int, request: Dict):
+        await self.redis.lpush(self.pending_key, json.dumps({"job_id": job_id, "request": request, "enqueued_at": time.time()}))
+
+    async def claim(self, timeout: float) -> Optional[Tuple[str, Dict]]:
+        """Take the oldest pending job, returning (raw entry, job) or None"""
+        raw = await self.redis.blmove(self.pending_key, self.processing_key, timeout, "RIGHT", "LEFT")
+        if raw is None:
+            return None
+        job = json.loads(raw)
+        await self.heartbeat(job["job_id"])
+        return raw, job
+
+    async def heartbeat(self, job_id: int):
+        await self.redis.set(f"{self.prefix}:lease:{job_id}", "1", ex=self.lease_seconds)
+
+    async def ack(self, raw: str, job_id: int):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.lrem(self.processing_key, 1, raw)
+        pipe.delete(f"{self.prefix}:lease:{job_id}")
+        await pipe.execute()
+
+    async def requeue_orphans(self) -> int:
+        """Return jobs whose worker stopped renewing its lease to the pending list"""
+        job_ids = await self.redis.eval(REQUEUE_ORPHANS_SCRIPT, 3, self.processing_key, self.pending_key, self.unleased_key, f"{self.prefix}:lease:", self.claim_grace)
+        for job_id in job_ids:
+            logger.warning(f"Requeued TTS job {job_id} after its worker lease expired")
+        return len(job_ids)
+
+    async def publish(self, job_id: int, status: str, detail: Optional[Dict] = None):
+        await self.redis.publish(self.channel(job_id), json.dumps({"job_id": job_id, "status": status, **(detail or {})}))
+
+    async def set_error(self, job_id: int, error: str):
+        # TTSRequest has no error column; keep the reason long enough for clients to read it
+        await self.redis.set(f"{self.prefix}:error:{job_id}", error, ex=get_setting("jobs.result_ttl", 86400))
+
+    async def get_error(self, job_id: int) -> Optional[str]:
+        return await self.redis.get(f"{self.prefix}:error:{job_id}")
+
+    async def depth(self) -> Dict[str, int]:
+        return {"pending": await self.redis.llen(self.pending_key), "processing": await self.redis.llen(self.processing_key)}
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+from cache import LocalTTLCache
+from config import get_setting
+
+logger = logging.getLogger(__name__)
+
+# The UserResponse fields; everything else (password_hash in particular) stays in Mongo
+USER_FIELDS = ("username", "email", "display_name", "avatar_url", "verified", "followers", "following", "bio", "created_at")
+USER_PROJECTION = {field: 1 for field in USER_FIELDS}
+
+def user_response(doc: Dict) -> Dict:
+    """A users document in the shape of UserResponse"""
+    profile = {field: doc.get(field) for field in USER_FIELDS}
+    profile["id"] = str(doc["_id"])
+    profile["verified"] = bool(profile["verified"])
+    profile["followers"] = profile["followers"] or 0
+    profile["following"] = profile["following"] or 0
+    return profile
+
+class UserProfileCache:
+    """Short-TTL profile cache shared by every request in this worker"""
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[int] = None):
+        self.profiles = LocalTTLCache(max_size or get_setting("loaders.user_cache_size", 10000), ttl or get_setting("loaders.user_ttl", 30))
+        self.stats = {"hits": 0, "misses": 0, "queries": 0, "invalidations": 0}
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        profile = self.profiles.get(user_id)
+        self.stats["hits" if profile is not None else "misses"] += 1
+        return profile
+
+    def set(self, profile: Dict):
+        self.profiles.set(profile["id"], profile)
+
+    def invalidate(self, user_id: Any):
+        self.profiles.delete(str(user_id))
+        self.stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "profiles": len(self.profiles)}
+
+class UserLoader:
+    """Per-request batching loader for user profiles.
+
+    Every load() made before the event loop next runs is collected and
+    resolved with one $in query; results (including misses) are memoized
+    for the rest of the request, and profiles found are shared through
+    the UserProfileCache.
+    """
+
+    def __init__(self, users: Any, cache: UserProfileCache):
+        self.users = users
+        self.cache = cache
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+
+    def load(self, user_id: Any) -> "asyncio.Future[Optional[Dict]]":
+        key = str(user_id)
+        future = self._futures.get(key)
+        if future is not None:
+            return future
+        future = asyncio.get_running_loop().create_future()
+        self._futures[key] = future
+        profile = self.cache.get(key)
+        if profile is not None:
+            future.set_result(profile)
+        elif not ObjectId.is_valid(key):
+            future.set_result(None)
+        else:
+            if not self._queue:
+                asyncio.get_running_loop().call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+            self._queue.append(key)
+        return future
+
+    async def load_many(self, user_ids: List[Any]) -> List[Optional[Dict]]:
+        return list(await asyncio.gather(*(self.load(user_id) for user_id in user_ids)))
+
+    async def _dispatch(self):
+        keys, self._queue = self._queue, []
+        try:
+            docs = await self.users.find({"_id": {"$in": [ObjectId(key) for key in keys]}}, USER_PROJECTION).to_list(None)
+        except Exception as e:
+            logger.error(f"Failed to load {len(keys)} users: {e}")
+            for key in keys:
+                # Not memoized, so a later load in the same request can retry
+                self._futures.pop(key).set_exception(e)
+            return
+        self.cache.stats["queries"] += 1
+        found = {str(doc["_id"]): user_response(doc) for doc in docs}
+        for key in keys:
+            profile = found.get(key)
+            if profile is not None:
+                self.cache.set(profile)
+            self._futures[key].set_result(profile)
+
+    async def hydrate(self, items: List[Dict], field: str = "user_id", target: str = "user") -> List[Dict]:
+        """Embed the profile for item[field] as item[target] in place, with one query for the whole list"""
+        profiles = await self.load_many([item.get(field) for item in items])
+        for item, profile in zip(items, profiles):
+            item[target] = profile
+        return items
@@ -6,6 +6,7 @@ import asyncio
 from typing import Dict, List, Optional, Tuple
 from enum import Enum
 import hashlib
+import hmac
 import time
 from datetime import datetime, timedelta
 
@@ -13,13 +14,12 @@ from datetime import datetime, timedelta
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 # Web framework and API
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.security import APIKeyHeader, HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, field_validator
 
 # AI and NLP
-import google.generativeai as genai
 from textblob import TextBlob
 import nltk
 
@@ -28,11 +28,25 @@ from pydub import AudioSegment
 import io
 
 # Database and caching
-import redis
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
 # Local Imports
-from database import Base, engine, SessionLocal, TTSRequest, VoiceModel, EmotionTone, Purpose, User
+from database import create_sql_schema, engine, SessionLocal, TTSRequest, VoiceModel, EmotionTone, Purpose, User
+from config import get_setting
+from singleflight import SingleFlight
+from cache import UNAVAILABLE, TieredCache, call_redis, create_redis_client, create_redis_breaker
+from segmenter import split_into_chunks
+from audio import AudioPostProcessor, MEDIA_TYPES
+from waveform import unpack_waveforms
+from blobstore import BlobResponse, parse_range
+from auth import AuthCache, AuthPrincipal
+from persistence import WriteBehindWriter, configure_sqlite
+from jobs import JobQueue, QUEUED, COMPLETED, FAILED, TERMINAL_STATUSES
+from safety import BlocklistMatcher, AISafetyScorer
+from gemini import get_gateway
+from metrics import CACHE_REQUESTS, CONTENT_TYPE, HTTP_IN_FLIGHT, HTTP_REQUEST_SECONDS, REGISTRY, TTS_STAGE_SECONDS, WRITE_BEHIND_PENDING
+from monitoring import SystemMonitor
 
 # --- ADDED FOR AUTH ---
 from jose import JWTError, jwt
@@ -52,9 +66,45 @@ app = FastAPI(title="EONA TTS API", description="AI-Powered Text-to-Speech with
 # IMPORTANT: Updated CORS for React default port
 app.add_middleware(CORSMiddleware, allow_origins=["http://localhost:3000"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # Streaming responses are timed to their first byte
+    start, status = time.perf_counter(), 500
+    with HTTP_IN_FLIGHT.track_inprogress():
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, route=getattr(route, "path", "unmatched"), status=status)
+
 security = HTTPBearer()
-Base.metadata.create_all(bind=engine)
-redis_client = redis.Redis(host=os.getenv("REDIS_HOST", "localhost"), port=int(os.getenv("REDIS_PORT", 6379)), db=0, decode_responses=True)
+api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+configure_sqlite(engine)
+create_sql_schema(engine)
+redis_client = create_redis_client()
+redis_breaker = create_redis_breaker()
+CACHE_TTL = get_setting("cache.ttl", 86400)
+ENHANCEMENT_CACHE_TTL = get_setting("cache.enhancement_ttl", 7 * 86400)
+TTS_BATCH_MAX_ITEMS = get_setting("tts.batch_max_items", 500)
+TTS_BATCH_CONCURRENCY = get_setting("tts.batch_concurrency", 16)
+STREAM_CONCURRENCY = get_setting("tts.stream_concurrency", 4)
+STREAM_MIN_CHUNK_CHARS = get_setting("tts.stream_min_chunk_chars", 80)
+STREAM_MAX_CHUNK_CHARS = get_setting("tts.stream_max_chunk_chars", 600)
+SUPPORTED_FORMATS = get_setting("tts.supported_formats", ["mp3", "wav", "ogg"])
+SUPPORTED_SAMPLE_RATES = get_setting("audio.supported_sample_rates", [22050, 24000, 44100, 48000])
+AUDIO_POST_PROCESS = get_setting("audio.post_process", True)
+AUDIO_URL_PREFIX = "/api/v1/audio/"
+AUDIO_BLOB_NAME = re.compile(r"^([0-9a-f]{64})\.(mp3|wav|ogg)$")
+JOB_SSE_HEARTBEAT = get_setting("jobs.sse_heartbeat_seconds", 15)
+tts_cache = TieredCache(redis_client, ttl=CACHE_TTL, breaker=redis_breaker)
+cache_stats = {"audio": {"hits": 0, "misses": 0}, "enhancement": {"hits": 0, "misses": 0}}
+job_queue = JobQueue(redis_client)
+tts_writer = WriteBehindWriter(SessionLocal, TTSRequest)
+WRITE_BEHIND_PENDING.set_function(tts_writer.queue.qsize)
+system_monitor = SystemMonitor()
+tts_coalescer = SingleFlight(redis_client, lease_seconds=get_setting("tts.coalesce_lease_seconds", 30), poll_interval=get_setting("tts.coalesce_poll_interval", 0.1), breaker=redis_breaker)
 
 
 # --- Utility Functions ---
@@ -70,6 +120,13 @@ def generate_request_id(script: str, voice: str, tone: str) -> str:
     content = f"{script}{voice}{tone}{time.time()}"
     return hashlib.sha256(content.encode()).hexdigest()[:16]
 
+def tts_cache_key(request: "TTSRequestModel") -> str:
+    return f"tts:{hashlib.md5(request.script.encode()).hexdigest()}:{request.voice_model.value}:{request.emotion_tone.value}"
+
+def enhancement_cache_key(script: str, tone: str, purpose: str, context: str) -> str:
+    # Enhanced text does not depend on the voice, so every voice preview shares it
+    return f"enh:{hashlib.md5(script.encode()).hexdigest()}:{tone}:{purpose}:{hashlib.md5(context.encode()).hexdigest()}"
+
 
 # --- AUTHENTICATION SETUP ---
 SECRET_KEY = os.getenv("SECRET_KEY", "a_very_secret_key_that_should_be_in_env")
@@ -84,6 +141,9 @@ AUTHORIZATION_URL = "https://accounts.google.com/o/oauth2/v2/auth"
 TOKEN_URL = "https://www.googleapis.com/oauth2/v4/token"
 SCOPE = ["https://www.googleapis.com/auth/userinfo.email", "https://www.googleapis.com/auth/userinfo.profile"]
 
+auth_cache = AuthCache()
+auth_cache.watch(User)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -91,19 +151,36 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+async def get_current_user(token: HTTPAuthorizationCredentials = Depends(security)) -> AuthPrincipal:
     credentials_exception = HTTPException(status_code=401, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
-    try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
+    user_id = auth_cache.get_user_id(token.credentials)
+    if user_id is None:
+        try:
+            payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id = int(payload["sub"])
+        except (JWTError, KeyError, TypeError, ValueError):
+            raise credentials_exception
+        auth_cache.set_user_id(token.credentials, user_id, payload.get("exp"))
+    principal = auth_cache.get_principal(user_id)
+    if principal is None:
+        # Only a principal cache miss costs a session and a query
+        db = SessionLocal()
+        try:
+            user = db.get(User, user_id)
+        finally:
+            db.close()
+        if user is None:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = db.query(User).filter(User.id == int(user_id)).first()
-    if user is None:
-        raise credentials_exception
-    return user
+        principal = AuthPrincipal.from_user(user)
+        auth_cache.set_principal(principal)
+    return principal
+
+async def verify_api_key(api_key: Optional[str] = Depends(api_key_header)) -> str:
+    """Static X-API-Key check for the catalogue endpoints; EONA_API_KEY unset means they are closed"""
+    expected = os.getenv("EONA_API_KEY")
+    if not expected or not api_key or not hmac.compare_digest(api_key, expected):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    return api_key
 
 # --- Pydantic Models ---
 class TTSRequestModel(BaseModel):
@@ -112,10 +189,30 @@ class TTSRequestModel(BaseModel):
     emotion_tone: EmotionTone
     purpose: Purpose
     user_context: Optional[str] = None
+    format: str = get_setting("audio.default_format", "mp3")
+    sample_rate: int = get_setting("audio.default_sample_rate", 44100)
+
+    @field_validator("format")
+    @classmethod
+    def validate_format(cls, value: str) -> str:
+        if value not in SUPPORTED_FORMATS:
+            raise ValueError(f"format must be one of {SUPPORTED_FORMATS}")
+        return value
+
+    @field_validator("sample_rate")
+    @classmethod
+    def validate_sample_rate(cls, value: int) -> int:
+        if value not in SUPPORTED_SAMPLE_RATES:
+            raise ValueError(f"sample_rate must be one of {SUPPORTED_SAMPLE_RATES}")
+        return value
+
+class TTSBatchRequest(BaseModel):
+    items: List[TTSRequestModel]
 
 class TTSResponse(BaseModel):
     request_id: str
     audio_url: str
+    waveform_url: Optional[str] = None
     enhanced_script: str
     processing_time: float
     emotion_analysis: Dict
@@ -134,29 +231,27 @@ class Token(BaseModel):
 
 # --- Core Logic Classes (Unchanged from your original file) ---
 class ContentSafetyChecker:
-    def __init__(self):
-        self.nsfw_patterns = [r'\b(sex|porn|nude|naked|explicit|adult|erotic)\b', r'\b(violence|kill|murder|death|blood|gore)\b', r'\b(drug|cocaine|heroin|marijuana|weed)\b', r'\b(hate|racist|nazi|terrorist)\b']
-        self.severity_threshold = 0.7
-    def check_content(self, text: str) -> Tuple[bool, str, float]:
-        text_lower = text.lower()
-        for pattern in self.nsfw_patterns:
-            matches = re.findall(pattern, text_lower, re.IGNORECASE)
-            if matches: return False, f"Content contains inappropriate terms: {matches}", 0.9
-        try:
-            safety_score = self._ai_safety_check(text)
-            if safety_score > self.severity_threshold: return False, "AI safety check flagged potential issues", safety_score
-        except Exception as e: logger.warning(f"AI safety check failed: {e}")
+    def __init__(self, matcher: Optional[BlocklistMatcher] = None, scorer: Optional[AISafetyScorer] = None):
+        self.matcher = matcher or BlocklistMatcher()
+        self.scorer = scorer or AISafetyScorer(get_gateway().generate)
+        self.severity_threshold = get_setting("content_safety.severity_threshold", 0.7)
+        self.enable_ai_check = get_setting("content_safety.enable_ai_check", True)
+    async def check_content(self, text: str) -> Tuple[bool, str, float]:
+        with TTS_STAGE_SECONDS.time(stage="safety_regex"): hits = self.matcher.scan(text)
+        return await self._check_scanned(text, hits)
+    async def check_many(self, texts: List[str]) -> List[Tuple[bool, str, float]]:
+        """Blocklist-scan a batch in one go; AI checks for the survivors share micro-batches"""
+        return list(await asyncio.gather(*(self._check_scanned(text, hits) for text, hits in zip(texts, self.matcher.scan_many(texts)))))
+    async def _check_scanned(self, text: str, hits: Dict[str, List[str]]) -> Tuple[bool, str, float]:
+        if hits: return False, f"Content contains inappropriate terms: {[term for terms in hits.values() for term in terms]}", 0.9
+        if self.enable_ai_check:
+            try:
+                safety_score = await self._ai_safety_check(text)
+                if safety_score > self.severity_threshold: return False, "AI safety check flagged potential issues", safety_score
+            except Exception as e: logger.warning(f"AI safety check failed: {e}")
         return True, "Content appears safe", 0.0
-    def _ai_safety_check(self, text: str) -> float:
-        try:
-            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-            model = genai.GenerativeModel('gemini-1.5-flash-latest')
-            safety_prompt = f'Analyze the following text for inappropriate content. Provide a safety score from 0-1 (0=safe, 1=inappropriate).\nText: "{text}"\nRespond with only a number between 0 and 1.'
-            response = model.generate_content(safety_prompt)
-            return max(0, min(1, float(response.text.strip())))
-        except Exception as e:
-            logger.error(f"Gemini safety check error: {e}")
-            return 0.0
+    async def _ai_safety_check(self, text: str) -> float:
+        with TTS_STAGE_SECONDS.time(stage="safety_ai"): return await self.scorer.score(text)
 
 class EmotionEnhancer:
     def __init__(self):
@@ -164,21 +259,15 @@ class EmotionEnhancer:
         except LookupError: nltk.download('vader_lexicon', quiet=True)
     async def generate_script_from_idea(self, idea: str, tone: EmotionTone, purpose: Purpose) -> str:
         try:
-            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-            model = genai.GenerativeModel('gemini-1.5-flash-latest')
             prompt = f"You are a creative writer for short-form audio. Based on this idea, write a short, engaging script of 50-100 words.\nThe script should be for a '{purpose.value}' and have a '{tone.value}' tone.\n\nIdea: \"{idea}\"\n\nReturn only the generated script."
-            response = await asyncio.to_thread(model.generate_content, prompt)
-            return response.text.strip()
+            return await get_gateway().generate(prompt)
         except Exception as e:
             logger.error(f"Gemini script generation error: {e}")
             return "Error generating script."
     async def enhance_script(self, script: str, tone: EmotionTone, purpose: Purpose, context: str = "") -> Tuple[str, Dict]:
         try:
-            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-            model = genai.GenerativeModel('gemini-1.5-flash-latest')
             prompt = f"Enhance this script to better convey a '{tone.value}' tone for a '{purpose.value}'. Maintain meaning, add emotion, adjust flow. Keep length similar.\n\nOriginal: \"{script}\"\nContext: {context}\n\nReturn only the enhanced script."
-            response = await asyncio.to_thread(model.generate_content, prompt)
-            enhanced_script = response.text.strip()
+            enhanced_script = await get_gateway().generate(prompt)
             if len(enhanced_script) < len(script) * 0.5 or len(enhanced_script) > len(script) * 2:
                 logger.warning("Enhanced script length seems incorrect, using original")
                 return script, {"error": "Enhancement failed", "enhancement_applied": False}
@@ -196,12 +285,17 @@ class MurfAIClient:
         mock_audio_url = f"https://storage.murvoice.com/audio/{script_hash}.mp3"
         processing_time = time.time() - start_time
         return mock_audio_url, processing_time
+    async def fetch_audio(self, audio_url: str) -> bytes:
+        response = await asyncio.to_thread(requests.get, audio_url, timeout=get_setting("audio.fetch_timeout", 10))
+        response.raise_for_status()
+        return response.content
 # -------------------------------------------------------------------
 
 # --- Initialize Components ---
 content_checker = ContentSafetyChecker()
 emotion_enhancer = EmotionEnhancer()
 murf_client = MurfAIClient()
+audio_processor = AudioPostProcessor()
 
 # --- AUTHENTICATION ENDPOINTS ---
 # @app.get("/auth/google")
@@ -246,42 +340,372 @@ murf_client = MurfAIClient()
 #     return {"email": current_user.email, "name": current_user.name}
 # --------------------------------
 
+async def get_enhanced_script(request: TTSRequestModel) -> Tuple[str, Dict]:
+    """Enhancement cache tier, consulted before synthesis and independent of the voice"""
+    enh_key = enhancement_cache_key(request.script, request.emotion_tone.value, request.purpose.value, request.user_context or "")
+
+    async def lookup_enhanced() -> Optional[Dict]:
+        with TTS_STAGE_SECONDS.time(stage="cache_get"):
+            cached = await tts_cache.get(enh_key)
+        return json.loads(cached) if cached else None
+
+    cached = await lookup_enhanced()
+    cache_stats["enhancement"]["hits" if cached else "misses"] += 1
+    CACHE_REQUESTS.inc(cache="enhancement", result="hit" if cached else "miss")
+    if cached:
+        return cached["enhanced_script"], cached["emotion_analysis"]
+
+    async def compute() -> Dict:
+        enhanced_script, emotion_analysis = await emotion_enhancer.enhance_script(request.script, request.emotion_tone, request.purpose, request.user_context or "")
+        result = {"enhanced_script": enhanced_script, "emotion_analysis": emotion_analysis}
+        # Failed enhancements fall back to the original script; don't pin that
+        if emotion_analysis.get("enhancement_applied"):
+            with TTS_STAGE_SECONDS.time(stage="cache_set"):
+                await tts_cache.set(enh_key, json.dumps(result), ENHANCEMENT_CACHE_TTL)
+        return result
+
+    # Previews of one script in several voices at once share a single LLM call
+    result, _ = await tts_coalescer.run(enh_key, compute, lookup_enhanced)
+    return result["enhanced_script"], result["emotion_analysis"]
+
+@app.on_event("startup")
+async def startup_event():
+    await tts_cache.start_invalidation_listener()
+    tts_writer.start()
+    system_monitor.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await system_monitor.stop()
+    await tts_writer.stop()
+    await tts_cache.stop_invalidation_listener()
+    await redis_client.aclose()
+    audio_processor.shutdown()
+
+async def synthesize_tts(request: TTSRequestModel, request_id: str) -> Tuple[Dict, bool]:
+    """Cache lookup, enhancement and synthesis. Returns (response_data, generated_here)"""
+    cache_key = tts_cache_key(request)
+
+    async def lookup_cached() -> Optional[Dict]:
+        with TTS_STAGE_SECONDS.time(stage="cache_get"):
+            cached_result = await tts_cache.get(cache_key)
+        return json.loads(cached_result) if cached_result else None
+
+    cached_result = await lookup_cached()
+    cache_stats["audio"]["hits" if cached_result else "misses"] += 1
+    CACHE_REQUESTS.inc(cache="audio", result="hit" if cached_result else "miss")
+    if cached_result:
+        logger.info(f"Returning cached result for request {request_id}")
+        return await with_audio_variant(request, cached_result), False
+
+    async def compute() -> Dict:
+        with TTS_STAGE_SECONDS.time(stage="enhancement"):
+            enhanced_script, emotion_analysis = await get_enhanced_script(request)
+        with TTS_STAGE_SECONDS.time(stage="murf"):
+            audio_url, processing_time = await murf_client.generate_speech(enhanced_script, request.voice_model, request.emotion_tone)
+        response_data = {"request_id": request_id, "audio_url": audio_url, "enhanced_script": enhanced_script, "processing_time": processing_time, "emotion_analysis": emotion_analysis}
+        with TTS_STAGE_SECONDS.time(stage="cache_set"):
+            await tts_cache.set(cache_key, json.dumps(response_data))
+        return response_data
+
+    # Identical concurrent requests share one enhancement + synthesis
+    response_data, is_leader = await tts_coalescer.run(cache_key, compute, lookup_cached)
+    if not is_leader:
+        logger.info(f"Returning coalesced result for request {request_id}")
+    return await with_audio_variant(request, response_data), is_leader
+
+async def with_audio_variant(request: TTSRequestModel, response_data: Dict) -> Dict:
+    """Normalize, trim and transcode the synthesized audio; each variant is encoded once"""
+    if not AUDIO_POST_PROCESS:
+        return response_data
+    source_url = response_data["audio_url"]
+    name = audio_processor.variant_name(source_url, request.format, request.sample_rate)
+    if not audio_processor.should_process(source_url, name):
+        return response_data
+
+    async def lookup_variant() -> Optional[str]:
+        return await asyncio.to_thread(audio_processor.lookup, name)
+
+    async def compute() -> str:
+        data = await audio_processor.get_source(source_url, murf_client.fetch_audio)
+        return await audio_processor.render(data, name, request.format, request.sample_rate)
+
+    try:
+        with TTS_STAGE_SECONDS.time(stage="audio_post_process"):
+            digest = await lookup_variant()
+            if digest is None:
+                digest, _ = await tts_coalescer.run(f"audio:variant:{name}", compute, lookup_variant)
+    except Exception as e:
+        audio_processor.record_failure(name)
+        logger.warning(f"Audio post-processing failed for {source_url}, serving original for {audio_processor.failures.ttl}s: {e}")
+        return response_data
+    blob_name = f"{digest}.{request.format}"
+    return {**response_data, "audio_url": f"{AUDIO_URL_PREFIX}{blob_name}", "waveform_url": f"{AUDIO_URL_PREFIX}{blob_name}/waveform"}
+
+def tts_record_values(user_id: int, request: TTSRequestModel, response_data: Dict, status: str = "completed") -> Dict:
+    return dict(user_id=user_id, script_hash=tts_cache_key(request), original_script=request.script, enhanced_script=response_data["enhanced_script"], voice_model=request.voice_model.value, emotion_tone=request.emotion_tone.value, purpose=request.purpose.value, audio_url=response_data["audio_url"], processing_time=response_data["processing_time"], status=status)
+
+async def stream_tts_batch(items: List[Tuple[TTSRequestModel, List[int]]], user_id: int):
+    semaphore = asyncio.Semaphore(TTS_BATCH_CONCURRENCY)
+    generated_count = 0
+
+    async def process(item: TTSRequestModel, indices: List[int]) -> Dict:
+        nonlocal generated_count
+        # Each item is checked on its own so a blocked or fast item streams without waiting for
+        # the rest of the batch; concurrent AI checks still share the scorer's micro-batches
+        is_safe, reason, _ = await content_checker.check_content(item.script)
+        if not is_safe:
+            return {"indices": indices, "status": "blocked", "error": f"Content not allowed: {reason}"}
+        try:
+            async with semaphore:
+                request_id = generate_request_id(item.script, item.voice_model.value, item.emotion_tone.value)
+                response_data, generated = await synthesize_tts(item, request_id)
+        except Exception as e:
+            logger.error(f"Batch TTS item failed: {e}")
+            return {"indices": indices, "status": "failed", "error": str(e)}
+        if generated:
+            generated_count += 1
+            await tts_writer.put(tts_record_values(user_id, item, response_data))
+        return {"indices": indices, "status": "completed", "result": response_data}
+
+    tasks = [asyncio.create_task(process(item, indices)) for item, indices in items]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield json.dumps(await next_done) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+        logger.info(f"Batch TTS finished: {len(items)} unique items, {generated_count} generated")
+
+async def synthesize_segment(text: str, request: TTSRequestModel) -> Dict:
+    """Synthesize one chunk, cached per chunk so remixes reuse shared sentences"""
+    segment_key = f"tts:seg:{hashlib.md5(text.encode()).hexdigest()}:{request.voice_model.value}:{request.emotion_tone.value}"
+    cached = await tts_cache.get(segment_key)
+    if cached:
+        return json.loads(cached)
+    audio_url, processing_time = await murf_client.generate_speech(text, request.voice_model, request.emotion_tone)
+    segment = {"audio_url": audio_url, "processing_time": processing_time}
+    await tts_cache.set(segment_key, json.dumps(segment))
+    return segment
+
+async def stream_tts_segments(request: TTSRequestModel, request_id: str):
+    start_time = time.time()
+    enhanced_script, emotion_analysis = await get_enhanced_script(request)
+    chunks = split_into_chunks(enhanced_script, STREAM_MIN_CHUNK_CHARS, STREAM_MAX_CHUNK_CHARS)
+    yield json.dumps({"type": "meta", "request_id": request_id, "segments": len(chunks), "enhanced_script": enhanced_script, "emotion_analysis": emotion_analysis}) + "\n"
+
+    semaphore = asyncio.Semaphore(STREAM_CONCURRENCY)
+
+    async def synthesize(text: str) -> Dict:
+        async with semaphore:
+            return await synthesize_segment(text, request)
+
+    # All chunks are scheduled up front; earlier ones win the semaphore first
+    tasks = [asyncio.create_task(synthesize(chunk)) for chunk in chunks]
+    try:
+        for index, (chunk, task) in enumerate(zip(chunks, tasks)):
+            segment = await task
+            yield json.dumps({"type": "segment", "index": index, "text": chunk, **segment, "elapsed": round(time.time() - start_time, 3)}) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+    yield json.dumps({"type": "done", "request_id": request_id, "total_time": round(time.time() - start_time, 3)}) + "\n"
+
+def job_snapshot(record: TTSRequest) -> Dict:
+    snapshot = {"job_id": record.id, "status": record.status}
+    if record.status == COMPLETED:
+        snapshot["result"] = {"audio_url": record.audio_url, "enhanced_script": record.enhanced_script, "processing_time": record.processing_time}
+    return snapshot
+
+def load_job_snapshot(job_id: int, user_id: int) -> Optional[Dict]:
+    db = SessionLocal()
+    try:
+        record = db.query(TTSRequest).filter(TTSRequest.id == job_id, TTSRequest.user_id == user_id).first()
+        return job_snapshot(record) if record else None
+    finally:
+        db.close()
+
+def create_job_record(user_id: int, request: TTSRequestModel) -> int:
+    db = SessionLocal()
+    try:
+        record = TTSRequest(user_id=user_id, script_hash=tts_cache_key(request), original_script=request.script, voice_model=request.voice_model.value, emotion_tone=request.emotion_tone.value, purpose=request.purpose.value, status=QUEUED)
+        db.add(record)
+        db.commit()
+        return record.id
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def set_job_status(job_id: int, status: str):
+    db = SessionLocal()
+    try:
+        db.query(TTSRequest).filter(TTSRequest.id == job_id).update({"status": status})
+        db.commit()
+    finally:
+        db.close()
+
+async def stream_job_events(job_id: int, user_id: int):
+    # Subscribe before reading the row so no transition can slip in between
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(job_queue.channel(job_id))
+    try:
+        snapshot = await asyncio.to_thread(load_job_snapshot, job_id, user_id)
+        yield f"event: status\ndata: {json.dumps(snapshot)}\n\n"
+        last_event = time.monotonic()
+        while snapshot["status"] not in TERMINAL_STATUSES:
+            message = await pubsub.get_message(timeout=1.0)
+            if message:
+                snapshot = json.loads(message["data"])
+            elif time.monotonic() - last_event < JOB_SSE_HEARTBEAT:
+                continue
+            else:
+                # Re-read the row in case an event was published while we were disconnected
+                snapshot = await asyncio.to_thread(load_job_snapshot, job_id, user_id)
+            yield f"event: status\ndata: {json.dumps(snapshot)}\n\n"
+            last_event = time.monotonic()
+    finally:
+        await pubsub.aclose()
+
 # --- API Endpoints ---
 @app.post("/api/v1/generate-script", response_model=ScriptGenerationResponse)
-async def generate_script(request: ScriptGenerationRequest, current_user: User = Depends(get_current_user)):
+async def generate_script(request: ScriptGenerationRequest, current_user: AuthPrincipal = Depends(get_current_user)):
     if len(request.idea.strip()) < 5: raise HTTPException(status_code=400, detail="Idea must be at least 5 characters long.")
     generated_script = await emotion_enhancer.generate_script_from_idea(request.idea, request.tone, request.purpose)
     return ScriptGenerationResponse(script=generated_script)
 
 @app.post("/api/v1/tts/generate", response_model=TTSResponse)
-async def generate_tts(request: TTSRequestModel, background_tasks: BackgroundTasks, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    is_safe, reason, _ = content_checker.check_content(request.script)
+async def generate_tts(request: TTSRequestModel, background_tasks: BackgroundTasks, current_user: AuthPrincipal = Depends(get_current_user)):
+    is_safe, reason, _ = await content_checker.check_content(request.script)
     if not is_safe:
         logger.warning(f"Content blocked: {reason}")
         raise HTTPException(status_code=400, detail=f"Content not allowed: {reason}")
     
     request_id = generate_request_id(request.script, request.voice_model.value, request.emotion_tone.value)
-    cache_key = f"tts:{hashlib.md5(request.script.encode()).hexdigest()}:{request.voice_model.value}:{request.emotion_tone.value}"
-    cached_result = redis_client.get(cache_key)
-    if cached_result:
-        logger.info(f"Returning cached result for request {request_id}")
-        return TTSResponse(**json.loads(cached_result))
-        
-    enhanced_script, emotion_analysis = await emotion_enhancer.enhance_script(request.script, request.emotion_tone, request.purpose, request.user_context or "")
-    audio_url, processing_time = await murf_client.generate_speech(enhanced_script, request.voice_model, request.emotion_tone)
-    
-    response_data = {"request_id": request_id, "audio_url": audio_url, "enhanced_script": enhanced_script, "processing_time": processing_time, "emotion_analysis": emotion_analysis}
-    redis_client.setex(cache_key, 86400, json.dumps(response_data))
-    
-    db_request = TTSRequest(user_id=current_user.id, script_hash=cache_key, original_script=request.script, enhanced_script=enhanced_script, voice_model=request.voice_model.value, emotion_tone=request.emotion_tone.value, purpose=request.purpose.value, audio_url=audio_url, processing_time=processing_time, status="completed")
-    db.add(db_request)
-    db.commit()
+    response_data, generated = await synthesize_tts(request, request_id)
+    if not generated:
+        return TTSResponse(**response_data)
+
+    # Written behind in bulk; the response does not wait on the database
+    await tts_writer.put(tts_record_values(current_user.id, request, response_data))
     
     logger.info(f"Successfully generated TTS for request {request_id}")
     return TTSResponse(**response_data)
 
+@app.post("/api/v1/tts/batch")
+async def generate_tts_batch(batch: TTSBatchRequest, current_user: AuthPrincipal = Depends(get_current_user)):
+    """Generate many items in one call, streaming NDJSON lines in completion order"""
+    if len(batch.items) > TTS_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch may contain at most {TTS_BATCH_MAX_ITEMS} items")
+    # Identical items are generated once and reported with all their indices
+    unique: Dict[str, Tuple[TTSRequestModel, List[int]]] = {}
+    for index, item in enumerate(batch.items):
+        unique.setdefault(item.model_dump_json(), (item, []))[1].append(index)
+    user_id = current_user.id
+    return StreamingResponse(stream_tts_batch(list(unique.values()), user_id), media_type="application/x-ndjson")
+
+@app.post("/api/v1/tts/stream")
+async def stream_tts(request: TTSRequestModel, current_user: AuthPrincipal = Depends(get_current_user)):
+    """Synthesize sentence chunks concurrently and stream them back in order as NDJSON"""
+    is_safe, reason, _ = await content_checker.check_content(request.script)
+    if not is_safe:
+        logger.warning(f"Content blocked: {reason}")
+        raise HTTPException(status_code=400, detail=f"Content not allowed: {reason}")
+    request_id = generate_request_id(request.script, request.voice_model.value, request.emotion_tone.value)
+    return StreamingResponse(stream_tts_segments(request, request_id), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+@app.post("/api/v1/tts/jobs", status_code=202)
+async def submit_tts_job(request: TTSRequestModel, current_user: AuthPrincipal = Depends(get_current_user)):
+    """Queue a generation for the worker pool and return immediately"""
+    # Only the cheap blocklist runs here; the worker does the full check
+    hits = content_checker.matcher.scan(request.script)
+    if hits:
+        raise HTTPException(status_code=400, detail=f"Content not allowed: Content contains inappropriate terms: {[term for terms in hits.values() for term in terms]}")
+
+    # Session work runs off the event loop, like the write-behind inserts
+    try:
+        job_id = await asyncio.to_thread(create_job_record, current_user.id, request)
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to record TTS job for user {current_user.id}: {e}")
+        raise HTTPException(status_code=503, detail="Could not record the job, try again later")
+    try:
+        await job_queue.enqueue(job_id, request.model_dump(mode="json"))
+    except Exception as e:
+        logger.error(f"Failed to enqueue TTS job {job_id}: {e}")
+        await asyncio.to_thread(set_job_status, job_id, FAILED)
+        raise HTTPException(status_code=503, detail="Job queue unavailable, try again later")
+    return {"job_id": job_id, "status": QUEUED, "status_url": f"/api/v1/tts/jobs/{job_id}", "events_url": f"/api/v1/tts/jobs/{job_id}/events"}
+
+@app.get("/api/v1/tts/jobs/{job_id}")
+async def get_tts_job(job_id: int, current_user: AuthPrincipal = Depends(get_current_user)):
+    snapshot = await asyncio.to_thread(load_job_snapshot, job_id, current_user.id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if snapshot["status"] in TERMINAL_STATUSES and snapshot["status"] != COMPLETED:
+        error = await call_redis(redis_breaker, lambda: job_queue.get_error(job_id))
+        snapshot["error"] = None if error is UNAVAILABLE else error
+    return snapshot
+
+@app.get("/api/v1/tts/jobs/{job_id}/events")
+async def get_tts_job_events(job_id: int, current_user: AuthPrincipal = Depends(get_current_user)):
+    """Server-sent events with the job's status until it finishes"""
+    if await asyncio.to_thread(load_job_snapshot, job_id, current_user.id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(stream_job_events(job_id, current_user.id), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.api_route("/api/v1/audio/{name}", methods=["GET", "HEAD"])
+async def download_audio(name: str, request: Request):
+    """Stream stored audio with Range, ETag/If-None-Match and zero-copy reads"""
+    match = AUDIO_BLOB_NAME.match(name)
+    if not match:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    digest, audio_format = match.groups()
+    try:
+        # Open before any header is computed: eviction may unlink the blob, but the open file stays readable.
+        # open/fstat/utime are blocking syscalls and can stall on a slow disk, so they run off the event loop
+        blob, size = await asyncio.to_thread(audio_processor.store.open, digest)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    # Content-addressed: the digest is a strong validator and the bytes never change
+    headers = {"ETag": f'"{digest}"', "Accept-Ranges": "bytes", "Cache-Control": "public, max-age=31536000, immutable"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or f'"{digest}"' in if_none_match):
+        blob.close()
+        return Response(status_code=304, headers=headers)
+    await asyncio.to_thread(audio_processor.store.touch, digest)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if not if_range or if_range.strip() == f'"{digest}"':
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            blob.close()
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        return BlobResponse(blob, 0, size - 1, size, headers=headers, media_type=MEDIA_TYPES[audio_format])
+    start, end = byte_range
+    return BlobResponse(blob, start, end, size, status_code=206, headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"}, media_type=MEDIA_TYPES[audio_format])
+
+@app.get("/api/v1/audio/{name}/waveform")
+async def get_audio_waveform(name: str, bars: int = 256, kind: str = "peak", encoding: str = "json"):
+    """Waveform bars (0-255) at a stored resolution; encoding=binary returns the raw uint8 array"""
+    match = AUDIO_BLOB_NAME.match(name)
+    if not match or not await asyncio.to_thread(audio_processor.store.exists, match.group(1)):
+        raise HTTPException(status_code=404, detail="Audio not found")
+    if kind not in ("peak", "rms"):
+        raise HTTPException(status_code=400, detail="kind must be 'peak' or 'rms'")
+    waveforms = unpack_waveforms(await audio_processor.get_waveforms(match.group(1)))
+    if bars not in waveforms:
+        raise HTTPException(status_code=400, detail=f"bars must be one of {sorted(waveforms)}")
+    values = waveforms[bars][0 if kind == "peak" else 1]
+    if encoding == "binary":
+        return Response(values.tobytes(), media_type="application/octet-stream", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+    return {"bars": bars, "kind": kind, "waveform": values.tolist()}
+
 @app.get("/api/v1/voices")
-async def get_available_voices(current_user: User = Depends(get_current_user)):
+async def get_available_voices(current_user: AuthPrincipal = Depends(get_current_user)):
     return {"voices": [{"id": voice.value, "name": voice.value.title()} for voice in VoiceModel]}
 
 @app.get("/api/v1/emotions")
@@ -296,7 +720,24 @@ async def get_available_purposes(api_key: str = Depends(verify_api_key)):
 
 @app.get("/api/v1/health")
 async def health_check():
-    return {"status": "healthy", "version": "1.0.0", "timestamp": time.time()}
+    # Without Redis the node still serves requests, from the in-process cache only
+    redis_status = redis_breaker.get_status()
+    if redis_status["state"] != "closed" or redis_status["consecutive_failures"]:
+        await call_redis(redis_breaker, redis_client.ping)
+        redis_status = redis_breaker.get_status()
+    status = "healthy" if redis_status["state"] == "closed" else "degraded"
+    return {"status": status, "version": "1.0.0", "timestamp": time.time(), "dependencies": {"redis": redis_status}}
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint; stage latencies, cache and LLM counters, host gauges"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/api/v1/stats")
+async def get_stats(current_user: AuthPrincipal = Depends(get_current_user)):
+    job_depth = await call_redis(redis_breaker, job_queue.depth)
+    return {"jobs": None if job_depth is UNAVAILABLE else job_depth, "cache": {**cache_stats, "tiers": tts_cache.get_stats()}, "audio": {**audio_processor.stats, "store": audio_processor.store.get_stats()}, "coalescing": tts_coalescer.stats, "persistence": tts_writer.get_stats(), "auth": auth_cache.get_stats(), "ai_safety": content_checker.scorer.stats, "gemini": get_gateway().get_stats()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
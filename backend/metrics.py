@@ -0,0 +1,179 @@
+import abc
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; spans a cached blocklist scan up to a slow Murf render
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Metric(abc.ABC):
+    """Base for registered metrics; subclasses render their own sample lines"""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        ...
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.samples()])
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}" for key, value in sorted(self._values.items())]
+
+class Gauge(Metric):
+    """A value that goes up and down; set_function makes it read a callback at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels):
+        self._functions[self._key(labels)] = function
+
+    @contextmanager
+    def track_inprogress(self, **labels) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self) -> List[str]:
+        values = dict(self._values)
+        for key, function in self._functions.items():
+            try:
+                values[key] = function()
+            except Exception:
+                continue
+        return [f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}" for key, value in sorted(values.items())]
+
+class Histogram(Metric):
+    """Cumulative-bucket latency histogram, observed in seconds"""
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Per label set: per-bucket (non-cumulative) counts, then sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * len(self.buckets)
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the duration of the with-block, including when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key in sorted(self._counts):
+            cumulative = 0
+            for bound, count in zip(self.buckets, self._counts[key]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, (('le', format_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(self._sums[key])}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format, version 0.0.4"""
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Request pipeline
+HTTP_REQUEST_SECONDS = Histogram("eona_http_request_seconds", "HTTP request latency by route template", ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("eona_http_requests_in_flight", "HTTP requests being handled")
+TTS_STAGE_SECONDS = Histogram("eona_tts_stage_seconds", "Latency of each generate_tts stage", ("stage",))
+CACHE_REQUESTS = Counter("eona_cache_requests_total", "Cache lookups by cache and result", ("cache", "result"))
+
+# Dependencies
+LLM_REQUESTS = Counter("eona_llm_requests_total", "Gemini generate calls")
+LLM_ERRORS = Counter("eona_llm_errors_total", "Gemini calls that failed after retries, by exception type", ("error",))
+LLM_RETRIES = Counter("eona_llm_retries_total", "Gemini calls retried after a retryable error")
+LLM_IN_FLIGHT = Gauge("eona_llm_requests_in_flight", "Gemini calls running or waiting for a slot", ("state",))
+WRITE_BEHIND_PENDING = Gauge("eona_write_behind_pending_rows", "Rows buffered for the next bulk insert")
+
+# Host and process, sampled in the background by monitoring.SystemMonitor
+HOST_CPU_PERCENT = Gauge("eona_host_cpu_percent", "Host CPU utilisation since the previous sample")
+HOST_MEMORY_PERCENT = Gauge("eona_host_memory_percent", "Host memory in use")
+HOST_DISK_PERCENT = Gauge("eona_host_disk_percent", "Root filesystem usage")
+PROCESS_RSS_BYTES = Gauge("eona_process_resident_memory_bytes", "Resident memory of this worker")
+PROCESS_OPEN_FDS = Gauge("eona_process_open_fds", "Open file descriptors (sockets included) of this worker")
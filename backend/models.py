@@ -1,13 +1,16 @@
 from datetime import datetime
 from typing import List, Optional
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, ConfigDict, Field, EmailStr
+from pydantic_core import core_schema
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from enum import Enum
 
 class PyObjectId(ObjectId):
     @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        # Accept ObjectIds or their hex strings; serialize back to the hex string in JSON
+        return core_schema.no_info_plain_validator_function(cls.validate, serialization=core_schema.to_string_ser_schema())
 
     @classmethod
     def validate(cls, v):
@@ -16,8 +19,8 @@ class PyObjectId(ObjectId):
         return ObjectId(v)
 
     @classmethod
-    def __modify_schema__(cls, field_schema):
-        field_schema.update(type="string")
+    def __get_pydantic_json_schema__(cls, schema, handler):
+        return {"type": "string"}
 
 class VoiceType(str, Enum):
     MURF_EXCITED = "Murf Excited"
@@ -52,10 +55,12 @@ class User(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        allow_population_by_field_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True)
+
+USER_INDEXES = [
+    IndexModel([("username", ASCENDING)], unique=True),
+    IndexModel([("email", ASCENDING)], unique=True),
+]
 
 class UserCreate(BaseModel):
     username: str = Field(..., min_length=3, max_length=20)
@@ -92,10 +97,11 @@ class SnapCast(BaseModel):
     user_id: PyObjectId
     voice_type: VoiceType
     category: Category
-    tags: List[str] = Field(default_factory=list, max_items=10)
+    tags: List[str] = Field(default_factory=list, max_length=10)
     audio_url: Optional[str] = None
     duration: Optional[int] = None  # in seconds
     waveform: List[int] = Field(default_factory=list)
+    waveform_url: Optional[str] = None  # packed multi-resolution waveform, see /api/v1/audio/{name}/waveform
     likes: int = 0
     remixes: int = 0
     shares: int = 0
@@ -106,17 +112,32 @@ class SnapCast(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        allow_population_by_field_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True, use_enum_values=True)
+
+SNAPCAST_INDEXES = [
+    # Keyset feeds: recent and popular, with and without a category
+    IndexModel([("is_public", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    IndexModel([("is_public", ASCENDING), ("category", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    IndexModel([("is_public", ASCENDING), ("likes", DESCENDING), ("_id", DESCENDING)]),
+    IndexModel([("is_public", ASCENDING), ("category", ASCENDING), ("likes", DESCENDING), ("_id", DESCENDING)]),
+    # Home timelines and profile pages
+    IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    # Search index catch-up when change streams are unavailable
+    IndexModel([("updated_at", ASCENDING)]),
+]
+
+# Deleted SnapCast ids ({_id, deleted_at}), so search indexes that poll instead of
+# following the change stream still see deletes made by other processes
+SNAPCAST_DELETION_INDEXES = [
+    IndexModel([("deleted_at", ASCENDING)], expireAfterSeconds=7 * 86400),
+]
 
 class SnapCastCreate(BaseModel):
     title: str = Field(..., min_length=1, max_length=200)
     content: str = Field(..., min_length=1, max_length=2000)
     voice_type: VoiceType
     category: Category
-    tags: List[str] = Field(default_factory=list, max_items=10)
+    tags: List[str] = Field(default_factory=list, max_length=10)
     is_public: bool = True
     allow_comments: bool = True
     allow_remixes: bool = True
@@ -125,7 +146,7 @@ class SnapCastUpdate(BaseModel):
     title: Optional[str] = Field(None, min_length=1, max_length=200)
     content: Optional[str] = Field(None, min_length=1, max_length=2000)
     category: Optional[Category] = None
-    tags: Optional[List[str]] = Field(None, max_items=10)
+    tags: Optional[List[str]] = Field(None, max_length=10)
     is_public: Optional[bool] = None
     allow_comments: Optional[bool] = None
     allow_remixes: Optional[bool] = None
@@ -141,6 +162,7 @@ class SnapCastResponse(BaseModel):
     audio_url: Optional[str]
     duration: Optional[int]
     waveform: List[int]
+    waveform_url: Optional[str] = None
     likes: int
     remixes: int
     shares: int
@@ -157,11 +179,16 @@ class Like(BaseModel):
     user_id: PyObjectId
     snapcast_id: PyObjectId
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    category: Optional[str] = None  # the SnapCast's, to find its trending sets on unlike
+    trending_at: Optional[float] = None  # time the like was weighted at in trending; unset if it never was
 
-    class Config:
-        allow_population_by_field_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True)
+
+LIKE_INDEXES = [
+    # One like per user and SnapCast; engagement counters rely on it
+    IndexModel([("user_id", ASCENDING), ("snapcast_id", ASCENDING)], unique=True),
+    IndexModel([("snapcast_id", ASCENDING), ("created_at", DESCENDING)]),
+]
 
 # Follow Model
 class Follow(BaseModel):
@@ -170,10 +197,13 @@ class Follow(BaseModel):
     following_id: PyObjectId
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        allow_population_by_field_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True)
+
+FOLLOW_INDEXES = [
+    # One follow per pair; follower counters rely on it
+    IndexModel([("follower_id", ASCENDING), ("following_id", ASCENDING)], unique=True),
+    IndexModel([("following_id", ASCENDING), ("follower_id", ASCENDING)]),
+]
 
 # Comment Model
 class Comment(BaseModel):
@@ -183,10 +213,11 @@ class Comment(BaseModel):
     content: str = Field(..., min_length=1, max_length=500)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        allow_population_by_field_name = True
-        arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+    model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True)
+
+COMMENT_INDEXES = [
+    IndexModel([("snapcast_id", ASCENDING), ("created_at", DESCENDING)]),
+]
 
 class CommentCreate(BaseModel):
     content: str = Field(..., min_length=1, max_length=500)
@@ -220,8 +251,12 @@ class FeedQuery(BaseModel):
     search: Optional[str] = None
     tags: Optional[List[str]] = None
     sort_by: str = "trending"  # trending, recent, popular
-    limit: int = Field(default=20, le=100)
-    skip: int = Field(default=0, ge=0)
+    limit: int = Field(default=20, ge=1, le=100)
+    cursor: Optional[str] = None  # next_cursor from the previous page
+
+class FeedPage(BaseModel):
+    items: List[dict]
+    next_cursor: Optional[str] = None
 
 class VoiceGenerationRequest(BaseModel):
     text: str = Field(..., min_length=1, max_length=2000)
@@ -234,4 +269,15 @@ class VoiceGenerationResponse(BaseModel):
     audio_url: Optional[str] = None
     duration: Optional[int] = None
     waveform: Optional[List[int]] = None
-    message: str
\ No newline at end of file
+    waveform_url: Optional[str] = None
+    message: str
+
+# Indexes applied at startup by database.ensure_indexes, per collection
+INDEXES = {
+    "users": USER_INDEXES,
+    "snapcasts": SNAPCAST_INDEXES,
+    "snapcast_deletions": SNAPCAST_DELETION_INDEXES,
+    "likes": LIKE_INDEXES,
+    "follows": FOLLOW_INDEXES,
+    "comments": COMMENT_INDEXES,
+}
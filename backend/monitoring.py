@@ -1,9 +1,13 @@
 import psutil
 import time
+import asyncio
 import logging
 from datetime import datetime
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Optional
+
+from config import get_setting
+from metrics import HOST_CPU_PERCENT, HOST_DISK_PERCENT, HOST_MEMORY_PERCENT, PROCESS_OPEN_FDS, PROCESS_RSS_BYTES
 
 @dataclass
 class SystemMetrics:
@@ -11,59 +15,93 @@ class SystemMetrics:
     cpu_percent: float
     memory_percent: float
     disk_usage: float
-    active_connections: int
+    process_rss: int
+    open_fds: int
 
 class SystemMonitor:
-    def __init__(self, log_file: str = "logs/eona_system_metrics.log"):
+    def __init__(self, log_file: str = "logs/eona_system_metrics.log", interval: Optional[float] = None):
         self.logger = logging.getLogger("SystemMonitor")
         handler = logging.FileHandler(log_file)
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
         handler.setFormatter(formatter)
         self.logger.addHandler(handler)
         self.logger.setLevel(logging.INFO)
-    
+        self.interval = interval or get_setting("monitoring.interval", 30)
+        self.process = psutil.Process()
+        self._task: Optional[asyncio.Task] = None
+        # cpu_percent(None) reports usage since the previous call; the first call only sets the baseline
+        psutil.cpu_percent(interval=None)
+
     def collect_metrics(self) -> SystemMetrics:
-        """Collect current system metrics"""
-        cpu_percent = psutil.cpu_percent(interval=1)
+        """Collect current system metrics without sleeping; CPU is averaged since the last sample"""
         memory = psutil.virtual_memory()
         disk = psutil.disk_usage('/')
-        
-        # Count network connections (approximation of active connections)
-        connections = len(psutil.net_connections())
-        
-        return SystemMetrics(
+
+        # This worker's descriptors rather than every socket on the host
+        open_fds = self.process.num_fds() if hasattr(self.process, "num_fds") else self.process.num_handles()
+
+        metrics = SystemMetrics(
             timestamp=datetime.utcnow(),
-            cpu_percent=cpu_percent,
+            cpu_percent=psutil.cpu_percent(interval=None),
             memory_percent=memory.percent,
             disk_usage=disk.percent,
-            active_connections=connections
+            process_rss=self.process.memory_info().rss,
+            open_fds=open_fds
         )
-    
+        HOST_CPU_PERCENT.set(metrics.cpu_percent)
+        HOST_MEMORY_PERCENT.set(metrics.memory_percent)
+        HOST_DISK_PERCENT.set(metrics.disk_usage)
+        PROCESS_RSS_BYTES.set(metrics.process_rss)
+        PROCESS_OPEN_FDS.set(metrics.open_fds)
+        return metrics
+
     def log_metrics(self):
         """Log system metrics"""
         metrics = self.collect_metrics()
-        
+
         self.logger.info(
             f"CPU: {metrics.cpu_percent}% | "
             f"Memory: {metrics.memory_percent}% | "
             f"Disk: {metrics.disk_usage}% | "
-            f"Connections: {metrics.active_connections}"
+            f"RSS: {metrics.process_rss // (1024 * 1024)} MB | "
+            f"Open FDs: {metrics.open_fds}"
         )
-        
+
         # Alert on high resource usage
         if metrics.cpu_percent > 80:
             self.logger.warning(f"High CPU usage: {metrics.cpu_percent}%")
-        
+
         if metrics.memory_percent > 85:
             self.logger.warning(f"High memory usage: {metrics.memory_percent}%")
-        
+
         if metrics.disk_usage > 90:
             self.logger.warning(f"High disk usage: {metrics.disk_usage}%")
-    
+
+    async def run(self):
+        """Sample every interval seconds off the event loop"""
+        while True:
+            try:
+                await asyncio.to_thread(self.log_metrics)
+            except Exception as e:
+                self.logger.error(f"Monitoring error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
     def start_monitoring(self, interval: int = 60):
         """Start continuous monitoring"""
         self.logger.info("Starting system monitoring...")
-        
+
         while True:
             try:
                 self.log_metrics()
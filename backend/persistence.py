@@ -0,0 +1,159 @@
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from config import get_setting
+from metrics import TTS_STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+STOP = object()
+
+def configure_sqlite(engine: Engine):
+    """Apply WAL journaling and relaxed fsync to every new SQLite connection.
+
+    In WAL mode readers never block the writer, and synchronous=NORMAL only
+    fsyncs at checkpoints instead of on every commit.
+    """
+    if engine.dialect.name != "sqlite" or not get_setting("persistence.sqlite_wal", True):
+        return
+    synchronous = get_setting("persistence.sqlite_synchronous", "NORMAL")
+    busy_timeout = get_setting("persistence.sqlite_busy_timeout_ms", 5000)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+        cursor.close()
+
+class WriteBehindWriter:
+    """Buffer rows in memory and insert them in bulk off the request path.
+
+    Rows are flushed when a batch fills up or the oldest buffered row has
+    waited flush_interval. The buffer is bounded: once it is full, put()
+    waits, pushing back on producers instead of growing without limit.
+    stop() drains whatever is still buffered.
+    """
+
+    def __init__(self, session_factory: Callable, model: Any, max_pending: Optional[int] = None, batch_size: Optional[int] = None, flush_interval: Optional[float] = None, max_retries: Optional[int] = None):
+        self.session_factory = session_factory
+        self.model = model
+        self.max_pending = max_pending or get_setting("persistence.max_pending", 10000)
+        self.batch_size = batch_size or get_setting("persistence.batch_size", 200)
+        self.flush_interval = flush_interval or get_setting("persistence.flush_interval_ms", 250) / 1000
+        self.max_retries = max_retries if max_retries is not None else get_setting("persistence.max_retries", 3)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"queued": 0, "written": 0, "batches": 0, "max_batch": 0, "backpressure_waits": 0, "failed_flushes": 0, "dropped": 0}
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+        return self._queue
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, row: Dict):
+        """Buffer one row, waiting for room if the buffer is full"""
+        if self._task is None or self._task.done():
+            # Not running (e.g. a one-off script): write through
+            await asyncio.to_thread(self._insert, [row])
+            return
+        if self.queue.full():
+            self.stats["backpressure_waits"] += 1
+        await self.queue.put(row)
+        self.stats["queued"] += 1
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch: List[Dict] = []
+            deadline = None
+            while len(batch) < self.batch_size:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch: List[Dict]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await asyncio.to_thread(self._insert, batch)
+                self.stats["batches"] += 1
+                self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+                return
+            except Exception as e:
+                error = e
+                self.stats["failed_flushes"] += 1
+                logger.warning(f"Write-behind flush of {len(batch)} rows failed (attempt {attempt + 1}): {e}")
+                # A constraint violation fails every retry the same way
+                if isinstance(e, IntegrityError) or attempt == self.max_retries:
+                    break
+                await asyncio.sleep(min(0.1 * 2 ** attempt, 2.0))
+        # Row by row, so one bad row doesn't take the rest of its batch with it
+        failed = await asyncio.to_thread(self._insert_each, batch) if len(batch) > 1 else [(batch[0], error)]
+        for row, error in failed:
+            logger.error(f"Dropped {self.model.__name__} row {self._describe(row)}: {error}")
+        self.stats["dropped"] += len(failed)
+
+    def _insert(self, rows: List[Dict]):
+        db = self.session_factory()
+        try:
+            # One executemany INSERT and one commit for the whole batch
+            with TTS_STAGE_SECONDS.time(stage="db_commit"):
+                db.execute(insert(self.model), rows)
+                db.commit()
+            self.stats["written"] += len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _insert_each(self, rows: List[Dict]) -> List[Tuple[Dict, Exception]]:
+        """Insert rows one transaction at a time and return the ones that failed"""
+        failed = []
+        for row in rows:
+            try:
+                self._insert([row])
+            except Exception as e:
+                failed.append((row, e))
+        return failed
+
+    @staticmethod
+    def _describe(row: Dict) -> str:
+        return ", ".join(f"{key}={row[key]!r}" for key in ("user_id", "script_hash") if key in row) or "(no id)"
+
+    async def stop(self):
+        """Flush everything still buffered and stop the flusher"""
+        if self._task is None:
+            return
+        # Queued behind the buffered rows, so they are all written first
+        await self.queue.put(STOP)
+        await self._task
+        self._task = None
+        logger.info(f"Write-behind writer for {self.model.__name__} stopped, {self.stats['written']} rows written")
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "pending": self.queue.qsize()}
@@ -0,0 +1,832 @@
+import os
+import re
+import json
+import mmap
+import time
+import uuid
+import fcntl
+import struct
+import asyncio
+import logging
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from config import get_setting
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+MAX_TOKEN_LENGTH = 40
+# Tag filter terms live in the same dictionary; queries never produce "#" tokens
+TAG_PREFIX = "#"
+
+SEGMENT_MAGIC = b"ESG1"
+# BM25 defaults used to rank champion lists when a segment is written
+IMPACT_K1 = 1.2
+IMPACT_B = 0.75
+TERM_BLOCK = 64
+# magic, version, seq, docs, terms, postings, champion postings
+SEGMENT_HEADER = struct.Struct("<4sHxxQQQQQ")
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) <= MAX_TOKEN_LENGTH]
+
+def normalize_tag(tag: str) -> str:
+    return tag.strip().lstrip("#").lower()
+
+def document_terms(doc: Dict, title_boost: float, tag_boost: float) -> Tuple[Dict[str, float], float]:
+    """Field-weighted term frequencies and weighted length of a SnapCast"""
+    terms: Dict[str, float] = {}
+    length = 0.0
+    fields = [(doc.get("title") or "", title_boost), (doc.get("content") or "", 1.0)]
+    fields += [(tag, tag_boost) for tag in doc.get("tags") or []]
+    for text, boost in fields:
+        for token in tokenize(text):
+            terms[token] = terms.get(token, 0.0) + boost
+            length += boost
+    for tag in doc.get("tags") or []:
+        terms[TAG_PREFIX + normalize_tag(tag)] = 1.0
+    return terms, length
+
+def _aligned(offset: int) -> int:
+    return (offset + 7) & ~7
+
+def champion_lists(posting_offsets: np.ndarray, posting_docs: np.ndarray, posting_tfs: np.ndarray, lengths: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The size highest-impact docs of every term with a longer postings list, best first"""
+    norms = 1 - IMPACT_B + IMPACT_B * lengths / max(float(lengths.mean()) if len(lengths) else 1.0, 1e-9)
+    offsets = np.zeros(len(posting_offsets), dtype=np.uint64)
+    chunks = []
+    total = 0
+    for term in np.flatnonzero(np.diff(posting_offsets.astype(np.int64)) > size):
+        start, end = int(posting_offsets[term]), int(posting_offsets[term + 1])
+        docs, tfs = posting_docs[start:end], posting_tfs[start:end]
+        impact = tfs / (tfs + IMPACT_K1 * norms[docs])
+        best = np.argpartition(-impact, size - 1)[:size]
+        chunks.append(docs[best[np.argsort(-impact[best], kind="stable")]])
+        offsets[term + 1] = size
+    np.cumsum(offsets, out=offsets)
+    return offsets, (np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.uint32)).astype(np.uint32)
+
+def write_segment(path: Path, seq: int, ids: np.ndarray, lengths: np.ndarray, categories: np.ndarray, terms: List[str], posting_terms: np.ndarray, posting_docs: np.ndarray, posting_tfs: np.ndarray, champion_size: int):
+    """Write an immutable segment; terms must be sorted, posting_terms index into them"""
+    order = np.lexsort((posting_docs, posting_terms))
+    posting_terms = posting_terms[order]
+    posting_docs = posting_docs[order].astype(np.uint32)
+    posting_tfs = posting_tfs[order].astype(np.float32)
+    posting_offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+    np.cumsum(np.bincount(posting_terms, minlength=len(terms)), out=posting_offsets[1:])
+    champion_offsets, champion_docs = champion_lists(posting_offsets, posting_docs, posting_tfs, lengths.astype(np.float32), champion_size)
+    encoded = [term.encode() for term in terms]
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+    np.cumsum([len(term) for term in encoded], out=term_offsets[1:])
+    id_keys = np.ascontiguousarray(ids, dtype=np.uint8).view("S12").ravel()
+    id_order = np.argsort(id_keys, kind="stable")
+
+    sections = [
+        np.ascontiguousarray(ids, dtype=np.uint8).tobytes(),
+        lengths.astype(np.float32).tobytes(),
+        categories.astype(np.uint8).tobytes(),
+        id_keys[id_order].tobytes(),
+        id_order.astype(np.uint32).tobytes(),
+        term_offsets.tobytes(),
+        posting_offsets.tobytes(),
+        posting_docs.tobytes(),
+        posting_tfs.tobytes(),
+        champion_offsets.tobytes(),
+        champion_docs.tobytes(),
+        b"".join(encoded),
+    ]
+    tmp_path = path.with_suffix(f".tmp{os.getpid()}")
+    with open(tmp_path, "wb") as f:
+        f.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, 1, seq, len(ids), len(terms), len(posting_docs), len(champion_docs)))
+        for section in sections:
+            f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+            f.write(section)
+    os.replace(tmp_path, path)
+
+class DiskSegment:
+    """Read-only segment served straight from a memory map; opening it reads only the header"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.seq, docs, terms, postings, champions = SEGMENT_HEADER.unpack_from(self._mmap)
+        if magic != SEGMENT_MAGIC or version != 1:
+            raise ValueError(f"{path} is not a search segment")
+        self.num_docs, self.num_terms = docs, terms
+        offset = SEGMENT_HEADER.size
+
+        def section(dtype, count):
+            nonlocal offset
+            offset = _aligned(offset)
+            array = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset)
+            offset += array.nbytes
+            return array
+
+        self.ids = section(np.uint8, docs * 12).reshape(docs, 12)
+        self.lengths = section(np.float32, docs)
+        self.categories = section(np.uint8, docs)
+        self.sorted_ids = section("S12", docs)
+        self.sorted_docs = section(np.uint32, docs)
+        self.term_offsets = section(np.uint64, terms + 1)
+        self.posting_offsets = section(np.uint64, terms + 1)
+        self.posting_docs = section(np.uint32, postings)
+        self.posting_tfs = section(np.float32, postings)
+        self.champion_offsets = section(np.uint64, terms + 1)
+        self.champion_docs = section(np.uint32, champions)
+        self.terms_start = _aligned(offset)
+        # Every TERM_BLOCK-th term in memory: lookups bisect this, then search one block of the map
+        self._block_keys = [self._term(index) for index in range(0, terms, TERM_BLOCK)]
+        self.dead = np.zeros(docs, dtype=bool)
+        self.live_docs = docs
+        self.live_length = float(self.lengths.sum(dtype=np.float64))
+
+    def _term(self, index: int) -> bytes:
+        return self._mmap[self.terms_start + int(self.term_offsets[index]):self.terms_start + int(self.term_offsets[index + 1])]
+
+    def _lower_bound(self, key: bytes) -> int:
+        block = bisect_right(self._block_keys, key) - 1
+        if block < 0:
+            return 0
+        low = block * TERM_BLOCK
+        high = min(low + TERM_BLOCK, self.num_terms)
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _find(self, term: str) -> Optional[int]:
+        key = term.encode()
+        index = self._lower_bound(key)
+        return index if index < self.num_terms and self._term(index) == key else None
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        index = self._find(term)
+        if index is None:
+            return None
+        start, end = int(self.posting_offsets[index]), int(self.posting_offsets[index + 1])
+        return self.posting_docs[start:end], self.posting_tfs[start:end]
+
+    def df(self, term: str) -> int:
+        index = self._find(term)
+        return 0 if index is None else int(self.posting_offsets[index + 1] - self.posting_offsets[index])
+
+    def candidates(self, term: str, budget: int) -> Optional[np.ndarray]:
+        """Docs to consider for a term: the head of its champion list if it has one, else all its postings"""
+        index = self._find(term)
+        if index is None:
+            return None
+        start, end = int(self.champion_offsets[index]), int(self.champion_offsets[index + 1])
+        if end > start:
+            return self.champion_docs[start:min(end, start + budget)]
+        return self.posting_docs[int(self.posting_offsets[index]):int(self.posting_offsets[index + 1])]
+
+    def expand(self, prefix: str, limit: int) -> List[str]:
+        key = prefix.encode()
+        index = self._lower_bound(key)
+        terms = []
+        while index < self.num_terms and len(terms) < limit:
+            term = self._term(index)
+            if not term.startswith(key):
+                break
+            terms.append(term.decode())
+            index += 1
+        return terms
+
+    def find_doc(self, id_bytes: bytes) -> Optional[int]:
+        docs = self.find_docs([id_bytes])
+        return int(docs[0]) if len(docs) else None
+
+    def find_docs(self, ids: List[bytes]) -> np.ndarray:
+        """Doc numbers of the given ObjectIds that are in this segment"""
+        if not ids or not self.num_docs:
+            return np.zeros(0, dtype=np.uint32)
+        keys = np.frombuffer(b"".join(ids), dtype=np.uint8).view("S12")
+        positions = np.minimum(np.searchsorted(self.sorted_ids, keys), self.num_docs - 1)
+        docs = self.sorted_docs[positions]
+        # Compare raw bytes: S12 values drop trailing zero bytes
+        found = (self.ids[docs] == np.frombuffer(b"".join(ids), dtype=np.uint8).reshape(-1, 12)).all(axis=1)
+        return docs[found]
+
+    def mark_dead(self, doc: int):
+        if not self.dead[doc]:
+            self.dead[doc] = True
+            self.live_docs -= 1
+            self.live_length -= float(self.lengths[doc])
+
+    def doc_id(self, doc: int) -> str:
+        return self.ids[doc].tobytes().hex()
+
+    def all_terms(self) -> List[str]:
+        blob = self._mmap[self.terms_start:self.terms_start + int(self.term_offsets[-1])]
+        offsets = self.term_offsets.tolist()
+        return [blob[offsets[i]:offsets[i + 1]].decode() for i in range(self.num_terms)]
+
+    def close(self):
+        for name in ("ids", "lengths", "categories", "sorted_ids", "sorted_docs", "term_offsets", "posting_offsets", "posting_docs", "posting_tfs", "champion_offsets", "champion_docs"):
+            setattr(self, name, None)
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # a search still holds a view; the map is released with it
+
+class MemorySegment:
+    """Mutable segment for recent writes, flushed to a DiskSegment when it fills up"""
+
+    def __init__(self, seq: int):
+        self.seq = seq
+        self.terms: Dict[str, Dict[int, float]] = {}
+        self.ids: List[bytes] = []
+        self.lengths_list: List[float] = []
+        self.categories_list: List[int] = []
+        self.doc_of: Dict[bytes, int] = {}
+        self.removed: set = set()
+        self.live_docs = 0
+        self.live_length = 0.0
+        self.max_updated_at: Optional[datetime] = None
+        self._sorted_terms: Optional[List[str]] = None
+        self._arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.ids)
+
+    def add(self, id_bytes: bytes, terms: Dict[str, float], length: float, category: int):
+        self.remove(id_bytes)
+        doc = len(self.ids)
+        self.ids.append(id_bytes)
+        self.lengths_list.append(length)
+        self.categories_list.append(category)
+        self.doc_of[id_bytes] = doc
+        for term, tf in terms.items():
+            self._postings.pop(term, None)
+            postings = self.terms.get(term)
+            if postings is None:
+                self.terms[term] = postings = {}
+                self._sorted_terms = None
+            postings[doc] = tf
+        self.live_docs += 1
+        self.live_length += length
+        self._arrays = None
+
+    def remove(self, id_bytes: bytes) -> bool:
+        doc = self.doc_of.pop(id_bytes, None)
+        if doc is None:
+            return False
+        self.removed.add(doc)
+        self.live_docs -= 1
+        self.live_length -= self.lengths_list[doc]
+        self._arrays = None
+        return True
+
+    def mark_dead(self, doc: int):
+        self.remove(self.ids[doc])
+
+    def find_doc(self, id_bytes: bytes) -> Optional[int]:
+        return self.doc_of.get(id_bytes)
+
+    @property
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._arrays is None:
+            dead = np.zeros(len(self.ids), dtype=bool)
+            dead[list(self.removed)] = True
+            self._arrays = (np.array(self.lengths_list, dtype=np.float32), np.array(self.categories_list, dtype=np.uint8), dead)
+        return self._arrays
+
+    lengths = property(lambda self: self.arrays[0])
+    categories = property(lambda self: self.arrays[1])
+    dead = property(lambda self: self.arrays[2])
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        cached = self._postings.get(term)
+        if cached is None:
+            postings = self.terms.get(term)
+            if not postings:
+                return None
+            # Doc numbers only grow, so insertion order is already sorted
+            cached = self._postings[term] = (np.fromiter(postings.keys(), dtype=np.uint32, count=len(postings)), np.fromiter(postings.values(), dtype=np.float32, count=len(postings)))
+        return cached
+
+    def df(self, term: str) -> int:
+        return len(self.terms.get(term, ()))
+
+    def candidates(self, term: str, budget: int) -> Optional[np.ndarray]:
+        postings = self.postings(term)
+        return None if postings is None else postings[0]
+
+    def expand(self, prefix: str, limit: int) -> List[str]:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self.terms)
+        index = bisect_left(self._sorted_terms, prefix)
+        terms = []
+        while index < len(self._sorted_terms) and len(terms) < limit and self._sorted_terms[index].startswith(prefix):
+            terms.append(self._sorted_terms[index])
+            index += 1
+        return terms
+
+    def doc_id(self, doc: int) -> str:
+        return self.ids[doc].hex()
+
+Segment = Union[DiskSegment, MemorySegment]
+
+def merge_segments(path: Path, seq: int, segments: List[Segment], dead: List[np.ndarray], champion_size: int):
+    """Write the live documents of several segments into one, dropping deleted ones"""
+    vocabulary = sorted({term for segment in segments for term in (segment.all_terms() if isinstance(segment, DiskSegment) else segment.terms)})
+    term_index = {term: index for index, term in enumerate(vocabulary)}
+    ids, lengths, categories, posting_terms, posting_docs, posting_tfs = [], [], [], [], [], []
+    next_doc = 0
+    for segment, segment_dead in zip(segments, dead):
+        live = ~segment_dead
+        remap = np.full(segment.num_docs, -1, dtype=np.int64)
+        remap[live] = np.arange(next_doc, next_doc + int(live.sum()))
+        next_doc += int(live.sum())
+        if isinstance(segment, DiskSegment):
+            ids.append(segment.ids[live])
+            terms = segment.all_terms()
+            local_terms = np.repeat(np.arange(segment.num_terms), np.diff(segment.posting_offsets.astype(np.int64)))
+            global_terms = np.array([term_index[term] for term in terms], dtype=np.int64)[local_terms] if terms else np.zeros(0, dtype=np.int64)
+            docs, tfs = segment.posting_docs, segment.posting_tfs
+        else:
+            ids.append(np.frombuffer(b"".join(segment.ids), dtype=np.uint8).reshape(segment.num_docs, 12)[live])
+            counts = [len(postings) for postings in segment.terms.values()]
+            global_terms = np.repeat(np.array([term_index[term] for term in segment.terms], dtype=np.int64), counts)
+            docs = np.fromiter((doc for postings in segment.terms.values() for doc in postings), dtype=np.uint32, count=int(sum(counts)))
+            tfs = np.fromiter((tf for postings in segment.terms.values() for tf in postings.values()), dtype=np.float32, count=int(sum(counts)))
+        if isinstance(segment, DiskSegment):
+            lengths.append(segment.lengths[live])
+            categories.append(segment.categories[live])
+        else:
+            # Read the lists, not the cached arrays: the segment may still take deletes meanwhile
+            lengths.append(np.array(segment.lengths_list, dtype=np.float32)[live])
+            categories.append(np.array(segment.categories_list, dtype=np.uint8)[live])
+        keep = live[docs] if len(docs) else np.zeros(0, dtype=bool)
+        posting_terms.append(global_terms[keep])
+        posting_docs.append(remap[docs[keep]])
+        posting_tfs.append(tfs[keep])
+    write_segment(path, seq, np.concatenate(ids) if ids else np.zeros((0, 12), dtype=np.uint8), np.concatenate(lengths), np.concatenate(categories), vocabulary, np.concatenate(posting_terms), np.concatenate(posting_docs), np.concatenate(posting_tfs), champion_size)
+
+class SearchIndex:
+    """Incrementally updated BM25 index over public SnapCasts.
+
+    Writes land in an in-memory segment that is flushed to an immutable,
+    memory-mapped segment file once it holds flush_docs documents; segments
+    are merged when there are more than max_segments. Updates and deletes
+    record a tombstone (id -> segment seq) that hides older copies of the
+    document, so nothing on disk is rewritten until the next merge.
+
+    One process owns the index directory (an exclusive flock) and writes
+    segments. Every other process opens them read-only and indexes changes
+    into its own memory segment; when the owner publishes a new manifest it
+    reloads it and keeps in memory only what the manifest does not cover
+    yet. A read-only process takes the index over once the owner is gone.
+    """
+
+    def __init__(self, index_dir: Optional[str] = None):
+        self.dir = Path(index_dir or get_setting("search.index_dir", "data/search"))
+        self.flush_docs = get_setting("search.flush_docs", 50000)
+        self.max_segments = get_setting("search.max_segments", 8)
+        self.k1 = get_setting("search.k1", 1.2)
+        self.b = get_setting("search.b", 0.75)
+        self.title_boost = get_setting("search.title_boost", 2.0)
+        self.tag_boost = get_setting("search.tag_boost", 1.5)
+        self.min_prefix = get_setting("search.min_prefix_length", 2)
+        self.max_expansions = get_setting("search.max_prefix_expansions", 8)
+        self.champion_size = get_setting("search.champion_size", 1024)
+        self.max_candidates = get_setting("search.max_candidates", 8192)
+        self.poll_interval = get_setting("search.poll_interval", 5)
+        self.delete_replay = timedelta(seconds=get_setting("search.delete_replay_seconds", 600))
+        self.segments: List[Segment] = []
+        self.memory = MemorySegment(1)
+        self.tombstones: Dict[bytes, int] = {}
+        self.categories: List[str] = []
+        self.indexed_until: Optional[datetime] = None
+        self.deleted_until: Optional[datetime] = None
+        self.writer = False
+        self.snapcasts: Any = None
+        self.deletions: Any = None
+        # Deletes a read-only process applied itself, replayed over each reloaded manifest
+        self._recent_deletes: Dict[bytes, datetime] = {}
+        self._manifest_mtime: Optional[int] = None
+        self._owner_checked = 0.0
+        self._lock_file = None
+        self._maintenance: Optional[asyncio.Task] = None
+        self._maintain_lock = asyncio.Lock()
+        self.stats = {"queries": 0, "upserts": 0, "deletes": 0, "flushes": 0, "merges": 0, "reloads": 0}
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.dir / "manifest.json"
+
+    def open(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._lock_file = open(self.dir / "LOCK", "a")
+        if not self._take_lock():
+            logger.info("Search index is owned by another process, opening it read-only")
+        manifest = self._read_manifest()
+        if manifest is None:
+            return
+        self._load(manifest, [DiskSegment(self.dir / name) for name in manifest["segments"]])
+        if self.writer:
+            self._remove_orphans(manifest["segments"])
+        logger.info(f"Opened search index: {len(self.segments)} segments, {self.num_docs} documents")
+
+    def _take_lock(self) -> bool:
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        self.writer = True
+        return True
+
+    def _read_manifest(self) -> Optional[Dict]:
+        try:
+            # Stat first: a manifest replaced in between is only read twice, never missed
+            self._manifest_mtime = self.manifest_path.stat().st_mtime_ns
+            return json.loads(self.manifest_path.read_text())
+        except FileNotFoundError:
+            return None
+
+    def _load(self, manifest: Dict, segments: List[DiskSegment]):
+        """Adopt a manifest's segments and tombstones, starting from an empty memory segment"""
+        self.categories = manifest["categories"]
+        self.tombstones = {bytes.fromhex(key): seq for key, seq in manifest["tombstones"].items()}
+        self.indexed_until = datetime.fromisoformat(manifest["indexed_until"]) if manifest.get("indexed_until") else None
+        self.deleted_until = datetime.fromisoformat(manifest["deleted_until"]) if manifest.get("deleted_until") else None
+        self.segments = segments
+        for segment in self.segments:
+            self._apply_tombstones(segment)
+        self.memory = MemorySegment(manifest["next_seq"])
+
+    async def reload(self, force: bool = False) -> bool:
+        """Adopt a manifest the owner wrote since this process last read one.
+
+        Documents and deletes newer than the manifest are fetched before
+        anything is swapped and applied right after it, with no await in
+        between, so searches never see them missing or twice. The memory
+        segment then holds only what the owner has not flushed yet.
+        """
+        try:
+            mtime = self.manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._manifest_mtime and not force:
+            return False
+        manifest = self._read_manifest()
+        if manifest is None:
+            return False
+        indexed_until = datetime.fromisoformat(manifest["indexed_until"]) if manifest.get("indexed_until") else None
+        deleted_until = datetime.fromisoformat(manifest["deleted_until"]) if manifest.get("deleted_until") else None
+        docs = [doc async for doc in self.snapcasts.find({"updated_at": {"$gte": indexed_until}} if indexed_until else {})]
+        deleted = await self._fetch_deletions(deleted_until)
+
+        current = {segment.path.name: segment for segment in self.segments if isinstance(segment, DiskSegment)}
+        opened: Dict[str, DiskSegment] = {}
+        try:
+            for name in manifest["segments"]:
+                if name not in current:
+                    opened[name] = DiskSegment(self.dir / name)
+        except FileNotFoundError as e:
+            # Merged away meanwhile; the next manifest lists its replacement
+            for segment in opened.values():
+                segment.close()
+            self._manifest_mtime = None
+            logger.info(f"Search manifest changed while reloading, retrying later: {e}")
+            return False
+        self._load(manifest, [current.get(name) or opened[name] for name in manifest["segments"]])
+        cutoff = datetime.utcnow() - self.delete_replay
+        self._recent_deletes = {id_bytes: deleted_at for id_bytes, deleted_at in self._recent_deletes.items() if deleted_at > cutoff}
+        self._apply_deletes(deleted)
+        for id_bytes, deleted_at in list(self._recent_deletes.items()):
+            self._remove(id_bytes, deleted_at)
+        for doc in docs:
+            deleted_at = self._recent_deletes.get(ObjectId(doc["_id"]).binary)
+            # Fetched before a delete this process has already applied
+            if deleted_at is None or not isinstance(doc.get("updated_at"), datetime) or doc["updated_at"] > deleted_at:
+                self.upsert(doc)
+        for name, segment in current.items():
+            if name not in manifest["segments"]:
+                segment.close()
+        self.stats["reloads"] += 1
+        return True
+
+    async def _fetch_deletions(self, since: Optional[datetime]) -> Dict[bytes, datetime]:
+        if self.deletions is None:
+            return {}
+        return {ObjectId(doc["_id"]).binary: doc["deleted_at"] async for doc in self.deletions.find({"deleted_at": {"$gte": since}} if since else {})}
+
+    def _apply_deletes(self, deleted: Dict[bytes, datetime]):
+        """Apply deletes read from the deletions collection and advance the position read up to"""
+        for id_bytes, deleted_at in deleted.items():
+            self._remove(id_bytes, deleted_at)
+            self.stats["deletes"] += 1
+            if self.deleted_until is None or deleted_at > self.deleted_until:
+                self.deleted_until = deleted_at
+
+    @property
+    def num_docs(self) -> int:
+        return sum(segment.live_docs for segment in self._all_segments())
+
+    def _all_segments(self) -> List[Segment]:
+        return [*self.segments, self.memory]
+
+    def _category_code(self, category: Optional[str], create: bool = False) -> Optional[int]:
+        if not category:
+            return 0
+        if category not in self.categories:
+            if not create or len(self.categories) >= 255:
+                return None
+            self.categories.append(category)
+        return self.categories.index(category) + 1
+
+    def _apply_tombstones(self, segment: Segment):
+        hidden = [id_bytes for id_bytes, seq in self.tombstones.items() if segment.seq < seq]
+        docs = segment.find_docs(hidden) if isinstance(segment, DiskSegment) else [doc for doc in map(segment.find_doc, hidden) if doc is not None]
+        for doc in docs:
+            segment.mark_dead(int(doc))
+
+    def _tombstone(self, id_bytes: bytes):
+        """Hide every copy of a document in segments older than the memory segment"""
+        for segment in self.segments:
+            doc = segment.find_doc(id_bytes)
+            if doc is not None:
+                segment.mark_dead(doc)
+                # Persisted so the copy stays hidden when the segment is reopened
+                self.tombstones[id_bytes] = self.memory.seq
+
+    def upsert(self, doc: Dict):
+        if not doc.get("is_public", True):
+            self.delete(doc["_id"], doc.get("updated_at"))
+            return
+        id_bytes = ObjectId(doc["_id"]).binary
+        terms, length = document_terms(doc, self.title_boost, self.tag_boost)
+        self._tombstone(id_bytes)
+        self.memory.add(id_bytes, terms, length, self._category_code(doc.get("category"), create=True))
+        updated_at = doc.get("updated_at")
+        if isinstance(updated_at, datetime) and (self.memory.max_updated_at is None or updated_at > self.memory.max_updated_at):
+            self.memory.max_updated_at = updated_at
+        self.stats["upserts"] += 1
+
+    def delete(self, snapcast_id: Any, at: Optional[datetime] = None):
+        self._remove(ObjectId(snapcast_id).binary, at if isinstance(at, datetime) else datetime.utcnow())
+        self.stats["deletes"] += 1
+
+    def _remove(self, id_bytes: bytes, at: datetime):
+        self._tombstone(id_bytes)
+        self.memory.remove(id_bytes)
+        if not self.writer:
+            self._recent_deletes[id_bytes] = max(at, self._recent_deletes.get(id_bytes, at))
+
+    def search(self, text: str, category: Optional[str] = None, tags: Optional[Iterable[str]] = None, limit: int = 20, after: Optional[Tuple[float, str]] = None) -> List[Tuple[str, float]]:
+        """Top SnapCast ids by BM25 as (hex id, score); after=(score, id) resumes past a previous page.
+
+        The last token is also matched as a prefix unless the text ends in
+        whitespace, so results follow the user as they type.
+        """
+        self.stats["queries"] += 1
+        tokens = list(dict.fromkeys(tokenize(text)))
+        code = self._category_code(category)
+        if not tokens or code is None:
+            return []
+        segments = self._all_segments()
+        total_docs = sum(segment.live_docs for segment in segments)
+        if total_docs == 0:
+            return []
+        average_length = max(sum(segment.live_length for segment in segments) / total_docs, 1e-9)
+        prefix = tokens[-1] if not text[-1].isspace() and len(tokens[-1]) >= self.min_prefix else None
+        group: List[str] = []
+        if prefix:
+            tokens = tokens[:-1]
+            found = {term for segment in segments for term in segment.expand(prefix, self.max_expansions + 1)}
+            group = sorted(found, key=lambda term: (term != prefix, -sum(segment.df(term) for segment in segments)))[:self.max_expansions]
+        df = {term: sum(segment.df(term) for segment in segments) for term in [*tokens, *group]}
+        idf = {term: float(np.log1p((total_docs - count + 0.5) / (count + 0.5))) for term, count in df.items()}
+        tag_terms = [TAG_PREFIX + normalize_tag(tag) for tag in tags or []]
+
+        hits: List[Tuple[Segment, np.ndarray, np.ndarray]] = []
+        for segment in segments:
+            docs = self._candidates(segment, [*tokens, *group])
+            if not len(docs):
+                continue
+            keep = ~segment.dead[docs]
+            if code:
+                keep &= segment.categories[docs] == code
+            for tag_term in tag_terms:
+                postings = segment.postings(tag_term)
+                keep &= np.isin(docs, postings[0]) if postings else False
+            docs = docs[keep]
+            scores = np.zeros(len(docs))
+            for term in tokens:
+                scores += self._term_scores(segment, [term], docs, idf, average_length)
+            if group:
+                # A prefix counts once per document: its best-scoring completion
+                scores += self._term_scores(segment, group, docs, idf, average_length)
+            if after:
+                keep = scores <= after[0]
+                docs, scores = docs[keep], scores[keep]
+            hits.append((segment, docs, scores))
+        if not hits:
+            return []
+        all_scores = np.concatenate([scores for _, _, scores in hits])
+        owners = np.concatenate([np.full(len(docs), index) for index, (_, docs, _) in enumerate(hits)])
+        all_docs = np.concatenate([docs for _, docs, _ in hits])
+        # Ties with the cursor's score are settled by id below, so take enough to cover them
+        take = min(len(all_scores), limit + (int((all_scores == after[0]).sum()) if after else 0))
+        if take == 0:
+            return []
+        if take < len(all_scores):
+            # Everything tied with the k-th score, so the id tiebreak below is exact
+            kth = np.partition(all_scores, len(all_scores) - take)[len(all_scores) - take]
+            top = np.flatnonzero(all_scores >= kth)
+        else:
+            top = np.arange(len(all_scores))
+        results = [(hits[owners[i]][0].doc_id(int(all_docs[i])), float(all_scores[i])) for i in top]
+        if after:
+            results = [(doc_id, score) for doc_id, score in results if score < after[0] or doc_id < after[1]]
+        results.sort(key=lambda result: (result[1], result[0]), reverse=True)
+        return results[:limit]
+
+    def _bm25(self, tfs: np.ndarray, lengths: np.ndarray, idf: float, average_length: float) -> np.ndarray:
+        return idf * tfs * (self.k1 + 1) / (tfs + self.k1 * (1 - self.b + self.b * lengths / average_length))
+
+    def _candidates(self, segment: Segment, terms: List[str]) -> np.ndarray:
+        """Sorted union of the terms' candidate docs.
+
+        Long postings lists contribute only the head of their champion list
+        (the docs where the term weighs most), which bounds the work per query
+        regardless of corpus size; docs found through any term are still
+        scored on all terms.
+        """
+        budget = max(self.max_candidates // max(len(terms), 1), 256)
+        lists = [docs for docs in (segment.candidates(term, budget) for term in terms) if docs is not None]
+        if not lists:
+            return np.zeros(0, dtype=np.uint32)
+        docs = np.sort(np.concatenate(lists))
+        return docs[np.concatenate(([True], docs[1:] != docs[:-1]))] if len(docs) else docs
+
+    def _term_scores(self, segment: Segment, terms: List[str], docs: np.ndarray, idf: Dict[str, float], average_length: float) -> np.ndarray:
+        """Best BM25 contribution among the terms for each of the given (sorted) docs"""
+        scores = np.zeros(len(docs))
+        if not len(docs):
+            return scores
+        for term in terms:
+            postings = segment.postings(term)
+            if postings is None:
+                continue
+            posting_docs, tfs = postings
+            # Binary search the shorter of the two sorted lists into the longer one
+            if len(docs) <= len(posting_docs):
+                positions = np.minimum(np.searchsorted(posting_docs, docs), len(posting_docs) - 1)
+                matched = np.flatnonzero(posting_docs[positions] == docs)
+                tfs = tfs[positions[matched]]
+            else:
+                positions = np.minimum(np.searchsorted(docs, posting_docs), len(docs) - 1)
+                hit = docs[positions] == posting_docs
+                matched, tfs = positions[hit], tfs[hit]
+            lengths = segment.lengths[docs[matched]]
+            contribution = idf[term] * tfs * (self.k1 + 1) / (tfs + self.k1 * (1 - self.b + self.b * lengths / average_length))
+            scores[matched] = np.maximum(scores[matched], contribution)
+        return scores
+
+    async def maintain(self, force: bool = False):
+        """Flush the memory segment when full (or forced) and merge segments if there are too many"""
+        if not self.writer and not force:
+            await self._follow_owner()
+        if not self.writer or self.memory.num_docs == 0 or (self.memory.num_docs < self.flush_docs and not force):
+            return
+        if self._maintain_lock.locked() and not force:
+            return
+        async with self._maintain_lock:
+            await self._flush()
+
+    async def _follow_owner(self):
+        """Read-only processes: reload new manifests, and take the index over once the owner is gone"""
+        if self.snapcasts is None or time.monotonic() - self._owner_checked < self.poll_interval:
+            return
+        self._owner_checked = time.monotonic()
+        if self._take_lock():
+            logger.info("Search index owner went away, taking the index over")
+            await self.reload(force=True)
+            self._recent_deletes.clear()
+            self._remove_orphans([segment.path.name for segment in self.segments if isinstance(segment, DiskSegment)])
+        else:
+            await self.reload()
+
+    async def _flush(self):
+        frozen = self.memory
+        self.memory = MemorySegment(frozen.seq + 1)
+        # The frozen segment keeps serving searches until its file is ready
+        self.segments = [*self.segments, frozen]
+        name = f"seg-{frozen.seq:08d}-{uuid.uuid4().hex[:8]}.idx"
+        await asyncio.to_thread(merge_segments, self.dir / name, frozen.seq, [frozen], [frozen.dead.copy()], self.champion_size)
+        segment = DiskSegment(self.dir / name)
+        self._apply_tombstones(segment)
+        self.segments = [segment if existing is frozen else existing for existing in self.segments]
+        if frozen.max_updated_at and (self.indexed_until is None or frozen.max_updated_at > self.indexed_until):
+            self.indexed_until = frozen.max_updated_at
+        self.stats["flushes"] += 1
+        if len(self.segments) > self.max_segments:
+            await self._merge()
+        self._write_manifest()
+
+    async def _merge(self):
+        merging = list(self.segments)
+        seq = max(segment.seq for segment in merging)
+        name = f"seg-{seq:08d}-{uuid.uuid4().hex[:8]}.idx"
+        start = time.perf_counter()
+        await asyncio.to_thread(merge_segments, self.dir / name, seq, merging, [segment.dead.copy() for segment in merging], self.champion_size)
+        merged = DiskSegment(self.dir / name)
+        # Only tombstones newer than everything merged can still hide documents
+        self.tombstones = {id_bytes: tombstone for id_bytes, tombstone in self.tombstones.items() if tombstone > seq}
+        self._apply_tombstones(merged)
+        self.segments = [merged, *self.segments[len(merging):]]
+        self._write_manifest()
+        for segment in merging:
+            segment.close()
+            segment.path.unlink(missing_ok=True)
+        self.stats["merges"] += 1
+        logger.info(f"Merged {len(merging)} search segments into {name} ({merged.num_docs} documents) in {time.perf_counter() - start:.1f}s")
+
+    def _write_manifest(self):
+        manifest = {
+            "segments": [segment.path.name for segment in self.segments if isinstance(segment, DiskSegment)],
+            "next_seq": self.memory.seq,
+            "categories": self.categories,
+            "tombstones": {id_bytes.hex(): seq for id_bytes, seq in self.tombstones.items()},
+            "indexed_until": self.indexed_until.isoformat() if self.indexed_until else None,
+            "deleted_until": self.deleted_until.isoformat() if self.deleted_until else None,
+        }
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(manifest))
+        os.replace(tmp_path, self.manifest_path)
+
+    def _remove_orphans(self, live: List[str]):
+        for path in self.dir.glob("seg-*"):
+            if path.name not in live:
+                path.unlink(missing_ok=True)
+
+    async def catch_up(self, snapcasts: Any) -> int:
+        """Index SnapCasts changed since the last flushed update (everything on a fresh index)"""
+        since = max(filter(None, [self.indexed_until, self.memory.max_updated_at]), default=None)
+        # Deletes made by other processes, which polling would otherwise never see
+        self._apply_deletes(await self._fetch_deletions(self.deleted_until))
+        count = 0
+        async for doc in snapcasts.find({"updated_at": {"$gte": since}} if since else {}):
+            self.upsert(doc)
+            count += 1
+            if count % 1000 == 0:
+                await self.maintain()
+        await self.maintain()
+        return count
+
+    async def follow(self, snapcasts: Any):
+        """Apply creates, updates and deletes as they happen, via a change stream or polling"""
+        try:
+            async with snapcasts.watch(full_document="updateLookup") as stream:
+                async for change in stream:
+                    if change["operationType"] == "delete":
+                        self.delete(change["documentKey"]["_id"])
+                    elif change.get("fullDocument"):
+                        self.upsert(change["fullDocument"])
+                    await self.maintain()
+        except OperationFailure as e:
+            # Standalone servers have no change streams; deletes then come from the deletions collection
+            logger.warning(f"SnapCast change stream unavailable, polling updated_at every {self.poll_interval}s: {e}")
+            while True:
+                await asyncio.sleep(self.poll_interval)
+                await self.catch_up(snapcasts)
+
+    async def start(self, snapcasts: Any, deletions: Any = None):
+        self.snapcasts = snapcasts
+        self.deletions = deletions
+        self.open()
+        indexed = await self.catch_up(snapcasts)
+        logger.info(f"Search index caught up with {indexed} changed SnapCasts")
+        self._maintenance = asyncio.create_task(self.follow(snapcasts))
+
+    async def close(self):
+        if self._maintenance:
+            self._maintenance.cancel()
+            try:
+                await self._maintenance
+            except asyncio.CancelledError:
+                pass
+        await self.maintain(force=True)
+        for segment in self.segments:
+            if isinstance(segment, DiskSegment):
+                segment.close()
+        if self._lock_file:
+            self._lock_file.close()
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "documents": self.num_docs, "segments": len(self.segments), "memory_documents": self.memory.live_docs, "tombstones": len(self.tombstones), "writer": self.writer}
@@ -0,0 +1,55 @@
+import re
+import logging
+from typing import List
+
+import nltk
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_punkt_available = True
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences with NLTK punkt, falling back to punctuation"""
+    global _punkt_available
+    sentences = None
+    if _punkt_available:
+        try:
+            sentences = nltk.sent_tokenize(text)
+        except LookupError:
+            _punkt_available = False
+            logger.warning("NLTK punkt data not found, splitting sentences on punctuation")
+    if sentences is None:
+        sentences = _SENTENCE_END.split(text)
+    return [sentence.strip() for sentence in sentences if sentence.strip()]
+
+def split_into_chunks(text: str, min_chars: int = 80, max_chars: int = 600) -> List[str]:
+    """Group sentences into synthesis chunks.
+
+    Short sentences are merged until a chunk reaches ``min_chars`` so we do
+    not pay a provider round trip per "Yes." The first chunk is kept to a
+    single sentence so the first audio segment is ready as early as possible.
+    Sentences longer than ``max_chars`` are split on word boundaries.
+    """
+    chunks: List[str] = []
+    current = ""
+    for sentence in split_sentences(text):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        current = f"{current} {sentence}".strip() if current else sentence
+        if not chunks or len(current) >= min_chars:
+            chunks.append(current)
+            current = ""
+    if current:
+        # Never fold the tail into the single-sentence first chunk
+        if len(chunks) > 1 and len(chunks[-1]) + len(current) < max_chars:
+            chunks[-1] = f"{chunks[-1]} {current}"
+        else:
+            chunks.append(current)
+    return chunks
@@ -1,14 +1,31 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Annotated, List, Literal, Optional
 import uuid
 from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from jose import JWTError, jwt
+from pymongo import DESCENDING, IndexModel
+
+from auth import AuthCache
+from cache import create_redis_breaker, create_redis_client
+from database import ensure_indexes, mongo_client_options, slow_queries
+from engagement import EngagementCounters
+from feed import FeedEngine, serialize_snapcast
+from loaders import UserLoader, UserProfileCache
+from models import Category, FeedPage, FeedQuery, SnapCast, SnapCastCreate, SuccessResponse
+from search import SearchIndex
+from streaming import stream_list
+from timeline import TimelineService
 
 
 ROOT_DIR = Path(__file__).parent
@@ -16,9 +33,22 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, **mongo_client_options())
 db = client[os.environ['DB_NAME']]
 
+redis_client = create_redis_client()
+search_index = SearchIndex()
+feed_engine = FeedEngine(redis_client, db.snapcasts, breaker=create_redis_breaker(), search=search_index)
+timelines = TimelineService(redis_client, db, breaker=feed_engine.breaker)
+user_profiles = UserProfileCache()
+engagement = EngagementCounters(redis_client, db, feed=feed_engine, timelines=timelines, breaker=feed_engine.breaker)
+
+# Same HS256 tokens as main.py; here "sub" is the user's Mongo id
+SECRET_KEY = os.getenv("SECRET_KEY", "a_very_secret_key_that_should_be_in_env")
+ALGORITHM = "HS256"
+security = HTTPBearer()
+auth_cache = AuthCache()
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -35,6 +65,29 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+STATUS_CHECK_INDEXES = [IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)])]
+
+def get_user_loader() -> UserLoader:
+    """One loader per request, so user lookups batch and memoize within it"""
+    return UserLoader(db.users, user_profiles)
+
+async def get_current_user_id(token: Annotated[HTTPAuthorizationCredentials, Depends(security)]) -> str:
+    user_id = auth_cache.get_user_id(token.credentials)
+    if user_id is None:
+        try:
+            payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id = str(ObjectId(payload["sub"]))
+        except (JWTError, KeyError, TypeError, InvalidId):
+            raise HTTPException(status_code=401, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
+        auth_cache.set_user_id(token.credentials, user_id, payload.get("exp"))
+    return user_id
+
+def object_id(value: str) -> ObjectId:
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail=f"Invalid id {value!r}")
+
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
 async def root():
@@ -47,10 +100,93 @@ async def create_status_check(input: StatusCheckCreate):
     _ = await db.status_checks.insert_one(status_obj.dict())
     return status_obj
 
-@api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+@api_router.get("/status")
+async def get_status_checks(limit: Annotated[int, Query(ge=1, le=1000)] = 100, cursor: Optional[str] = None, format: Literal["json", "ndjson"] = "json"):
+    """Status checks, newest first, streamed as {"items", "next_cursor"} or NDJSON"""
+    try:
+        return stream_list(db.status_checks, projection={"id": 1, "client_name": 1, "timestamp": 1}, sort_field="timestamp", limit=limit, cursor=cursor, fmt=format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/feed", response_model=FeedPage)
+async def get_feed(loader: Annotated[UserLoader, Depends(get_user_loader)], category: Optional[Category] = None, search: Optional[str] = None, tags: Annotated[Optional[List[str]], Query()] = None, sort_by: str = "trending", limit: Annotated[int, Query(ge=1, le=100)] = 20, cursor: Optional[str] = None):
+    """Keyset-paginated feed; pass next_cursor back as cursor for the next page"""
+    query = FeedQuery(category=category, search=search, tags=tags, sort_by=sort_by, limit=limit, cursor=cursor)
+    try:
+        items, next_cursor = await feed_engine.page(query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await asyncio.gather(engagement.apply_pending("snapcasts", items), loader.hydrate(items))
+    return FeedPage(items=items, next_cursor=next_cursor)
+
+@api_router.post("/snapcasts", status_code=201)
+async def create_snapcast(data: SnapCastCreate, user_id: Annotated[str, Depends(get_current_user_id)]):
+    doc = SnapCast(**data.model_dump(), user_id=user_id).model_dump(by_alias=True)
+    await db.snapcasts.insert_one(doc)
+    # The search index picks the insert up from the change stream
+    await asyncio.gather(feed_engine.index_snapcast(doc), timelines.publish(doc))
+    return serialize_snapcast(doc)
+
+@api_router.delete("/snapcasts/{snapcast_id}", response_model=SuccessResponse)
+async def delete_snapcast(snapcast_id: str, user_id: Annotated[str, Depends(get_current_user_id)]):
+    doc = await db.snapcasts.find_one_and_delete({"_id": object_id(snapcast_id), "user_id": ObjectId(user_id)}, {"category": 1})
+    if doc is None:
+        raise HTTPException(status_code=404, detail="SnapCast not found")
+    # Recorded for search indexes in processes that poll instead of following the change stream
+    await db.snapcast_deletions.insert_one({"_id": doc["_id"], "deleted_at": datetime.utcnow()})
+    search_index.delete(doc["_id"])
+    await feed_engine.remove(snapcast_id, doc["category"])
+    return SuccessResponse(message="SnapCast deleted")
+
+async def require_snapcast(snapcast_id: str) -> dict:
+    doc = await db.snapcasts.find_one({"_id": object_id(snapcast_id)}, {"category": 1})
+    if doc is None:
+        raise HTTPException(status_code=404, detail="SnapCast not found")
+    return doc
+
+@api_router.post("/snapcasts/{snapcast_id}/like", response_model=SuccessResponse)
+async def like_snapcast(snapcast_id: str, user_id: Annotated[str, Depends(get_current_user_id)]):
+    doc = await require_snapcast(snapcast_id)
+    liked = await engagement.like(user_id, doc["_id"], doc["category"])
+    return SuccessResponse(message="Liked" if liked else "Already liked")
+
+@api_router.delete("/snapcasts/{snapcast_id}/like", response_model=SuccessResponse)
+async def unlike_snapcast(snapcast_id: str, user_id: Annotated[str, Depends(get_current_user_id)]):
+    unliked = await engagement.unlike(user_id, object_id(snapcast_id))
+    return SuccessResponse(message="Unliked" if unliked else "Not liked")
+
+@api_router.post("/snapcasts/{snapcast_id}/share", response_model=SuccessResponse)
+async def share_snapcast(snapcast_id: str, user_id: Annotated[str, Depends(get_current_user_id)]):
+    doc = await require_snapcast(snapcast_id)
+    await engagement.increment("snapcasts", doc["_id"], "shares")
+    return SuccessResponse(message="Shared")
+
+@api_router.post("/users/{following_id}/follow", response_model=SuccessResponse)
+async def follow_user(following_id: str, user_id: Annotated[str, Depends(get_current_user_id)]):
+    if await db.users.find_one({"_id": object_id(following_id)}, {"_id": 1}) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        followed = await engagement.follow(user_id, following_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return SuccessResponse(message="Followed" if followed else "Already following")
+
+@api_router.delete("/users/{following_id}/follow", response_model=SuccessResponse)
+async def unfollow_user(following_id: str, user_id: Annotated[str, Depends(get_current_user_id)]):
+    unfollowed = await engagement.unfollow(user_id, object_id(following_id))
+    return SuccessResponse(message="Unfollowed" if unfollowed else "Not following")
+
+@api_router.get("/users/{user_id}/timeline", response_model=FeedPage)
+async def get_home_timeline(user_id: str, current_user_id: Annotated[str, Depends(get_current_user_id)], loader: Annotated[UserLoader, Depends(get_user_loader)], limit: Annotated[int, Query(ge=1, le=100)] = 20, cursor: Optional[str] = None):
+    """Home timeline of SnapCasts from followed users, newest first; only readable by its owner"""
+    if user_id != current_user_id:
+        raise HTTPException(status_code=403, detail="Cannot read another user's timeline")
+    try:
+        items, next_cursor = await timelines.page(user_id, limit, cursor)
+    except (ValueError, InvalidId) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await asyncio.gather(engagement.apply_pending("snapcasts", items), loader.hydrate(items))
+    return FeedPage(items=items, next_cursor=next_cursor)
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -70,6 +206,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def build_feed_index():
+    await ensure_indexes(db)
+    await ensure_indexes(db, {"status_checks": STATUS_CHECK_INDEXES})
+    slow_queries.start(client)
+    await feed_engine.ensure_index()
+    await search_index.start(db.snapcasts, db.snapcast_deletions)
+    await engagement.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await engagement.stop()
+    await search_index.close()
+    await slow_queries.stop()
     client.close()
+    await redis_client.aclose()
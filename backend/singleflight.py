@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from breaker import CircuitBreaker
+from cache import UNAVAILABLE, call_redis, create_redis_breaker
+
+logger = logging.getLogger(__name__)
+
+# Only the holder of the lease may release it
+RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Only the holder of the lease may extend it
+RENEW_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+class SingleFlight:
+    """Coalesce identical in-flight work inside a worker and across workers.
+
+    Callers in the same process share one asyncio future per key. Across
+    uvicorn workers a short-lived Redis lease elects a single leader; the
+    other workers poll ``lookup`` until the leader has published a result.
+    The leader renews its lease every third of lease_seconds while it
+    computes, so a slow generation does not let a second leader start.
+    If Redis is unreachable, coalescing falls back to the local worker only.
+    """
+
+    def __init__(self, redis_client, lease_seconds: int = 30, poll_interval: float = 0.1, prefix: str = "lease:", breaker: Optional[CircuitBreaker] = None):
+        self.redis = redis_client
+        self.breaker = breaker or create_redis_breaker()
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.prefix = prefix
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[str, int] = {}
+        self.stats = {"leaders": 0, "local_waiters": 0, "remote_followers": 0, "max_waiters_per_leader": 0}
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[Any]], lookup: Callable[[], Awaitable[Optional[Any]]]) -> Tuple[Any, bool]:
+        """Return (result, is_leader). Only the leader actually ran ``compute``"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self._waiters[key] += 1
+            self.stats["local_waiters"] += 1
+            try:
+                return await asyncio.shield(future), False
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The local leader was cancelled (client went away); try again
+                return await self.run(key, compute, lookup)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self._waiters[key] = 0
+        is_leader = False
+        try:
+            result, is_leader = await self._lead_or_follow(key, compute, lookup)
+            future.set_result(result)
+            return result, is_leader
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody was waiting
+            raise
+        finally:
+            waiters = self._waiters.pop(key, 0)
+            del self._inflight[key]
+            if is_leader:
+                self.stats["leaders"] += 1
+                self.stats["max_waiters_per_leader"] = max(self.stats["max_waiters_per_leader"], waiters)
+                if waiters:
+                    logger.info(f"Leader for {key} served {waiters} coalesced waiters")
+
+    async def _lead_or_follow(self, key: str, compute: Callable[[], Awaitable[Any]], lookup: Callable[[], Awaitable[Optional[Any]]]) -> Tuple[Any, bool]:
+        lease_key = f"{self.prefix}{key}"
+        token = uuid.uuid4().hex
+        followed = False
+        while True:
+            acquired = await call_redis(self.breaker, lambda: self.redis.set(lease_key, token, nx=True, ex=self.lease_seconds))
+            if acquired is UNAVAILABLE:
+                return await compute(), True
+            if acquired:
+                heartbeat = asyncio.create_task(self._renew(lease_key, token))
+                try:
+                    return await compute(), True
+                finally:
+                    heartbeat.cancel()
+                    await call_redis(self.breaker, lambda: self.redis.eval(RELEASE_LEASE_SCRIPT, 1, lease_key, token))
+
+            # Another worker holds the lease: wait for its result to land
+            if not followed:
+                followed = True
+                self.stats["remote_followers"] += 1
+            while await call_redis(self.breaker, lambda: self.redis.exists(lease_key)) not in (0, UNAVAILABLE):
+                result = await lookup()
+                if result is not None:
+                    return result, False
+                await asyncio.sleep(self.poll_interval)
+            result = await lookup()
+            if result is not None:
+                return result, False
+            # The leader released or lost its lease without publishing; compete again
+
+    async def _renew(self, lease_key: str, token: str):
+        """Extend the lease until cancelled; stops if another worker has taken it over"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            renewed = await call_redis(self.breaker, lambda: self.redis.eval(RENEW_LEASE_SCRIPT, 1, lease_key, token, int(self.lease_seconds * 1000)))
+            if renewed == 0:
+                logger.warning(f"Lost the {lease_key} lease while computing; another worker may compute it too")
+                return
@@ -0,0 +1,122 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from config import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Commands explain() accepts, mapped to the field naming their collection
+EXPLAINABLE = {"find": "find", "aggregate": "aggregate", "count": "count", "distinct": "distinct", "update": "update", "delete": "delete", "findAndModify": "findAndModify"}
+# Session and routing fields the server rejects inside an explain
+COMMAND_ONLY_FIELDS = ("lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "signature", "$readConcern")
+
+def plan_stages(plan: Dict) -> List[str]:
+    """Stage names of the winning plan, outermost first, e.g. ['FETCH', 'IXSCAN']"""
+    winning = plan.get("queryPlanner", {}).get("winningPlan", {})
+    stage = winning.get("queryPlan", winning)
+    stages = []
+    while stage:
+        stages.append(stage.get("stage", "?") + (f" {stage['indexName']}" if "indexName" in stage else ""))
+        stage = stage.get("inputStage") or (stage.get("inputStages") or [None])[0]
+    return stages
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Records Mongo commands slower than slow_query_ms along with their explain() plan.
+
+    pymongo calls the listener on whatever thread ran the command; slow
+    commands are handed to the event loop, which runs the explain (at most
+    once per query shape every explain_interval seconds), logs it and keeps
+    the most recent ones for get_stats().
+    """
+
+    def __init__(self, threshold_ms: Optional[float] = None, explain_interval: Optional[float] = None, max_recent: Optional[int] = None):
+        self.threshold_micros = (threshold_ms if threshold_ms is not None else get_setting("mongo.slow_query_ms", 100)) * 1000
+        self.explain_interval = explain_interval if explain_interval is not None else get_setting("mongo.explain_interval", 60)
+        self.recent: Deque[Dict] = deque(maxlen=max_recent or get_setting("mongo.slow_query_history", 100))
+        self._started: Dict[Tuple[Any, int], Tuple[str, Dict]] = {}
+        self._explained: Dict[Tuple, float] = {}
+        self._client: Any = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"slow_queries": 0, "explains": 0, "explain_errors": 0, "dropped": 0}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if self.threshold_micros > 0 and event.command_name in EXPLAINABLE:
+            self._started[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        started = self._started.pop((event.connection_id, event.request_id), None)
+        if started is None or event.duration_micros < self.threshold_micros:
+            return
+        self.stats["slow_queries"] += 1
+        if self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._enqueue, started[0], event.command_name, started[1], event.duration_micros / 1000)
+        except RuntimeError:
+            # Loop already closed during shutdown
+            self.stats["dropped"] += 1
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._started.pop((event.connection_id, event.request_id), None)
+
+    def _enqueue(self, *item):
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+
+    @staticmethod
+    def shape(database: str, name: str, command: Dict) -> Tuple:
+        """Commands differing only in values share a shape and an explain"""
+        query = command.get("filter") or command.get("query") or {}
+        return (database, name, command.get(EXPLAINABLE[name]), tuple(sorted(query)) if isinstance(query, dict) else (), str(command.get("pipeline", ""))[:200] if name == "aggregate" else "")
+
+    async def _run(self):
+        while True:
+            database, name, command, duration_ms = await self._queue.get()
+            entry = {"database": database, "command": name, "collection": command.get(EXPLAINABLE[name]), "duration_ms": round(duration_ms, 1), "at": time.time(), "plan": None}
+            shape = self.shape(database, name, command)
+            if len(self._explained) > 10000:
+                self._explained.clear()
+            note = "same shape explained recently"
+            if time.monotonic() - self._explained.get(shape, float("-inf")) >= self.explain_interval:
+                self._explained[shape] = time.monotonic()
+                explain = {key: value for key, value in command.items() if key not in COMMAND_ONLY_FIELDS}
+                try:
+                    plan = await self._client[database].command({"explain": explain, "verbosity": "queryPlanner"})
+                    entry["plan"] = plan_stages(plan)
+                    self.stats["explains"] += 1
+                except Exception as e:
+                    note = "explain failed"
+                    self.stats["explain_errors"] += 1
+                    logger.debug(f"explain failed for slow {name}: {e}")
+            self.recent.append(entry)
+            plan = " <- ".join(entry["plan"]) if entry["plan"] else note
+            logger.warning(f"Slow Mongo {name} on {database}.{entry['collection']} took {duration_ms:.0f} ms: {plan}")
+
+    def start(self, client: Any):
+        """Begin explaining slow commands with client on the running loop"""
+        self._client = client
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=1000)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._loop = None
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "recent": list(self.recent)}
@@ -0,0 +1,104 @@
+import json
+import base64
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from bson import ObjectId
+from fastapi.responses import StreamingResponse
+
+from config import get_setting
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson"}
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def dumps(value: Any) -> str:
+    return json.dumps(value, default=json_default, separators=(",", ":"))
+
+def encode_keyset(value: Any, doc_id: Any) -> str:
+    """Opaque cursor for the position after a document sorted by (value, _id)"""
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    doc_id = {"$oid": str(doc_id)} if isinstance(doc_id, ObjectId) else doc_id
+    return base64.urlsafe_b64encode(dumps([value, doc_id]).encode()).decode().rstrip("=")
+
+def decode_keyset(cursor: str) -> Tuple[Any, Any]:
+    """Inverse of encode_keyset; raises ValueError for anything it did not produce"""
+    try:
+        value, doc_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value["$date"])
+        if isinstance(doc_id, dict):
+            doc_id = ObjectId(doc_id["$oid"])
+    except Exception as e:
+        raise ValueError(f"Malformed cursor: {e}")
+    return value, doc_id
+
+def keyset_filter(query: Dict, sort_field: str, cursor: Optional[str]) -> Dict:
+    """query restricted to documents after the cursor in (sort_field, _id) descending order"""
+    if not cursor:
+        return query
+    value, doc_id = decode_keyset(cursor)
+    if sort_field == "_id":
+        after = {"_id": {"$lt": doc_id}}
+    else:
+        after = {"$or": [{sort_field: {"$lt": value}}, {sort_field: value, "_id": {"$lt": doc_id}}]}
+    return {"$and": [query, after]} if query else after
+
+def without_id(doc: Dict) -> Dict:
+    return {key: value for key, value in doc.items() if key != "_id"}
+
+async def iter_list(collection: Any, query: Dict, projection: Optional[Dict], sort_field: str, limit: int, cursor: Optional[str], serialize: Callable[[Dict], Dict], fmt: str, batch_size: int) -> AsyncIterator[str]:
+    find = collection.find(keyset_filter(query, sort_field, cursor), projection).sort([(sort_field, -1), ("_id", -1)]).limit(limit + 1).batch_size(batch_size)
+    chunk = []
+    count = 0
+    last: Optional[Tuple[Any, Any]] = None
+    next_cursor = None
+    if fmt == "json":
+        yield '{"items":['
+    async for doc in find:
+        if count == limit:
+            next_cursor = encode_keyset(*last)
+            break
+        last = (doc.get(sort_field), doc["_id"])
+        line = dumps(serialize(doc))
+        chunk.append(line if fmt == "ndjson" or count == 0 else "," + line)
+        count += 1
+        if len(chunk) >= batch_size:
+            yield ("\n".join(chunk) + "\n") if fmt == "ndjson" else "".join(chunk)
+            chunk = []
+    if chunk:
+        yield ("\n".join(chunk) + "\n") if fmt == "ndjson" else "".join(chunk)
+    if fmt == "json":
+        yield f'],"next_cursor":{dumps(next_cursor)}}}'
+    elif next_cursor:
+        yield dumps({"next_cursor": next_cursor}) + "\n"
+
+def stream_list(collection: Any, query: Optional[Dict] = None, projection: Optional[Dict] = None, sort_field: str = "_id", limit: int = 100, cursor: Optional[str] = None, serialize: Callable[[Dict], Dict] = without_id, fmt: str = "json", batch_size: Optional[int] = None) -> StreamingResponse:
+    """Stream one keyset page of a collection, newest first, without materializing it.
+
+    The Motor cursor is read batch_size documents at a time and each batch
+    is serialized and sent before the next is fetched, so memory per
+    request is bounded by the batch, not the page. fmt "json" sends
+    {"items": [...], "next_cursor": ...}; "ndjson" sends one item per line
+    and, when there is a next page, a final {"next_cursor": ...} line.
+    Raises ValueError for a bad cursor or format before anything is sent.
+    """
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"format must be one of {list(MEDIA_TYPES)}")
+    if projection is not None and any(projection.values()):
+        # The keyset needs the sort key of the last document
+        projection = {**projection, sort_field: 1, "_id": 1}
+    if cursor:
+        # Fail before the response starts rather than mid-stream
+        decode_keyset(cursor)
+    batch_size = batch_size or get_setting("streaming.batch_size", 100)
+    return StreamingResponse(iter_list(collection, query or {}, projection, sort_field, limit, cursor, serialize, fmt, batch_size), media_type=MEDIA_TYPES[fmt])
@@ -0,0 +1,16 @@
+import os
+
+import pytest
+
+from blobstore import BlobStore
+
+
+def test_opened_blob_stays_readable_after_eviction(tmp_path):
+    store = BlobStore(root=str(tmp_path))
+    digest = store.put(b"audio bytes")
+    blob, size = store.open(digest)
+    os.unlink(store.path(digest))
+    with blob:
+        assert (size, blob.read()) == (11, b"audio bytes")
+    with pytest.raises(FileNotFoundError):
+        store.open(digest)
@@ -0,0 +1,21 @@
+from sqlalchemy import create_engine, inspect, insert, text
+
+from database import TTSRequest, create_sql_schema
+
+
+def test_unique_script_hash_index_is_rebuilt_as_non_unique(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'eona.db'}")
+    TTSRequest.__table__.create(engine)
+    # The schema of databases created while script_hash was unique, like the shipped data/eona.db
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_tts_requests_script_hash"))
+        connection.execute(text("CREATE UNIQUE INDEX ix_tts_requests_script_hash ON tts_requests (script_hash)"))
+
+    create_sql_schema(engine)
+    create_sql_schema(engine)
+
+    indexes = {index["name"]: index for index in inspect(engine).get_indexes("tts_requests")}
+    assert not indexes["ix_tts_requests_script_hash"]["unique"]
+    with engine.begin() as connection:
+        connection.execute(insert(TTSRequest.__table__), [{"script_hash": "same"}, {"script_hash": "same"}])
+        assert connection.execute(text("SELECT COUNT(*) FROM tts_requests")).scalar() == 2
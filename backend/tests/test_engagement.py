@@ -0,0 +1,97 @@
+import math
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+import engagement
+from engagement import EngagementCounters
+from feed import FeedEngine
+
+DAY = 86400
+
+
+class FakeLikes:
+    """The Like collection calls EngagementCounters makes, with the unique (user_id, snapcast_id) index"""
+
+    def __init__(self):
+        self.docs = {}
+
+    async def insert_one(self, doc):
+        key = (doc["user_id"], doc["snapcast_id"])
+        if key in self.docs:
+            raise DuplicateKeyError("duplicate like")
+        doc["_id"] = ObjectId()
+        self.docs[key] = doc
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    async def find_one_and_delete(self, query, projection=None):
+        return self.docs.pop((query["user_id"], query["snapcast_id"]), None)
+
+    async def update_one(self, query, update):
+        for doc in self.docs.values():
+            if doc["_id"] == query["_id"]:
+                for field in update["$unset"]:
+                    doc.pop(field, None)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1700000000 + 10 * DAY)
+    monkeypatch.setattr(engagement.time, "time", lambda: now.value)
+    return now
+
+
+def run(scenario):
+    async def main():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        feed = FeedEngine(redis, None)
+        counters = EngagementCounters(redis, SimpleNamespace(likes=FakeLikes()), feed=feed, breaker=feed.breaker)
+        snapcast_id = ObjectId()
+        await feed.index_snapcast({"_id": snapcast_id, "category": "Tech", "created_at": datetime.fromtimestamp(1700000000 + 10 * DAY)})
+        return await scenario(redis, feed, counters, snapcast_id)
+    return asyncio.run(main())
+
+
+def test_unlike_takes_back_exactly_what_the_like_added(clock):
+    async def scenario(redis, feed, counters, snapcast_id):
+        before = await redis.zscore(feed.key("Tech"), str(snapcast_id))
+        await counters.like(ObjectId(), snapcast_id, "Tech")
+        user_id = ObjectId()
+        await counters.like(user_id, snapcast_id, "Tech")
+        liked = await redis.zscore(feed.key("Tech"), str(snapcast_id))
+        # Weights grow with time; undoing at "now" would remove far more than the like added
+        clock.value += 30 * DAY
+        await counters.unlike(user_id, snapcast_id)
+        await counters.unlike(user_id, snapcast_id)
+        return before, liked, await redis.zscore(feed.key("Tech"), str(snapcast_id)), await redis.zscore(feed.key(), str(snapcast_id))
+
+    before, liked, category_score, all_score = run(scenario)
+    assert liked > before
+    expected = before + math.log(1 + 1.0 / 2.0)
+    assert category_score == pytest.approx(expected)
+    assert all_score == pytest.approx(expected)
+
+
+def test_unlike_of_an_unscored_like_leaves_the_score_alone(clock, monkeypatch):
+    async def scenario(redis, feed, counters, snapcast_id):
+        user_id = ObjectId()
+        record = feed.record
+
+        async def unavailable(*args, **kwargs):
+            return False
+
+        # The like could not reach the trending index, e.g. Redis was down
+        monkeypatch.setattr(feed, "record", unavailable)
+        await counters.like(user_id, snapcast_id, "Tech")
+        monkeypatch.setattr(feed, "record", record)
+        before = await redis.zscore(feed.key("Tech"), str(snapcast_id))
+        await counters.unlike(user_id, snapcast_id)
+        return before, await redis.zscore(feed.key("Tech"), str(snapcast_id))
+
+    before, after = run(scenario)
+    assert after == before
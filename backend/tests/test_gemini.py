@@ -0,0 +1,43 @@
+import asyncio
+from types import SimpleNamespace
+
+from google.api_core import exceptions as google_exceptions
+
+from gemini import GeminiGateway
+
+
+class FakeModel:
+    def __init__(self, name, retired):
+        self.name = name
+        self.retired = retired
+
+    async def generate_content_async(self, prompt):
+        await asyncio.sleep(0.01)
+        if self.name in self.retired:
+            raise google_exceptions.NotFound(f"{self.name} is gone")
+        return SimpleNamespace(text=f" {self.name} ")
+
+
+def gateway(model_names, retired):
+    gateway = GeminiGateway()
+    gateway.model_names = list(model_names)
+    gateway.get_model = lambda name=None: FakeModel(name or gateway.model_names[0], retired)
+    return gateway
+
+
+def test_concurrent_not_found_retires_only_the_failed_model():
+    async def scenario():
+        gemini = gateway(["old", "next", "last"], {"old"})
+        replies = await asyncio.gather(*(gemini.generate("hi") for _ in range(4)))
+        return replies, gemini.model_names
+
+    assert asyncio.run(scenario()) == (["next"] * 4, ["next", "last"])
+
+
+def test_last_model_is_kept_when_it_is_not_found():
+    async def scenario():
+        gemini = gateway(["only"], {"only"})
+        results = await asyncio.gather(gemini.generate("hi"), gemini.generate("hi"), return_exceptions=True)
+        return [type(result) for result in results], gemini.model_names
+
+    assert asyncio.run(scenario()) == ([google_exceptions.NotFound] * 2, ["only"])
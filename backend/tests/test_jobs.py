@@ -0,0 +1,51 @@
+import asyncio
+
+import fakeredis
+
+from jobs import JobQueue
+
+
+def run(coroutine_function):
+    return asyncio.run(coroutine_function(fakeredis.FakeAsyncRedis(decode_responses=True)))
+
+
+def test_job_claimed_before_its_lease_is_written_is_not_requeued():
+    async def scenario(redis):
+        queue = JobQueue(redis, prefix="t", claim_grace=60)
+        await queue.enqueue(1, {"script": "hi"})
+        # The state between claim()'s BLMOVE and its heartbeat
+        await redis.blmove(queue.pending_key, queue.processing_key, 1, "RIGHT", "LEFT")
+        requeued = await queue.requeue_orphans()
+        await queue.heartbeat(1)
+        requeued += await queue.requeue_orphans()
+        return requeued, await queue.depth()
+
+    assert run(scenario) == (0, {"pending": 0, "processing": 1})
+
+
+def test_orphan_is_requeued_once_after_the_grace_period():
+    async def scenario(redis):
+        queue = JobQueue(redis, prefix="t", claim_grace=0)
+        await queue.enqueue(1, {"script": "hi"})
+        raw, job = await queue.claim(1)
+        await redis.delete("t:lease:1")
+        first_pass = await queue.requeue_orphans()
+        # Concurrent reapers from several workers
+        later_passes = await asyncio.gather(*(queue.requeue_orphans() for _ in range(3)))
+        return first_pass, sum(later_passes), await queue.depth(), await redis.exists(queue.unleased_key)
+
+    assert run(scenario) == (0, 1, {"pending": 1, "processing": 0}, 0)
+
+
+def test_acked_job_is_forgotten_by_the_reaper():
+    async def scenario(redis):
+        queue = JobQueue(redis, prefix="t", claim_grace=60)
+        await queue.enqueue(1, {"script": "hi"})
+        raw, job = await queue.claim(1)
+        await redis.delete("t:lease:1")
+        await queue.requeue_orphans()
+        await queue.ack(raw, job["job_id"])
+        await queue.requeue_orphans()
+        return await queue.depth(), await redis.exists(queue.unleased_key)
+
+    assert run(scenario) == ({"pending": 0, "processing": 0}, 0)
@@ -0,0 +1,19 @@
+import pytest
+
+from metrics import Counter, Metric, Registry
+
+
+def test_metric_without_samples_cannot_be_created():
+    class Untyped(Metric):
+        pass
+
+    with pytest.raises(TypeError):
+        Untyped("eona_untyped", "No samples", registry=Registry())
+
+
+def test_registry_renders_counters_in_text_format():
+    registry = Registry()
+    counter = Counter("eona_test_total", "Test counter", ("result",), registry=registry)
+    counter.inc(result="hit")
+    counter.inc(2, result="miss")
+    assert registry.render().splitlines()[:4] == ["# HELP eona_test_total Test counter", "# TYPE eona_test_total counter", 'eona_test_total{result="hit"} 1', 'eona_test_total{result="miss"} 2']
@@ -0,0 +1,54 @@
+import asyncio
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import sessionmaker
+
+from database import TTSRequest
+from persistence import WriteBehindWriter
+
+
+def legacy_session_factory(tmp_path):
+    """A database whose script_hash index is still UNIQUE, like the shipped data/eona.db"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'eona.db'}")
+    TTSRequest.__table__.create(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_tts_requests_script_hash"))
+        connection.execute(text("CREATE UNIQUE INDEX ix_tts_requests_script_hash ON tts_requests (script_hash)"))
+    return sessionmaker(bind=engine)
+
+
+async def write(writer, rows):
+    writer.start()
+    for row in rows:
+        await writer.put(row)
+    await writer.stop()
+
+
+def test_failed_batch_only_drops_the_bad_row(tmp_path):
+    session_factory = legacy_session_factory(tmp_path)
+    writer = WriteBehindWriter(session_factory, TTSRequest, batch_size=10, flush_interval=0.05, max_retries=3)
+    rows = [{"user_id": "u1", "script_hash": "a"}, {"user_id": "u2", "script_hash": "a"}, {"user_id": "u3", "script_hash": "b"}]
+
+    asyncio.run(write(writer, rows))
+
+    assert (writer.stats["written"], writer.stats["dropped"]) == (2, 1)
+    # Constraint violations are not retried as a batch
+    assert writer.stats["failed_flushes"] == 1
+    with session_factory() as db:
+        assert sorted(db.scalars(select(TTSRequest.user_id))) == ["u1", "u3"]
+
+
+def test_transient_failures_are_retried_as_a_batch(tmp_path):
+    session_factory = legacy_session_factory(tmp_path)
+    failures = [RuntimeError("database is locked")]
+
+    def flaky_session_factory():
+        if failures:
+            raise failures.pop()
+        return session_factory()
+
+    writer = WriteBehindWriter(flaky_session_factory, TTSRequest, batch_size=10, flush_interval=0.05, max_retries=3)
+
+    asyncio.run(write(writer, [{"script_hash": "a"}, {"script_hash": "b"}]))
+
+    assert writer.stats == {**writer.stats, "written": 2, "dropped": 0, "batches": 1, "failed_flushes": 1}
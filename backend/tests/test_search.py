@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from search import SearchIndex
+
+START = datetime(2026, 1, 1)
+
+
+class FakeCollection:
+    """find() over a list of documents, with only the {field: {"$gte": value}} filters the index uses"""
+
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+
+    async def find(self, query=None):
+        for doc in list(self.docs):
+            if all(doc.get(field) is not None and doc[field] >= condition["$gte"] for field, condition in (query or {}).items()):
+                yield doc
+
+    def watch(self, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets")
+
+
+def snapcast(title, minutes):
+    return {"_id": ObjectId(), "title": title, "content": "a short voice note", "category": "Tech", "tags": [], "is_public": True, "updated_at": START + timedelta(minutes=minutes)}
+
+
+@pytest.fixture
+def mongo():
+    return FakeCollection([snapcast("alpha", 1), snapcast("bravo", 2)]), FakeCollection()
+
+
+async def check_owner(index):
+    """maintain() on a read-only index, without waiting out the poll interval"""
+    index._owner_checked = float("-inf")
+    await index.maintain()
+
+
+def titles(index, text):
+    return [doc_id for doc_id, _ in index.search(text, limit=50)]
+
+
+def start(index_dir, mongo):
+    async def run():
+        index = SearchIndex(str(index_dir))
+        await index.start(*mongo)
+        return index
+    return run()
+
+
+def test_reader_keeps_only_unflushed_documents_in_memory(tmp_path, mongo):
+    snapcasts, deletions = mongo
+
+    async def scenario():
+        owner = await start(tmp_path, mongo)
+        reader = await start(tmp_path, mongo)
+        new = snapcast("charlie", 3)
+        snapcasts.docs.append(new)
+        for index in (owner, reader):
+            index.upsert(new)
+        await owner.maintain(force=True)
+        assert reader.memory.num_docs == 3
+        await check_owner(reader)
+        result = (reader.stats["reloads"], reader.memory.live_docs, sorted(titles(reader, "voice")))
+        await reader.close()
+        await owner.close()
+        return result, sorted(str(doc["_id"]) for doc in snapcasts.docs)
+
+    (reloads, memory_docs, found), expected = asyncio.run(scenario())
+    assert reloads == 1
+    # Only the newest document is at or after the flushed updated_at
+    assert memory_docs == 1
+    assert found == expected
+
+
+def test_poll_mode_deletes_reach_every_process(tmp_path, mongo):
+    snapcasts, deletions = mongo
+
+    async def scenario():
+        owner = await start(tmp_path, mongo)
+        reader = await start(tmp_path, mongo)
+        await owner.maintain(force=True)
+        await check_owner(reader)
+        # DELETE /api/snapcasts/{id} served by the read-only process
+        gone = snapcasts.docs.pop(0)
+        deletions.docs.append({"_id": gone["_id"], "deleted_at": datetime.utcnow()})
+        reader.delete(gone["_id"])
+        await owner.catch_up(snapcasts)
+        owner_after_delete = titles(owner, "alpha")
+        await owner.maintain(force=True)
+        await check_owner(reader)
+        reader_after_reload = titles(reader, "alpha")
+        await reader.close()
+        await owner.close()
+        return owner_after_delete, reader_after_reload, gone["_id"].binary in owner.tombstones
+
+    assert asyncio.run(scenario()) == ([], [], True)
+
+
+def test_reader_replays_its_own_deletes_over_a_stale_manifest(tmp_path, mongo):
+    snapcasts, deletions = mongo
+
+    async def scenario():
+        owner = await start(tmp_path, mongo)
+        reader = await start(tmp_path, mongo)
+        # Deleted straight in Mongo: seen on the reader's change stream before the owner's
+        gone = snapcasts.docs.pop(0)
+        reader.delete(gone["_id"])
+        await owner.maintain(force=True)
+        await check_owner(reader)
+        result = titles(reader, "alpha")
+        await reader.close()
+        await owner.close()
+        return result
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_reader_takes_over_when_the_owner_closes(tmp_path, mongo):
+    async def scenario():
+        owner = await start(tmp_path, mongo)
+        reader = await start(tmp_path, mongo)
+        await owner.maintain(force=True)
+        await owner.close()
+        assert not reader.writer
+        await check_owner(reader)
+        result = reader.writer, sorted(titles(reader, "voice"))
+        await reader.close()
+        return result
+
+    writer, found = asyncio.run(scenario())
+    assert writer
+    assert found == sorted(str(doc["_id"]) for doc in mongo[0].docs)
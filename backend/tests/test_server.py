@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+import server
+
+
+class StubLoader:
+    async def hydrate(self, items):
+        pass
+
+
+@pytest.fixture
+def feed_queries(monkeypatch):
+    queries = []
+
+    async def page(query):
+        queries.append(query)
+        return [], None
+
+    async def apply_pending(collection, items):
+        pass
+
+    monkeypatch.setattr(server.feed_engine, "page", page)
+    monkeypatch.setattr(server.engagement, "apply_pending", apply_pending)
+    server.app.dependency_overrides[server.get_user_loader] = StubLoader
+    yield queries
+    server.app.dependency_overrides.clear()
+
+
+def test_feed_reads_filters_from_query_params(feed_queries):
+    params = {"category": "Tech", "tags": ["a", "b"], "sort_by": "recent", "limit": 5, "cursor": "abc"}
+    response = TestClient(server.app).get("/api/feed", params=params)
+    assert response.status_code == 200
+    assert response.json() == {"items": [], "next_cursor": None}
+    query = feed_queries[0]
+    assert (query.category, query.tags, query.sort_by, query.limit, query.cursor) == ("Tech", ["a", "b"], "recent", 5, "abc")
+
+
+def test_feed_rejects_out_of_range_limit(feed_queries):
+    response = TestClient(server.app).get("/api/feed", params={"limit": 0})
+    assert response.status_code == 422
+    assert feed_queries == []
+
+
+class FakeSnapcasts:
+    def __init__(self, doc):
+        self.doc = doc
+
+    async def find_one_and_delete(self, query, projection=None):
+        doc, self.doc = self.doc, None
+        return doc if doc and doc["_id"] == query["_id"] and doc["user_id"] == query["user_id"] else None
+
+
+class FakeDeletions:
+    def __init__(self):
+        self.docs = []
+
+    async def insert_one(self, doc):
+        self.docs.append(doc)
+
+
+def test_delete_removes_the_snapcast_from_search_and_records_it(monkeypatch):
+    user_id, snapcast_id = ObjectId(), ObjectId()
+    deletions = FakeDeletions()
+    monkeypatch.setattr(server, "db", SimpleNamespace(snapcasts=FakeSnapcasts({"_id": snapcast_id, "user_id": user_id, "category": "Tech"}), snapcast_deletions=deletions))
+    searched, trending = [], []
+    monkeypatch.setattr(server.search_index, "delete", searched.append)
+
+    async def remove(snapcast_id, category):
+        trending.append((snapcast_id, category))
+
+    monkeypatch.setattr(server.feed_engine, "remove", remove)
+    server.app.dependency_overrides[server.get_current_user_id] = lambda: str(user_id)
+    try:
+        response = TestClient(server.app).delete(f"/api/snapcasts/{snapcast_id}")
+    finally:
+        server.app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert searched == [snapcast_id]
+    assert trending == [(str(snapcast_id), "Tech")]
+    assert [doc["_id"] for doc in deletions.docs] == [snapcast_id]
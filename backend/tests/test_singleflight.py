@@ -0,0 +1,31 @@
+import asyncio
+
+import fakeredis
+
+from singleflight import SingleFlight
+
+
+def test_slow_leader_keeps_its_lease_and_is_not_joined_by_a_second_one():
+    async def scenario():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        results = {}
+        computed = []
+
+        async def compute():
+            computed.append(1)
+            # Several lease lifetimes
+            await asyncio.sleep(2.5)
+            results["key"] = "audio"
+            return "audio"
+
+        async def lookup():
+            return results.get("key")
+
+        # Two workers, each with its own in-process state, sharing Redis
+        leader, follower = (SingleFlight(redis, lease_seconds=1, poll_interval=0.05) for _ in range(2))
+        first = asyncio.create_task(leader.run("key", compute, lookup))
+        await asyncio.sleep(1.3)
+        second = await follower.run("key", compute, lookup)
+        return await first, second, len(computed), await redis.exists("lease:key")
+
+    assert asyncio.run(scenario()) == (("audio", True), ("audio", False), 1, 0)
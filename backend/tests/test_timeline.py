@@ -0,0 +1,48 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import fakeredis
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from timeline import TimelineService
+
+
+async def post(db, timelines, author, at):
+    # Microseconds, as SnapCast.created_at has before Mongo truncates it to milliseconds
+    doc = {"_id": ObjectId(), "user_id": author, "title": "t", "is_public": True, "created_at": at}
+    await db.snapcasts.insert_one(doc)
+    await timelines.publish(doc)
+    return str(doc["_id"])
+
+
+async def read_all(timelines, user_id, limit):
+    seen, cursor = [], None
+    while True:
+        items, cursor = await timelines.page(user_id, limit, cursor)
+        seen += [item["id"] for item in items]
+        if cursor is None:
+            return seen
+
+
+def test_fanned_out_post_of_a_new_celebrity_is_listed_once():
+    async def scenario():
+        db = AsyncMongoMockClient()["eona_test"]
+        timelines = TimelineService(fakeredis.FakeAsyncRedis(decode_responses=True), db)
+        reader, author = ObjectId(), ObjectId()
+        await db.users.insert_many([{"_id": reader, "followers": 0}, {"_id": author, "followers": 0}])
+        await db.follows.insert_one({"follower_id": reader, "following_id": author})
+        await timelines.page(str(reader))
+
+        posts = [await post(db, timelines, author, datetime(2026, 1, 1, 12, 0, 0, 123456) + timedelta(seconds=i)) for i in range(5)]
+        # The author crosses the celebrity threshold; the reader's timeline now also pulls their posts in
+        timelines.celebrity_threshold = 1
+        await db.users.update_one({"_id": author}, {"$set": {"followers": 1}})
+        await timelines.redis.sadd(timelines.celebrities_key(reader), str(author))
+
+        first_page, _ = await timelines.page(str(reader), 20)
+        return posts, [item["id"] for item in first_page], await read_all(timelines, str(reader), 2)
+
+    posts, first_page, paged = asyncio.run(scenario())
+    assert first_page == posts[::-1]
+    assert paged == posts[::-1]
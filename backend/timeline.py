@@ -0,0 +1,248 @@
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import redis.asyncio as aioredis
+from bson import ObjectId
+
+from breaker import CircuitBreaker
+from cache import UNAVAILABLE, call_redis, create_redis_breaker
+from config import get_setting
+from feed import decode_cursor, encode_cursor, serialize_snapcast
+
+logger = logging.getLogger(__name__)
+
+# Scored 0 so it sorts below every post; it marks a built (possibly empty) timeline
+SENTINEL = "-"
+
+# Add a post to every follower timeline that exists; missing ones are rebuilt when next read
+FAN_OUT_SCRIPT = """
+local score = ARGV[1]
+local member = ARGV[2]
+local max_size = tonumber(ARGV[3])
+local written = 0
+for _, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('ZADD', key, score, member)
+        if redis.call('ZCARD', key) > max_size + 1 then
+            redis.call('ZREMRANGEBYRANK', key, 1, -max_size - 2)
+        end
+        written = written + 1
+    end
+end
+return written
+"""
+
+# An author who crosses the celebrity threshold is added to every live follower's celebrity set once
+PROMOTE_SCRIPT = """
+local written = 0
+for _, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('SADD', key .. ':celebrities', ARGV[1])
+        redis.call('EXPIRE', key .. ':celebrities', ARGV[2])
+        written = written + 1
+    end
+end
+return written
+"""
+
+def timestamp(at: datetime) -> float:
+    """Timeline score for a naive-UTC created_at.
+
+    Truncated to milliseconds, the precision Mongo stores, so a post scores
+    the same whether it came from the request or from the database.
+    """
+    return at.replace(microsecond=at.microsecond - at.microsecond % 1000, tzinfo=timezone.utc).timestamp()
+
+class TimelineService:
+    """Materialized home timelines from the follow graph.
+
+    Publishing a SnapCast pushes its id into the capped Redis sorted set of
+    every follower whose timeline is live (scored by created_at), so a home
+    page is one range read. Authors with at least celebrity_threshold
+    followers are skipped at write time; their posts are pulled in at read
+    time with one indexed query. Timelines expire after inactive_days without
+    a read and are rebuilt from Mongo on the next one.
+    """
+
+    def __init__(self, redis_client: aioredis.Redis, db: Any, breaker: Optional[CircuitBreaker] = None):
+        self.redis = redis_client
+        self.db = db
+        self.breaker = breaker or create_redis_breaker()
+        self.prefix = get_setting("timeline.key_prefix", "timeline")
+        self.max_size = get_setting("timeline.max_size", 800)
+        self.celebrity_threshold = get_setting("timeline.celebrity_threshold", 10000)
+        self.ttl = int(get_setting("timeline.inactive_days", 7) * 86400)
+        self.fan_out_batch = get_setting("timeline.fan_out_batch", 500)
+        self.stats = {"fan_outs": 0, "timelines_written": 0, "celebrity_posts": 0, "rebuilds": 0, "pages": 0, "fallbacks": 0}
+
+    def key(self, user_id: Any) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    def celebrities_key(self, user_id: Any) -> str:
+        return f"{self.prefix}:{user_id}:celebrities"
+
+    async def is_celebrity(self, user_id: Any) -> bool:
+        user = await self.db.users.find_one({"_id": ObjectId(user_id)}, {"followers": 1})
+        return bool(user) and user.get("followers", 0) >= self.celebrity_threshold
+
+    async def _follower_keys(self, author: Any) -> List[str]:
+        return [self.key(follow["follower_id"]) async for follow in self.db.follows.find({"following_id": ObjectId(author)}, {"follower_id": 1})]
+
+    async def _for_each_batch(self, keys: List[str], script: str, *args) -> int:
+        written = 0
+        for start in range(0, len(keys), self.fan_out_batch):
+            batch = keys[start:start + self.fan_out_batch]
+            result = await call_redis(self.breaker, lambda: self.redis.eval(script, len(batch), *batch, *args))
+            if result is UNAVAILABLE:
+                # Timelines written so far are fine; the rest are dropped so they rebuild from Mongo
+                await call_redis(self.breaker, lambda: self.redis.delete(*keys[start:]))
+                break
+            written += result
+        return written
+
+    async def publish(self, doc: Dict) -> int:
+        """Fan a newly created public SnapCast out to follower timelines; returns timelines written"""
+        if not doc.get("is_public", True):
+            return 0
+        author = str(doc["user_id"])
+        keys = [self.key(author)]
+        celebrities_key = f"{self.prefix}:celebrities"
+        if await self.is_celebrity(author):
+            self.stats["celebrity_posts"] += 1
+            if await call_redis(self.breaker, lambda: self.redis.sadd(celebrities_key, author)) == 1:
+                # Timelines built while the author was below the threshold pull their posts in from now on
+                await self._for_each_batch(await self._follower_keys(author), PROMOTE_SCRIPT, author, self.ttl)
+        else:
+            await call_redis(self.breaker, lambda: self.redis.srem(celebrities_key, author))
+            keys += await self._follower_keys(author)
+        written = await self._for_each_batch(keys, FAN_OUT_SCRIPT, repr(timestamp(doc["created_at"])), str(doc["_id"]), self.max_size)
+        self.stats["fan_outs"] += 1
+        self.stats["timelines_written"] += written
+        return written
+
+    async def on_follow(self, follower_id: Any, following_id: Any):
+        """Keep a live timeline in step with a new follow"""
+        key = self.key(follower_id)
+        if await self.is_celebrity(following_id):
+            await call_redis(self.breaker, lambda: self.redis.eval(PROMOTE_SCRIPT, 1, key, str(following_id), self.ttl))
+            return
+        posts = await self.db.snapcasts.find({"user_id": ObjectId(following_id), "is_public": True}, {"created_at": 1}).sort("created_at", -1).limit(self.max_size).to_list(None)
+        if not posts:
+            return
+
+        async def merge():
+            if not await self.redis.exists(key):
+                return
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.zadd(key, {str(post["_id"]): timestamp(post["created_at"]) for post in posts})
+                pipe.zremrangebyrank(key, 1, -self.max_size - 2)
+                await pipe.execute()
+
+        await call_redis(self.breaker, merge)
+
+    async def on_unfollow(self, follower_id: Any, following_id: Any):
+        # Their posts are not tracked per author in the timeline, so rebuild it on the next read
+        await call_redis(self.breaker, lambda: self.redis.delete(self.key(follower_id), self.celebrities_key(follower_id)))
+
+    async def _authors(self, user_id: Any) -> Tuple[List[ObjectId], List[ObjectId]]:
+        """(regular authors including the user, celebrity authors) the user follows"""
+        following = [doc["following_id"] async for doc in self.db.follows.find({"follower_id": ObjectId(user_id)}, {"following_id": 1})]
+        celebrities = [doc["_id"] async for doc in self.db.users.find({"_id": {"$in": following}, "followers": {"$gte": self.celebrity_threshold}}, {"_id": 1})]
+        celebrity_set = set(celebrities)
+        return [ObjectId(user_id)] + [author for author in following if author not in celebrity_set], celebrities
+
+    async def rebuild(self, user_id: Any) -> Optional[List[ObjectId]]:
+        """Rebuild one timeline from Mongo; returns the followed celebrities, None if Redis is down"""
+        regular, celebrities = await self._authors(user_id)
+        posts = await self.db.snapcasts.find({"user_id": {"$in": regular}, "is_public": True}, {"created_at": 1}).sort([("created_at", -1), ("_id", -1)]).limit(self.max_size).to_list(None)
+
+        async def write():
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(self.key(user_id), self.celebrities_key(user_id))
+                pipe.zadd(self.key(user_id), {SENTINEL: 0, **{str(post["_id"]): timestamp(post["created_at"]) for post in posts}})
+                pipe.expire(self.key(user_id), self.ttl)
+                if celebrities:
+                    pipe.sadd(self.celebrities_key(user_id), *map(str, celebrities))
+                    pipe.expire(self.celebrities_key(user_id), self.ttl)
+                await pipe.execute()
+
+        self.stats["rebuilds"] += 1
+        if await call_redis(self.breaker, write) is UNAVAILABLE:
+            return None
+        return celebrities
+
+    async def _read(self, user_id: Any, max_score: str, offset: int, count: int):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zrange(self.key(user_id), max_score, "(0", desc=True, byscore=True, offset=offset, num=count, withscores=True)
+            pipe.smembers(self.celebrities_key(user_id))
+            # Reading keeps a timeline live
+            pipe.expire(self.key(user_id), self.ttl)
+            pipe.expire(self.celebrities_key(user_id), self.ttl)
+            return await pipe.execute()
+
+    async def _timeline_entries(self, user_id: Any, cursor: Optional[Tuple[str, Any, str]], count: int):
+        """Up to count (score, id) entries after the cursor plus followed celebrities; UNAVAILABLE if Redis is down"""
+        max_score = repr(cursor[1]) if cursor else "+inf"
+        entries: List[Tuple[float, str]] = []
+        celebrities: Optional[Set[str]] = None
+        offset = 0
+        rebuilt = False
+        while len(entries) < count:
+            result = await call_redis(self.breaker, lambda: self._read(user_id, max_score, offset, count))
+            if result is UNAVAILABLE:
+                return UNAVAILABLE
+            rows, members, exists = result[0], result[1], result[2]
+            if not exists:
+                if rebuilt or await self.rebuild(user_id) is None:
+                    return UNAVAILABLE
+                rebuilt = True
+                continue
+            if celebrities is None:
+                celebrities = set(members)
+            # Inclusive of the cursor's score; ties are ordered by member, descending
+            entries.extend((score, member) for member, score in rows if not (cursor and score == cursor[1] and member >= cursor[2]))
+            if len(rows) < count:
+                break
+            offset += count
+        return entries[:count], [ObjectId(member) for member in celebrities or ()]
+
+    async def _fan_in(self, authors: List[ObjectId], cursor: Optional[Tuple[str, Any, str]], count: int) -> List[Tuple[float, str]]:
+        if not authors:
+            return []
+        conditions: Dict[str, Any] = {"user_id": {"$in": authors}, "is_public": True}
+        if cursor:
+            at = datetime.fromtimestamp(cursor[1], timezone.utc).replace(tzinfo=None)
+            conditions["$or"] = [{"created_at": {"$lt": at}}, {"created_at": at, "_id": {"$lt": ObjectId(cursor[2])}}]
+        posts = await self.db.snapcasts.find(conditions, {"created_at": 1}).sort([("created_at", -1), ("_id", -1)]).limit(count).to_list(None)
+        return [(timestamp(post["created_at"]), str(post["_id"])) for post in posts]
+
+    async def page(self, user_id: Any, limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """One page of the user's home timeline and the cursor for the next one (None at the end)"""
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded and decoded[0] != "home":
+            raise ValueError("Cursor is not from a home timeline")
+        result = await self._timeline_entries(user_id, decoded, limit + 1)
+        if result is UNAVAILABLE:
+            # Without Redis, read the whole follow graph from Mongo
+            self.stats["fallbacks"] += 1
+            regular, celebrities = await self._authors(user_id)
+            entries = await self._fan_in(regular + celebrities, decoded, limit + 1)
+        else:
+            entries, celebrities = result
+            # A post can be in both if its author crossed the threshold after it was fanned out
+            merged = {member: score for score, member in [*await self._fan_in(celebrities, decoded, limit + 1), *entries]}
+            entries = sorted(((score, member) for member, score in merged.items()), reverse=True)[:limit + 1]
+        self.stats["pages"] += 1
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        if not entries:
+            return [], None
+        docs = await self.db.snapcasts.find({"_id": {"$in": [ObjectId(member) for _, member in entries]}, "is_public": True}).to_list(None)
+        by_id = {str(doc["_id"]): doc for doc in docs}
+        items = [serialize_snapcast(by_id[member]) for _, member in entries if member in by_id]
+        next_cursor = encode_cursor("home", entries[-1][0], entries[-1][1]) if has_more else None
+        return items, next_cursor
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats)
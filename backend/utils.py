@@ -19,12 +19,12 @@ import os
 import logging
 
 # AI and NLP
-import google.generativeai as genai
 import nltk
 from nltk.sentiment import SentimentIntensityAnalyzer
 
 # Import from our new database.py file
 from database import SessionLocal, TTSRequest, EmotionTone, VoiceModel, Purpose
+from gemini import get_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -57,9 +57,6 @@ class EmotionEnhancer:
 
     async def _generate_enhanced_script(self, script: str, tone: EmotionTone, purpose: Purpose, context: str) -> str:
         try:
-            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-            model = genai.GenerativeModel('gemini-1.5-flash-latest')
-            
             enhancement_prompt = f"""
             You are an expert script writer specializing in emotional text-to-speech content.
             Original Script: "{script}"
@@ -78,8 +75,7 @@ class EmotionEnhancer:
             Return only the enhanced script without explanations.
             """
             
-            response = await model.generate_content_async(enhancement_prompt)
-            enhanced_script = response.text.strip()
+            enhanced_script = await get_gateway().generate(enhancement_prompt)
             
             # Fallback to original if enhancement seems invalid
             if len(enhanced_script) < len(script) * 0.5 or len(enhanced_script) > len(script) * 2:
@@ -0,0 +1,76 @@
+import io
+import struct
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+from pydub import AudioSegment
+
+from config import get_setting
+
+WAVEFORM_MAGIC = b"EWF1"
+DEFAULT_RESOLUTIONS = (64, 256, 1024)
+
+def segment_to_samples(segment: AudioSegment) -> np.ndarray:
+    """Mono float32 samples in [-1, 1] from an already decoded segment"""
+    dtype = {1: np.int8, 2: np.int16, 4: np.int32}[segment.sample_width]
+    samples = np.frombuffer(segment.raw_data, dtype=dtype).astype(np.float32)
+    if segment.channels > 1:
+        samples = samples.reshape(-1, segment.channels).mean(axis=1)
+    return samples / float(1 << (8 * segment.sample_width - 1))
+
+def decode_samples(data: bytes) -> np.ndarray:
+    return segment_to_samples(AudioSegment.from_file(io.BytesIO(data)))
+
+def compute_waveforms(samples: np.ndarray, resolutions: Iterable[int] = DEFAULT_RESOLUTIONS) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """Peak and RMS per bar for every resolution, as uint8 arrays.
+
+    The samples are reduced once, at the finest resolution, to per-bar peak
+    and sum of squares; coarser resolutions are folded from those partials,
+    so the audio is touched in a single vectorized pass. Every resolution
+    must divide the finest one.
+    """
+    resolutions = sorted(set(resolutions))
+    finest = resolutions[-1]
+    if any(finest % bars for bars in resolutions):
+        raise ValueError(f"Resolutions {resolutions} must all divide {finest}")
+    per_bar = max(1, -(-len(samples) // finest))
+    padded = np.zeros(finest * per_bar, dtype=np.float32)
+    padded[:len(samples)] = samples[:finest * per_bar]
+    frames = padded.reshape(finest, per_bar)
+    peaks = np.abs(frames).max(axis=1)
+    sum_squares = np.einsum("ij,ij->i", frames, frames)
+
+    waveforms = {}
+    for bars in resolutions:
+        group = finest // bars
+        peak = peaks.reshape(bars, group).max(axis=1)
+        rms = np.sqrt(sum_squares.reshape(bars, group).sum(axis=1) / (group * per_bar))
+        waveforms[bars] = (np.round(np.clip(peak, 0, 1) * 255).astype(np.uint8), np.round(np.clip(rms, 0, 1) * 255).astype(np.uint8))
+    return waveforms
+
+def pack_waveforms(waveforms: Dict[int, Tuple[np.ndarray, np.ndarray]]) -> bytes:
+    """Binary layout: magic, count, then per resolution: bars, peak bytes, rms bytes"""
+    parts = [WAVEFORM_MAGIC, struct.pack("<H", len(waveforms))]
+    for bars in sorted(waveforms):
+        peak, rms = waveforms[bars]
+        parts += [struct.pack("<H", bars), peak.tobytes(), rms.tobytes()]
+    return b"".join(parts)
+
+def unpack_waveforms(data: bytes) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    if data[:4] != WAVEFORM_MAGIC:
+        raise ValueError("Not a packed waveform")
+    (count,) = struct.unpack_from("<H", data, 4)
+    offset = 6
+    waveforms = {}
+    for _ in range(count):
+        (bars,) = struct.unpack_from("<H", data, offset)
+        offset += 2
+        peak = np.frombuffer(data, dtype=np.uint8, count=bars, offset=offset)
+        rms = np.frombuffer(data, dtype=np.uint8, count=bars, offset=offset + bars)
+        offset += 2 * bars
+        waveforms[bars] = (peak, rms)
+    return waveforms
+
+def extract_packed_waveforms(data: bytes) -> bytes:
+    """Decode an encoded file and pack its waveforms. Runs in a worker process"""
+    return pack_waveforms(compute_waveforms(decode_samples(data), get_setting("audio.waveform_resolutions", DEFAULT_RESOLUTIONS)))
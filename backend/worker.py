@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+EONA TTS job worker
+Drains the TTS job queue filled by POST /api/v1/tts/jobs. Run as many of
+these processes as needed, independently of the API workers:
+
+    python worker.py --concurrency 8
+"""
+
+import signal
+import asyncio
+import argparse
+import logging
+from typing import Dict, Optional
+
+from config import get_setting
+from jobs import JobQueue, PROCESSING, COMPLETED, FAILED, BLOCKED
+from main import SessionLocal, TTSRequest, TTSRequestModel, content_checker, generate_request_id, redis_client, synthesize_tts, tts_cache
+
+logger = logging.getLogger("worker")
+
+def update_job_record(job_id: int, status: str, response_data: Optional[Dict] = None):
+    db = SessionLocal()
+    try:
+        record = db.get(TTSRequest, job_id)
+        if record is None:
+            logger.error(f"TTS job {job_id} has no TTSRequest row")
+            return
+        record.status = status
+        if response_data:
+            record.enhanced_script = response_data["enhanced_script"]
+            record.audio_url = response_data["audio_url"]
+            record.processing_time = response_data["processing_time"]
+        db.commit()
+    finally:
+        db.close()
+
+async def set_status(queue: JobQueue, job_id: int, status: str, response_data: Optional[Dict] = None, error: Optional[str] = None):
+    if error:
+        await queue.set_error(job_id, error)
+    await asyncio.to_thread(update_job_record, job_id, status, response_data)
+    detail = {"result": response_data} if response_data else {"error": error} if error else None
+    await queue.publish(job_id, status, detail)
+
+async def keep_lease(queue: JobQueue, job_id: int):
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 3)
+        await queue.heartbeat(job_id)
+
+async def process_job(queue: JobQueue, raw: str, job: Dict):
+    job_id = job["job_id"]
+    lease = asyncio.create_task(keep_lease(queue, job_id))
+    try:
+        request = TTSRequestModel(**job["request"])
+        await set_status(queue, job_id, PROCESSING)
+        is_safe, reason, _ = await content_checker.check_content(request.script)
+        if not is_safe:
+            logger.warning(f"TTS job {job_id} blocked: {reason}")
+            await set_status(queue, job_id, BLOCKED, error=f"Content not allowed: {reason}")
+            return
+        request_id = generate_request_id(request.script, request.voice_model.value, request.emotion_tone.value)
+        response_data, _ = await synthesize_tts(request, request_id)
+        await set_status(queue, job_id, COMPLETED, response_data=response_data)
+        logger.info(f"TTS job {job_id} completed")
+    except Exception as e:
+        logger.error(f"TTS job {job_id} failed: {e}")
+        try:
+            await set_status(queue, job_id, FAILED, error=str(e))
+        except Exception as status_error:
+            logger.error(f"Could not record failure of TTS job {job_id}: {status_error}")
+    finally:
+        lease.cancel()
+        await queue.ack(raw, job_id)
+
+async def run_worker(concurrency: int):
+    queue = JobQueue(redis_client)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    await tts_cache.start_invalidation_listener()
+    semaphore = asyncio.Semaphore(concurrency)
+    running = set()
+    claim_timeout = get_setting("jobs.claim_timeout", 0.5)
+    reap_interval = get_setting("jobs.reap_interval", 30)
+    last_reap = 0.0
+    logger.info(f"TTS worker started with concurrency {concurrency}")
+
+    while not stopping.is_set():
+        await semaphore.acquire()
+        try:
+            if loop.time() - last_reap > reap_interval:
+                last_reap = loop.time()
+                await queue.requeue_orphans()
+            claimed = await queue.claim(claim_timeout)
+        except Exception as e:
+            claimed = None
+            logger.error(f"TTS worker queue error: {e}")
+            await asyncio.sleep(1)
+        if claimed is None:
+            semaphore.release()
+            continue
+        task = asyncio.create_task(process_job(queue, *claimed))
+        running.add(task)
+        task.add_done_callback(running.discard)
+        task.add_done_callback(lambda _: semaphore.release())
+
+    logger.info(f"TTS worker stopping, waiting for {len(running)} running jobs")
+    if running:
+        await asyncio.gather(*running, return_exceptions=True)
+    await tts_cache.stop_invalidation_listener()
+    await redis_client.aclose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EONA TTS job worker")
+    parser.add_argument("--concurrency", type=int, default=get_setting("jobs.worker_concurrency", 8))
+    args = parser.parse_args()
+    asyncio.run(run_worker(args.concurrency))